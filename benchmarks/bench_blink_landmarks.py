@@ -0,0 +1,69 @@
+import timeit
+import numpy as np
+from script import detect_blinks
+from benchmarks import harness
+
+#对比每帧关键点转换 + EAR 计算的开销（旧：68 点全转换 + scipy 标量距离；新：12 点 + 向量化）
+#用法: python -m benchmarks.bench_blink_landmarks（或 python -m benchmarks.run --only blink_landmarks）
+
+
+class FakePoint:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+class FakeShape:
+    # 模拟 dlib.full_object_detection 的 num_parts / part(i) 接口
+    def __init__(self, seed=0):
+        rng = np.random.default_rng(seed)
+        self.points = [FakePoint(int(x), int(y)) for x, y in rng.integers(200, 600, size=(68, 2))]
+        self.num_parts = len(self.points)
+
+    def part(self, i):
+        return self.points[i]
+
+
+def old_path(shape):
+    coords = detect_blinks.shape_to_np(shape)
+    (lStart, lEnd) = detect_blinks.FACIAL_LANDMARKS_68_IDXS["left_eye"]
+    (rStart, rEnd) = detect_blinks.FACIAL_LANDMARKS_68_IDXS["right_eye"]
+    leftEAR = detect_blinks.eye_aspect_ratio(coords[lStart:lEnd])
+    rightEAR = detect_blinks.eye_aspect_ratio(coords[rStart:rEnd])
+    return (leftEAR + rightEAR) / 2.0
+
+
+def new_path(shape):
+    eyes = detect_blinks.shape_to_eyes_np(shape)
+    rightEAR, leftEAR = detect_blinks.eyes_aspect_ratio(eyes)
+    return (leftEAR + rightEAR) / 2.0
+
+
+def bench(func, shape, number=2000, repeat=5):
+    best = min(timeit.repeat(lambda: func(shape), number=number, repeat=repeat))
+    return best / number * 1e6
+
+
+def run(options):
+    duration = 0.3 if options.quick else 1.0
+    shape = FakeShape()
+    eye = detect_blinks.shape_to_np(shape)[slice(*detect_blinks.FACIAL_LANDMARKS_68_IDXS["left_eye"])]
+    return [
+        harness.measure("detect_blinks.shape_to_np", lambda: detect_blinks.shape_to_np(shape), duration=duration),
+        harness.measure("detect_blinks.shape_to_eyes_np",
+                        lambda: detect_blinks.shape_to_eyes_np(shape), duration=duration),
+        harness.measure("detect_blinks.eye_aspect_ratio", lambda: detect_blinks.eye_aspect_ratio(eye),
+                        duration=duration),
+        harness.measure("detect_blinks.ear_per_frame[old]", lambda: old_path(shape), duration=duration),
+        harness.measure("detect_blinks.ear_per_frame[new]", lambda: new_path(shape), duration=duration),
+    ]
+
+
+if __name__ == "__main__":
+    shape = FakeShape()
+    assert abs(old_path(shape) - new_path(shape)) < 1e-9
+    old_us = bench(old_path, shape)
+    new_us = bench(new_path, shape)
+    print(f"68点 + scipy:  {old_us:8.2f} us/帧")
+    print(f"12点 + 向量化: {new_us:8.2f} us/帧")
+    print(f"加速比: {old_us / new_us:.1f}x")
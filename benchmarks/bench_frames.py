@@ -0,0 +1,52 @@
+import os
+import cv2
+from script import detect_blinks
+from benchmarks import harness, synthetic
+
+#完整的逐帧处理：灰度转换、人脸检测/跟踪、关键点、EAR
+#用法: python -m benchmarks.run --only frames [--video 样例视频.mp4]
+
+PREDICTOR_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              "script", "shape_predictor_68_face_landmarks.dat")
+
+
+def load_frames(path, max_frames):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def run(options):
+    if not os.path.exists(PREDICTOR_PATH):
+        return [harness.skipped("detect_blinks.BlinkDetector.process", f"缺少 {PREDICTOR_PATH}")]
+    video = options.video
+    if not video:
+        # 没有样例视频时用合成视频，画面中没有人脸，每帧都走检测路径
+        video = synthetic.synthetic_video(os.path.join(options.workdir, "synthetic.avi"))
+    frames = load_frames(video, 100 if options.quick else 300)
+    if not frames:
+        return [harness.skipped("detect_blinks.BlinkDetector.process", f"无法读取视频 {video}")]
+
+    results = []
+    for scale in (1.0, 0.5):
+        timer = detect_blinks.StageTimer(report_every=0)
+        detector = detect_blinks.BlinkDetector(PREDICTOR_PATH, detect_scale=scale, timer=timer)
+        state = {"i": 0}
+
+        def step(detector=detector, state=state):
+            detector.process(frames[state["i"] % len(frames)])
+            detector.timer.frame_done()
+            state["i"] += 1
+
+        result = harness.measure(f"detect_blinks.BlinkDetector.process[scale={scale}]", step,
+                                 number=len(frames), warmup=0)
+        # 各阶段平均耗时（毫秒）一并输出
+        result["stages_ms"] = timer.averages()
+        results.append(result)
+    return results
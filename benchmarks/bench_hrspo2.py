@@ -0,0 +1,53 @@
+import numpy as np
+from script import hrspo2, vitals_bus
+from benchmarks import harness, synthetic
+
+#心率血氧信号处理：旧的逐样本整窗 filtfilt 与流式滤波 / 批处理引擎对比
+#用法: python -m benchmarks.run --only hrspo2
+
+
+def run(options):
+    duration = 0.3 if options.quick else 1.0
+    fs = hrspo2.SAMPLE_RATE
+    ir, red = synthetic.ppg_signal(int(fs * 600), fs=fs)
+    window = ir[:200].astype(float)
+    results = [
+        # 旧 update() 每来一个样本都对整个 200 点窗口做一次 filtfilt
+        harness.measure("hrspo2.lowpass_filter[200]", lambda: hrspo2.lowpass_filter(window), duration=duration),
+    ]
+
+    lowpass = hrspo2.StreamingLowpass()
+    one = ir[:1].astype(float)
+    block = ir[:32].astype(float)
+    results.append(harness.measure("hrspo2.StreamingLowpass.process[1]",
+                                   lambda: lowpass.process(one), duration=duration))
+    results.append(harness.measure("hrspo2.StreamingLowpass.process[32]",
+                                   lambda: lowpass.process(block), duration=duration, items=32))
+
+    # 完整的逐批处理：滤波、峰值检测、环形缓冲区、血氧估计与总线发布
+    for batch_size in (1, 3, 32):
+        engine = hrspo2.HrSpo2Engine(None, vitals=vitals_bus.VitalsBus())
+        state = {"i": 0}
+
+        def step(engine=engine, state=state, batch_size=batch_size):
+            i = state["i"] % (len(ir) - batch_size)
+            samples = np.column_stack((ir[i:i + batch_size], red[i:i + batch_size]))
+            timestamps = np.arange(i, i + batch_size) / fs
+            engine.process_batch(hrspo2.FifoBatch(samples, timestamps, state["i"], 0))
+            state["i"] += batch_size
+
+        results.append(harness.measure(f"hrspo2.HrSpo2Engine.process_batch[{batch_size}]",
+                                       step, duration=duration, items=batch_size))
+
+    # 离线验证：数小时录制数据按块估计心率，必须远快于实时
+    hours = 1 if options.quick else 4
+    ir_long, _ = synthetic.ppg_signal(int(fs * 3600 * hours), fs=fs)
+    filtered = hrspo2.StreamingLowpass().process(ir_long)
+    result = harness.measure(f"hrspo2.estimate_heart_rate[{hours}h]",
+                             lambda: hrspo2.estimate_heart_rate(filtered, block_size=4096),
+                             number=3, warmup=1, items=len(filtered))
+    result["realtime_factor"] = result["items_per_s"] / fs
+    assert result["realtime_factor"] > 1, f"离线心率估计慢于实时: {result['realtime_factor']:.2f}x"
+    print(f"[bench] estimate_heart_rate {hours} 小时数据，{result['realtime_factor']:.0f} 倍实时")
+    results.append(result)
+    return results
@@ -0,0 +1,93 @@
+import os
+import time
+from benchmarks import harness, synthetic
+
+#服务端查询：100 万行异常日志上的 /get_recent_abnormal，5 万张图片上的 /get_recent_photos
+#生成的数据保存在 workdir 中，行数/张数不变时重复运行直接复用
+#用法: python -m benchmarks.run --only server [--log-lines 1000000] [--photos 50000]
+
+
+def _prepare_events(flask_server, event_store, workdir, lines):
+    log_path = os.path.join(workdir, f"abnormal_log_{lines}.txt")
+    db_path = os.path.join(workdir, f"abnormal_events_{lines}.db")
+    results = []
+    if not os.path.exists(log_path):
+        # 每分钟一条，最近3天约 4300 条，其余为历史数据
+        synthetic.abnormal_log(log_path, lines, step=60.0)
+    if not os.path.exists(db_path):
+        store = event_store.EventStore(db_path)
+        start = time.perf_counter()
+        store.import_text_log(log_path)
+        results.append(harness.summarize(f"event_store.import_text_log[{lines}]",
+                                         [time.perf_counter() - start], lines))
+    else:
+        store = event_store.EventStore(db_path)
+    flask_server.LOG_FILE_PATH = log_path
+    event_store.DB_PATH = db_path
+    flask_server._store = store
+    return results
+
+
+def _prepare_photos(flask_server, photo_index, workdir, count):
+    folder = os.path.join(workdir, f"photos_{count}")
+    if not os.path.isdir(folder) or len(os.listdir(folder)) < count:
+        synthetic.photo_folder(folder, count)
+    flask_server.IMAGE_FOLDER = folder
+    index = photo_index.PhotoIndex(folder, extensions=flask_server.ALLOWED_EXTENSIONS)
+    start = time.perf_counter()
+    index.build()
+    build = harness.summarize(f"photo_index.PhotoIndex.build[{count}]", [time.perf_counter() - start], count)
+    flask_server._photo_index = index
+    return [build]
+
+
+def _get(client, url, expect=200, headers=None):
+    def call():
+        response = client.get(url, headers=headers)
+        assert response.status_code == expect, (url, response.status_code)
+        return response
+    return call
+
+
+def run(options):
+    try:
+        import flask_server
+        from script import event_store, photo_index
+    except ImportError as e:
+        return [harness.skipped("flask_server", f"缺少依赖: {e}")]
+
+    duration = 0.5 if options.quick else 2.0
+    client = flask_server.app.test_client()
+    results = []
+
+    lines = options.log_lines
+    results += _prepare_events(flask_server, event_store, options.workdir, lines)
+    cursor = client.get("/get_recent_abnormal?limit=1").get_json()["next_cursor"]
+    latest = client.get("/get_recent_abnormal")
+    etag = latest.headers["ETag"]
+    results += [
+        harness.measure(f"get_recent_abnormal[{lines} 行, 最近3天]",
+                        _get(client, "/get_recent_abnormal"), number=3 if options.quick else 10, warmup=1),
+        harness.measure(f"get_recent_abnormal[{lines} 行, limit=100]",
+                        _get(client, "/get_recent_abnormal?limit=100"), duration=duration, items=100),
+        harness.measure(f"get_recent_abnormal[{lines} 行, 游标增量]",
+                        _get(client, f"/get_recent_abnormal?cursor={cursor}&limit=100"), duration=duration),
+        harness.measure(f"get_recent_abnormal[{lines} 行, If-None-Match]",
+                        _get(client, "/get_recent_abnormal", 304, {"If-None-Match": etag}),
+                        number=3 if options.quick else 10, warmup=1),
+    ]
+
+    count = options.photos
+    results += _prepare_photos(flask_server, photo_index, options.workdir, count)
+    results += [
+        harness.measure(f"get_recent_photos[{count} 张, 首次全量]",
+                        _get(client, "/get_recent_photos"), number=1, warmup=0, items=count),
+        harness.measure(f"get_recent_photos[{count} 张, 全量]",
+                        _get(client, "/get_recent_photos"), number=3 if options.quick else 10, warmup=0, items=count),
+        harness.measure(f"get_recent_photos[{count} 张, page_size=50]",
+                        _get(client, "/get_recent_photos?page=1&page_size=50"), duration=duration, items=50),
+        harness.measure(f"get_recent_photos[{count} 张, 末页]",
+                        _get(client, f"/get_recent_photos?page={count // 50}&page_size=50"),
+                        duration=duration, items=50),
+    ]
+    return results
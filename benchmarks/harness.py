@@ -0,0 +1,101 @@
+import json
+import os
+import platform
+import subprocess
+import time
+import numpy as np
+
+#基准测试公共部分：逐次计时、统计分位数与吞吐量、输出 JSON 以便在目标板上跨提交对比
+
+PERCENTILES = (50, 90, 99)
+
+
+def measure(name, func, number=None, duration=1.0, warmup=3, items=1, setup=None):
+    """
+    逐次调用 func() 并记录每次耗时。number 为调用次数，为 None 时在 duration 秒内尽量多调用。
+    items 为每次调用处理的数据量（样本数、帧数、行数等），用于计算 items_per_s。
+    setup 若给出，在每次调用前执行且不计入耗时。
+    """
+    for _ in range(warmup):
+        if setup is not None:
+            setup()
+        func()
+
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while (len(latencies) < number) if number else (time.perf_counter() < deadline or len(latencies) < 5):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    return summarize(name, latencies, items)
+
+
+def summarize(name, latencies, items=1):
+    lat = np.asarray(latencies) * 1e6
+    total = lat.sum() / 1e6
+    result = {
+        "name": name,
+        "calls": len(lat),
+        "items_per_call": items,
+        "mean_us": float(lat.mean()),
+        "min_us": float(lat.min()),
+        "max_us": float(lat.max()),
+        "calls_per_s": len(lat) / total if total > 0 else float("inf"),
+        "items_per_s": len(lat) * items / total if total > 0 else float("inf"),
+    }
+    for p, value in zip(PERCENTILES, np.percentile(lat, PERCENTILES)):
+        result[f"p{p}_us"] = float(value)
+    return result
+
+
+def skipped(name, reason):
+    return {"name": name, "skipped": reason}
+
+
+def environment():
+    # 记录运行环境与当前提交，便于对比不同板子 / 不同提交的结果
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo,
+                                capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def format_result(r):
+    if "skipped" in r:
+        return f"{r['name']:<40} 跳过: {r['skipped']}"
+    return (f"{r['name']:<40} p50 {r['p50_us']:10.1f}us  p90 {r['p90_us']:10.1f}us  "
+            f"p99 {r['p99_us']:10.1f}us  {r['items_per_s']:12.1f} 项/s")
+
+
+def write_json(path, results, env=None):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"environment": env or environment(), "results": results}, f, ensure_ascii=False, indent=2)
+
+
+def load_json(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(baseline, results, key="p50_us"):
+    # 与之前保存的 JSON 对比，返回 (name, 旧值, 新值, 变化百分比) 列表
+    old = {r["name"]: r for r in baseline["results"] if key in r}
+    rows = []
+    for r in results:
+        if key in r and r["name"] in old:
+            before = old[r["name"]][key]
+            rows.append((r["name"], before, r[key], (r[key] - before) / before * 100 if before else 0.0))
+    return rows
@@ -0,0 +1,73 @@
+import argparse
+import importlib
+import os
+import sys
+import tempfile
+from benchmarks import harness
+
+#基准测试入口：依次运行各组测试，打印分位数与吞吐量，可选输出 JSON 并与之前的结果对比
+#用法:
+#  python -m benchmarks.run                          # 全部
+#  python -m benchmarks.run --only hrspo2,server     # 指定分组
+#  python -m benchmarks.run --json results/abc123.json --compare results/base.json
+
+SUITES = {
+    "hrspo2": "benchmarks.bench_hrspo2",
+    "blink_landmarks": "benchmarks.bench_blink_landmarks",
+    "frames": "benchmarks.bench_frames",
+    "server": "benchmarks.bench_server",
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="safe-drive-system 基准测试")
+    parser.add_argument("--only", help="逗号分隔的分组名: " + ",".join(SUITES))
+    parser.add_argument("--json", help="结果写入该 JSON 文件")
+    parser.add_argument("--compare", help="与之前保存的 JSON 对比 p50")
+    parser.add_argument("--quick", action="store_true", help="缩短计时，用于快速检查")
+    parser.add_argument("--video", help="逐帧处理使用的样例视频，默认生成合成视频")
+    parser.add_argument("--log-lines", type=int, default=1_000_000, help="合成异常日志行数")
+    parser.add_argument("--photos", type=int, default=50_000, help="合成图片张数")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "safe_drive_bench"),
+                        help="合成数据目录，重复运行时复用")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    os.makedirs(options.workdir, exist_ok=True)
+    names = options.only.split(",") if options.only else list(SUITES)
+    unknown = [n for n in names if n not in SUITES]
+    if unknown:
+        print(f"未知分组: {', '.join(unknown)}")
+        return 2
+
+    env = harness.environment()
+    print(f"[bench] 提交 {env['commit']}  {env['machine']}  Python {env['python']}")
+    results = []
+    for name in names:
+        try:
+            module = importlib.import_module(SUITES[name])
+        except ImportError as e:
+            # 缺少 dlib / flask 等依赖时跳过该组，不影响其他组
+            suite_results = [harness.skipped(name, f"缺少依赖: {e}")]
+        else:
+            suite_results = module.run(options)
+        for r in suite_results:
+            r["suite"] = name
+            print(harness.format_result(r))
+        results.extend(suite_results)
+
+    if options.json:
+        harness.write_json(options.json, results, env)
+        print(f"[bench] 结果已写入 {options.json}")
+    if options.compare:
+        baseline = harness.load_json(options.compare)
+        print(f"[bench] 与 {baseline['environment'].get('commit')} 对比 p50:")
+        for name, before, after, change in harness.compare(baseline, results):
+            print(f"{name:<40} {before:10.1f}us -> {after:10.1f}us  {change:+6.1f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+import os
+from datetime import datetime, timedelta
+import numpy as np
+
+#基准测试用的合成数据生成器
+
+
+def ppg_signal(n, fs=25, bpm=72, noise=200.0, seed=0):
+    # 带呼吸基线漂移和噪声的 PPG 信号，返回 (ir, red) 两个 uint32 数组
+    rng = np.random.default_rng(seed)
+    t = np.arange(n) / fs
+    beat = np.sin(2 * np.pi * bpm / 60.0 * t) + 0.3 * np.sin(4 * np.pi * bpm / 60.0 * t)
+    drift = 1500 * np.sin(2 * np.pi * 0.25 * t)
+    ir = 110000 + drift + 2000 * beat + rng.normal(0, noise, n)
+    red = 90000 + 0.8 * drift + 1200 * beat + rng.normal(0, noise, n)
+    return ir.astype(np.uint32), red.astype(np.uint32)
+
+
+def synthetic_video(path, frames=300, width=640, height=480, fps=25):
+    # 生成带移动色块的测试视频（不含人脸，测的是检测路径的开销）
+    import cv2
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8)
+    for i in range(frames):
+        frame = background.copy()
+        cx = int(width / 2 + width / 4 * np.sin(i / 20.0))
+        cy = int(height / 2 + height / 6 * np.cos(i / 15.0))
+        cv2.ellipse(frame, (cx, cy), (90, 120), 0, 0, 360, (150, 170, 200), -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def abnormal_log(path, lines=1_000_000, end=None, step=1.0):
+    # 写入 "时间 | 信息" 格式的旧日志，时间从 end 往前按 step 秒递减（文件中为升序）
+    end = end or datetime.now()
+    start = end - timedelta(seconds=step * (lines - 1))
+    messages = ("驾驶员有疲劳驾驶风险！", "驾驶员有酒驾风险！", "驾驶员心率异常: 130", "驾驶员血氧异常: 88")
+    base = start.timestamp()
+    with open(path, "w", encoding="utf-8") as f:
+        chunk = []
+        for i in range(lines):
+            ts = datetime.fromtimestamp(base + i * step).strftime("%Y-%m-%d %H:%M:%S")
+            chunk.append(f"{ts} | {messages[i % len(messages)]}\n")
+            if len(chunk) >= 10000:
+                f.writelines(chunk)
+                chunk = []
+        f.writelines(chunk)
+    return path
+
+
+def photo_folder(folder, count=50_000, end=None, step=5.0, name_format="%Y-%m-%d_%H-%M-%S"):
+    # 按抓拍命名格式生成 count 张小 JPEG（内容相同），时间从 end 往前按 step 秒递减
+    import cv2
+    os.makedirs(folder, exist_ok=True)
+    ok, buf = cv2.imencode(".jpg", np.full((48, 64, 3), 128, dtype=np.uint8))
+    data = buf.tobytes()
+    end = (end or datetime.now()).timestamp()
+    for i in range(count):
+        name = datetime.fromtimestamp(end - i * step).strftime(name_format) + ".jpg"
+        with open(os.path.join(folder, name), "wb") as f:
+            f.write(data)
+    return folder
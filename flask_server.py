@@ -1,12 +1,15 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
 import os
 from datetime import datetime, timedelta
-from urllib.parse import quote
-from script import messedge_tts
-import edge_tts
-import asyncio
-import pygame
-import io
+from script import speech_ipc, event_store, photo_index, metrics
+import json
+import base64
+import hashlib
+import threading
+import mimetypes
+import sys
+import time
+from werkzeug.security import safe_join
 
 
 app = Flask(__name__)
@@ -22,72 +25,444 @@ ALLOWED_EXTENSIONS = {"jpg", "jpeg", "png"}
 
 
 
+# 语音由 main.py（或多进程模式下的语音子进程）统一播放，提醒经本地套接字提交到同一个队列，
+# 安全警告才能打断正在播放的提醒。main.py 未运行（单独启动本服务）时退回本进程内的语音服务。
+speech = speech_ipc.SpeechClient()
+SPEECH_UNAVAILABLE = {"status": "error", "message": "语音服务不可用（未运行 main.py，且本机缺少 edge-tts/pygame）"}
+_local_speech = None
+_local_speech_lock = threading.Lock()
+
+
+def get_local_speech():
+    # 首次需要时才导入语音合成，缺少依赖时返回 None
+    global _local_speech
+    with _local_speech_lock:
+        if _local_speech is None:
+            try:
+                from script import messedge_tts
+            except ImportError as e:
+                print(f"[语音] 本地语音服务不可用: {e}")
+                return None
+            print("[语音] 未连接到 main.py 的语音服务，由本进程播放提醒")
+            _local_speech = speech_ipc.SpeechServer(messedge_tts.get_service())
+        return _local_speech
+
+
+def call_speech(op, **fields):
+    reply = speech.call(op, **fields)
+    if reply is not None and (op == "enqueue" or reply.get("error") != "not_found"):
+        return reply
+    if op != "enqueue" and _local_speech is None:
+        return reply  # 本进程没有受理过提醒，任务只可能在 main.py 中
+    local = get_local_speech()
+    if local is None:
+        return reply
+    return local.dispatch(dict(fields, op=op))
+
+
 @app.route("/submit_text", methods=["POST"])
 def receive_text():
-    data = request.get_json()
+    # 立即返回 202 和任务 ID，合成与播放在语音服务线程中进行
+    data = request.get_json(silent=True) or {}
     user_text = data.get("text", "")
+    if not user_text:
+        return jsonify({"status": "error", "message": "文本为空"}), 400
     print(f"[提醒文本] {user_text}")
-    asyncio.run(messedge_tts.text_to_speech_play(user_text, rate="+0%"))
-    return jsonify({"status": "success", "message": "文本已收到"}), 200
+
+    reply = call_speech("enqueue", text=user_text)
+    if reply is None:
+        return jsonify(SPEECH_UNAVAILABLE), 503
+    if not reply["ok"]:
+        return jsonify({"status": "error", "message": "提醒队列已满，请稍后再试"}), 503
+
+    job = reply["job"]
+    response = jsonify({"status": "success", "message": "文本已收到", **job})
+    response.headers["Location"] = f"/tts_jobs/{job['job_id']}"
+    return response, 202
+
+
+@app.route("/tts_jobs/<job_id>", methods=["GET", "DELETE"])
+def tts_job(job_id):
+    reply = call_speech("cancel" if request.method == "DELETE" else "status", job_id=job_id)
+    if reply is None:
+        return jsonify(SPEECH_UNAVAILABLE), 503
+    if reply.get("error") == "not_found":
+        return jsonify({"status": "error", "message": "任务不存在"}), 404
+    if reply.get("error") == "finished":
+        return jsonify({"status": "error", "message": "任务已结束，无法取消", **reply["job"]}), 409
+    return jsonify({"status": "success", **reply["job"]}), 200
+
+
+_store = None
+
+
+def get_event_store():
+    # 首次使用时导入旧的文本日志（自上次导入后有变化才会重新读取，已有记录自动跳过）
+    global _store
+    if _store is None:
+        store = event_store.get_store()
+        imported = store.sync_text_log(LOG_FILE_PATH)
+        if imported:
+            print(f"[事件] 导入旧日志 {imported} 条")
+        _store = store
+    return _store
+
+
+def parse_time_arg(value):
+    # 支持 "YYYY-mm-dd HH:MM:SS" 或 Unix 时间戳
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.strptime(value, "%Y-%m-%d %H:%M:%S").timestamp()
+
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return int(json.loads(base64.urlsafe_b64decode(padded.encode()))["id"])
+
+
+def event_to_dict(event):
+    return {
+        "id": event.id,
+        "time": datetime.fromtimestamp(event.ts).strftime("%Y-%m-%d %H:%M:%S"),
+        "kind": event.kind,
+        "value": event.value,
+        "source": event.source,
+        "message": event.message,
+    }
 
 
 @app.route("/get_recent_abnormal", methods=["GET"])
 def get_recent_abnormal():
-    if not os.path.exists(LOG_FILE_PATH):
+    """
+    参数（均可选）：
+      since / until: 时间范围，默认最近3天
+      limit: 最多返回条数
+      cursor: 上次响应中的 next_cursor，只返回之后新增的事件
+    支持 ETag / If-None-Match，无变化时返回 304。
+    """
+    if not os.path.exists(event_store.DB_PATH) and not os.path.exists(LOG_FILE_PATH):
         return jsonify({"status": "error", "message": "暂无异常记录"}), 404
 
-    three_days_ago = datetime.now() - timedelta(days=3)
-    recent_logs = []
+    try:
+        since = parse_time_arg(request.args.get("since"))
+        until = parse_time_arg(request.args.get("until"))
+        limit = request.args.get("limit", type=int)
+        cursor = request.args.get("cursor")
+        after_id = decode_cursor(cursor) if cursor else None
+    except (ValueError, KeyError, TypeError):
+        return jsonify({"status": "error", "message": "参数错误"}), 400
 
-    with open(LOG_FILE_PATH, "r") as f:
-        for line in f:
-            try:
-                date_str, message = line.strip().split(" | ", 1)
-                log_time = datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S")
-                if log_time >= three_days_ago:
-                    recent_logs.append(f"{date_str} | {message}")
-            except Exception:
+    if since is None and after_id is None:
+        since = (datetime.now() - timedelta(days=3)).timestamp()
+
+    # 先用一次聚合查询生成 ETag，客户端缓存仍有效时不取事件、不序列化，直接返回 304。
+    # 默认的 since 随时间推移，不放进 ETag；过期事件移出范围会改变条数
+    store = get_event_store()
+    stats = store.stats(since=since, until=until, after_id=after_id)
+    params = "&".join(f"{k}={request.args.get(k, '')}" for k in ("since", "until", "limit", "cursor"))
+    etag = hashlib.sha1(f"{params}|{stats}".encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    query_limit = limit + 1 if limit else None
+    events = store.query(since=since, until=until, limit=query_limit, after_id=after_id)
+    has_more = bool(limit) and len(events) > limit
+    if has_more:
+        events = events[:limit]
+
+    last_id = max((e.id for e in events), default=after_id or 0)
+    if after_id is None and not has_more:
+        # 完整拉取时游标指向当前最新事件，之后只需增量拉取
+        last_id = max(last_id, stats[3])
+    next_cursor = encode_cursor(last_id)
+
+    response = jsonify({
+        "status": "success",
+        "logs": [event_store.format_line(e) for e in events],
+        "events": [event_to_dict(e) for e in events],
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+    })
+    response.set_etag(etag)
+    return response
+
+
+MAX_SSE_CLIENTS = 16           # 同时保持的 /abnormal_stream 连接上限
+WAITRESS_REQUEST_THREADS = 8   # 生产模式下留给普通请求的线程数
+_sse_slots = threading.BoundedSemaphore(MAX_SSE_CLIENTS)
+
+
+@app.route("/abnormal_stream", methods=["GET"])
+def abnormal_stream():
+    """
+    Server-Sent Events：告警规则（script/alerts.py）写入新事件后立即推送。
+    断线重连时浏览器/客户端会带上 Last-Event-ID，也可以用 cursor 参数指定起点。
+    每个连接独占一个服务线程，超过 MAX_SSE_CLIENTS 时返回 503，客户端可改用轮询。
+    """
+    store = get_event_store()
+    try:
+        if request.headers.get("Last-Event-ID"):
+            after_id = int(request.headers["Last-Event-ID"])
+        elif request.args.get("cursor"):
+            after_id = decode_cursor(request.args["cursor"])
+        else:
+            after_id = store.last_id()
+    except (ValueError, KeyError, TypeError):
+        return jsonify({"status": "error", "message": "参数错误"}), 400
+    if not _sse_slots.acquire(blocking=False):
+        response = jsonify({"status": "error", "message": "实时连接过多，请改用 /get_recent_abnormal 轮询"})
+        response.headers["Retry-After"] = "30"
+        return response, 503
+
+    def generate(after_id):
+        yield "retry: 3000\n\n"
+        while True:
+            events = store.wait_for_events(after_id, timeout=15)
+            if not events:
+                yield ": keepalive\n\n"  # 保持连接
                 continue
+            for e in events:
+                after_id = e.id
+                data = json.dumps(event_to_dict(e), ensure_ascii=False)
+                yield f"id: {e.id}\nevent: abnormal\ndata: {data}\n\n"
 
-    return jsonify({"status": "success", "logs": recent_logs}), 200
+    response = Response(stream_with_context(generate(after_id)), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # 客户端断开后服务器关闭响应时归还名额（生成器尚未开始迭代时也会调用）
+    response.call_on_close(_sse_slots.release)
+    return response
 
 def is_valid_image(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+_photo_index = None
+_photo_index_lock = threading.Lock()
+
+
+def get_photo_index():
+    # 首次请求时扫描一次目录，之后由 inotify（或轮询）增量更新
+    global _photo_index
+    with _photo_index_lock:
+        if _photo_index is None:
+            _photo_index = photo_index.PhotoIndex(IMAGE_FOLDER, extensions=ALLOWED_EXTENSIONS).start()
+        return _photo_index
+
+
 @app.route("/get_recent_photos", methods=["GET"])
 def get_recent_photos():
+    """
+    参数（均可选）：
+      since / until: 时间范围，默认最近3天
+      page / page_size: 分页，page 从 1 开始，默认返回全部
+    """
     if not os.path.exists(IMAGE_FOLDER):
         return jsonify({"status": "error", "message": "没有找到图像文件夹"}), 404
 
-    three_days_ago = datetime.now() - timedelta(days=3)
-    image_info_list = []
+    try:
+        since = parse_time_arg(request.args.get("since"))
+        until = parse_time_arg(request.args.get("until"))
+        page = max(1, request.args.get("page", 1, type=int))
+        page_size = request.args.get("page_size", type=int)
+    except ValueError:
+        return jsonify({"status": "error", "message": "参数错误"}), 400
+    if since is None:
+        since = (datetime.now() - timedelta(days=3)).timestamp()
 
-    for fname in os.listdir(IMAGE_FOLDER):
-        if not is_valid_image(fname):
-            continue
+    offset = (page - 1) * page_size if page_size else 0
+    entries, total = get_photo_index().query(since=since, until=until, offset=offset, limit=page_size)
+
+    image_info_list = [{
+        "time": datetime.fromtimestamp(e["ts"]).strftime("%Y-%m-%d %H:%M:%S"),
+        "url": f"http://{SERVER_HOST}:{PORT}/image/{e['name']}",
+        "size": e["size"],
+        "width": e["width"],
+        "height": e["height"],
+    } for e in entries]
+
+    return jsonify({"status": "success", "images": image_info_list, "total": total,
+                    "page": page, "page_size": page_size}), 200
+
+THUMB_FOLDER = os.path.join(BASE_DIR, "thumb_cache")
+THUMB_SIZES = (160, 320, 640, 1024)  # size 参数向上取到这些档位，限制缓存的变体数量
+THUMB_MAX_BYTES = 64 * 1024 * 1024
+IMAGE_MAX_AGE = 7 * 24 * 3600  # 抓拍图片按时间命名，内容不会变化
+THUMB_MIN_AGE = 30  # 最近访问过的缩略图不淘汰，其他请求可能仍在发送该文件
+# 缩略图最近访问时间记录在内存中，不改写文件 mtime（否则 send_file 的 ETag/Last-Modified 每次都会变）。
+# 只记录缓存目录中现有的文件，淘汰时与文件一起清理
+_thumb_access = {}
+_thumb_bytes = None  # 缓存目录总大小的估计值，None 表示尚未扫描
+_thumb_evicting = False
+_thumb_lock = threading.Lock()
+
+
+def evict_thumbnails(max_bytes=None, min_age=THUMB_MIN_AGE):
+    """
+    按最近访问时间淘汰缩略图（本进程未访问过的按生成时间），直到总大小降到上限的 80% 以下，
+    避免刚淘汰完又超限。min_age 秒内访问过的文件跳过。
+    """
+    global _thumb_bytes, _thumb_evicting
+    if max_bytes is None:
+        max_bytes = THUMB_MAX_BYTES
+    try:
+        entries = []
+        total = 0
+        for entry in os.scandir(THUMB_FOLDER):
+            if not entry.name.endswith(".jpg"):
+                continue  # 正在写入的临时文件
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, entry.path))
+            total += st.st_size
+        with _thumb_lock:
+            existing = {path for _, _, path in entries}
+            for path in [p for p in _thumb_access if p not in existing]:
+                del _thumb_access[path]
+            entries = sorted((_thumb_access.get(path, mtime), size, path) for mtime, size, path in entries)
+
+        target = max_bytes * 0.8
+        now = time.time()
+        for _, size, path in entries:
+            if total <= target:
+                break
+            with _thumb_lock:
+                # 扫描之后可能又被访问过，在锁内重新确认，get_thumbnail 返回路径前也会先在锁内记录访问
+                if now - _thumb_access.get(path, 0) < min_age:
+                    continue
+                try:
+                    if now - os.path.getmtime(path) < min_age:
+                        continue  # 刚生成的文件
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+                _thumb_access.pop(path, None)
+        with _thumb_lock:
+            _thumb_bytes = total
+    finally:
+        _thumb_evicting = False
 
-        try:
-            name_without_ext = os.path.splitext(fname)[0]
-            timestamp = datetime.strptime(name_without_ext, "%Y-%m-%d_%H-%M-%S")
-            if timestamp >= three_days_ago:
-                image_info_list.append({
-                    "time": timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-                    "url": f"http://{SERVER_HOST}:{PORT}/image/{fname}"
-                })
-        except Exception:
-            continue
 
-    image_info_list.sort(key=lambda x: x["time"], reverse=True)
+def note_thumbnail_written(nbytes):
+    # 新缩略图写入后累计大小，估计值超过上限时在后台线程中淘汰，不阻塞当前请求
+    global _thumb_bytes, _thumb_evicting
+    with _thumb_lock:
+        if _thumb_bytes is not None:
+            _thumb_bytes += nbytes
+            if _thumb_bytes <= THUMB_MAX_BYTES:
+                return
+        if _thumb_evicting:
+            return
+        _thumb_evicting = True
+    threading.Thread(target=evict_thumbnails, daemon=True).start()
+
+
+def get_thumbnail(file_path, size):
+    """
+    缩略图只生成一次并缓存在磁盘上，原图更新时键随之变化。
+    返回 (缩略图路径, 键)，键由原图路径、修改时间和档位决定，可直接用作 ETag。
+    """
+    size = next((s for s in THUMB_SIZES if s >= size), THUMB_SIZES[-1])
+    st = os.stat(file_path)
+    key = hashlib.sha1(f"{file_path}|{st.st_mtime_ns}|{size}".encode()).hexdigest()
+    thumb_path = os.path.join(THUMB_FOLDER, key + ".jpg")
+    with _thumb_lock:
+        if os.path.exists(thumb_path):
+            _thumb_access[thumb_path] = time.time()
+            return thumb_path, key
+
+    import cv2
+    image = cv2.imread(file_path)
+    if image is None:
+        return None, None
+    h, w = image.shape[:2]
+    scale = min(1.0, size / max(h, w))
+    if scale < 1.0:
+        image = cv2.resize(image, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 80])
+    if not ok:
+        return None, None
+    os.makedirs(THUMB_FOLDER, exist_ok=True)
+    tmp_path = f"{thumb_path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(buf.tobytes())
+    with _thumb_lock:
+        os.replace(tmp_path, thumb_path)
+        _thumb_access[thumb_path] = time.time()
+    note_thumbnail_written(len(buf))
+    return thumb_path, key
 
-    return jsonify({"status": "success", "images": image_info_list}), 200
 
 @app.route("/image/<path:filename>")
 def serve_image(filename):
-    file_path = os.path.join(IMAGE_FOLDER, filename)
-    if os.path.exists(file_path):
-        return send_file(file_path, mimetype="image/jpeg")
-    else:
+    """
+    size 参数（可选）：返回最长边不超过 size 的缩略图。
+    支持 ETag / Last-Modified 条件请求和 Range 请求。
+    """
+    # 文件名限制在 IMAGE_FOLDER 之内
+    file_path = safe_join(IMAGE_FOLDER, filename)
+    if file_path is None or not is_valid_image(filename) or not os.path.isfile(file_path):
         return "File not found", 404
 
+    size = request.args.get("size", type=int)
+    if size:
+        thumb_path, key = get_thumbnail(file_path, max(1, size))
+        if thumb_path is None:
+            return "File not found", 404
+        # ETag 与 Last-Modified 都取自原图，缩略图文件重新生成或被访问时保持不变
+        return send_file(thumb_path, mimetype="image/jpeg", conditional=True, etag=key,
+                         last_modified=os.path.getmtime(file_path), max_age=IMAGE_MAX_AGE)
+
+    mimetype = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+    return send_file(file_path, mimetype=mimetype, conditional=True, etag=True,
+                     max_age=IMAGE_MAX_AGE)
+
+
+@app.before_request
+def start_timer():
+    request.environ["safedrive.start"] = time.perf_counter()
+
+
+@app.after_request
+def observe_request(response):
+    start = request.environ.get("safedrive.start")
+    if start is not None and request.endpoint is not None:
+        metrics.stage("flask", request.endpoint).observe(time.perf_counter() - start)
+    return response
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    # 本进程的请求耗时与 main.py（语音、各传感器阶段） 通过本地套接字提供的指标合并输出
+    snapshots = [metrics.REGISTRY.snapshot()]
+    remote = metrics.fetch()
+    if remote is not None:
+        snapshots.extend(remote)
+    return Response(metrics.render(snapshots), mimetype="text/plain; version=0.0.4")
+
+
+#运行方式：
+#  开发调试: python flask_server.py（Werkzeug 多线程开发服务器）
+#  生产部署: python flask_server.py --production（依赖 waitress：pip install waitress，多线程 WSGI 服务）
+#  照片索引、缩略图访问记录保存在进程内，只能以单进程多线程方式运行，不要使用多 worker 进程。
+#  提醒语音优先交给 main.py 播放（告警可打断提醒）；main.py 未运行时由本进程自己的语音服务播放。
+#  每个 /abnormal_stream 连接会一直占用一个 waitress 线程，线程数在 SSE 上限之外另留普通请求使用。
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
+    if "--production" in sys.argv:
+        try:
+            from waitress import serve
+        except ImportError:
+            sys.exit("生产模式需要 waitress：pip install waitress")
+        serve(app, host="0.0.0.0", port=PORT, threads=MAX_SSE_CLIENTS + WAITRESS_REQUEST_THREADS)
+    else:
+        app.run(host="0.0.0.0", port=PORT, threaded=True)
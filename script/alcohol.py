@@ -1,24 +1,268 @@
 import os
+import select
+import threading
+import time
+from collections import deque
+import numpy as np
+from script import vitals_bus
+
+IIO_SYSFS_ROOT = '/sys/bus/iio/devices'
+IIO_DEV_ROOT = '/dev'
+ERROR_BACKOFF_MAX = 5.0  # 连续读取失败时重试间隔的上限（秒）
+
+def raw_to_voltage(raw_value, vref=3.3, max_raw=4095):
+    return (raw_value / max_raw) * vref
 
 class AlcoholSensor:
+    # 文件描述符保持打开，每次用 pread 从头重新读取 sysfs 属性
     def __init__(self, device_path='/sys/bus/iio/devices/iio:device0/in_voltage4_raw'):
         self.device_path = device_path
-        
+        self._fd = None
+
+    def _read_raw(self):
+        if self._fd is None:
+            self._fd = os.open(self.device_path, os.O_RDONLY)
+        try:
+            return int(os.pread(self._fd, 32, 0).strip())
+        except (OSError, ValueError):
+            # 设备可能被重新加载，下次重新打开
+            self.close()
+            raise
+
     def read_raw_value(self):
         try:
-            with open(self.device_path, 'r') as f:
-                raw_value = int(f.read().strip())
-            return raw_value
+            return self._read_raw()
         except (IOError, ValueError) as e:
             print(f"Error reading sensor value: {e}")
             return None
-    
-    def read_voltage(self, vref=3.3, max_raw=4095):
-        raw_value = self.read_raw_value()
+
+    def read_voltage(self, vref=3.3, max_raw=4095, raw_value=None):
+        # 传入 raw_value 时直接换算，不再额外读一次
+        if raw_value is None:
+            raw_value = self.read_raw_value()
         if raw_value is not None:
-            return (raw_value / max_raw) * vref
+            return raw_to_voltage(raw_value, vref, max_raw)
         return None
 
+    def read_sample(self, vref=3.3, max_raw=4095):
+        # 原始值与电压来自同一次采样
+        raw_value = self.read_raw_value()
+        if raw_value is None:
+            return None, None
+        return raw_value, raw_to_voltage(raw_value, vref, max_raw)
+
+    def close(self):
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+
+    def __del__(self):
+        self.close()
+
+
+class IIOBufferedReader:
+    """
+    IIO 缓冲模式：打开 /dev/iio:deviceN，一次读出多个扫描样本。
+    需要设备已配置触发器（如 hrtimer），可通过 trigger 参数写入 trigger/current_trigger。
+    只使能 channel 一个通道，且不带时间戳，每个扫描样本就是一个存储单元。
+    """
+
+    def __init__(self, device=0, channel='voltage4', sysfs_root=IIO_SYSFS_ROOT, dev_root=IIO_DEV_ROOT,
+                 buffer_length=256, trigger=None):
+        self.sysfs_path = f"{sysfs_root}/iio:device{device}"
+        self.dev_path = f"{dev_root}/iio:device{device}"
+        self.channel = channel
+        self.buffer_length = buffer_length
+        self.trigger = trigger
+        self._fd = None
+        self.dtype, self.shift, self.mask = self._parse_type()
+
+    def _sysfs(self, name):
+        return f"{self.sysfs_path}/{name}"
+
+    def _write_attr(self, name, value):
+        with open(self._sysfs(name), 'w') as f:
+            f.write(str(value))
+
+    def _parse_type(self):
+        # 例如 "le:u12/16>>0"：小端、无符号、12 位有效、16 位存储、右移 0 位
+        with open(self._sysfs(f"scan_elements/in_{self.channel}_type")) as f:
+            spec = f.read().strip()
+        endian, rest = spec.split(':')
+        sign = rest[0]
+        bits, rest = rest[1:].split('/')
+        storage, shift = rest.split('>>')
+        storage_bytes = int(storage) // 8
+        dtype = np.dtype(f"{'<' if endian == 'le' else '>'}{'i' if sign == 's' else 'u'}{storage_bytes}")
+        return dtype, int(shift), (1 << int(bits)) - 1
+
+    def start(self):
+        if self.trigger:
+            self._write_attr("trigger/current_trigger", self.trigger)
+        self._write_attr(f"scan_elements/in_{self.channel}_en", 1)
+        self._write_attr("buffer/length", self.buffer_length)
+        self._write_attr("buffer/enable", 1)
+        self._fd = os.open(self.dev_path, os.O_RDONLY | os.O_NONBLOCK)
+        return self
+
+    def read(self, timeout=1.0):
+        # 返回本次读到的全部原始值（numpy 数组），超时返回空数组
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return np.empty(0, dtype=np.int64)
+        try:
+            data = os.read(self._fd, self.dtype.itemsize * self.buffer_length)
+        except BlockingIOError:
+            return np.empty(0, dtype=np.int64)
+        usable = len(data) - len(data) % self.dtype.itemsize
+        values = np.frombuffer(data[:usable], dtype=self.dtype).astype(np.int64)
+        return (values >> self.shift) & self.mask
+
+    def stop(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        try:
+            self._write_attr("buffer/enable", 0)
+        except OSError:
+            pass
+
+
+class AlcoholSampler:
+    """
+    后台过采样：以 rate_hz 读取传感器（或使用 IIO 缓冲模式批量读取），
+    保留最近 window 个样本，对外提供滚动中位数/均值，降低单次读数的噪声。
+    连续 fault_after 次读取失败时在总线上发布 ALCOHOL_FAULT=1 和 ALCOHOL=None，恢复后发布 ALCOHOL_FAULT=0。
+    """
+
+    def __init__(self, sensor=None, rate_hz=50, window=50, buffered=None, vref=3.3, max_raw=4095,
+                 publish_every=10, vitals=None, recorder=None, fault_after=3):
+        self.sensor = sensor or AlcoholSensor()
+        self.recorder = recorder  # 可选，记录每个原始采样值以便回放
+        # 每 publish_every 个新样本向总线发布一次滚动中位数，0 为不发布
+        self.publish_every = publish_every
+        self.vitals = vitals or vitals_bus.bus
+        self._since_publish = 0
+        self.buffered = buffered
+        self.rate_hz = rate_hz
+        self.vref = vref
+        self.max_raw = max_raw
+        self.samples = deque(maxlen=window)
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.fault_after = fault_after
+        self.faulted = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, stop_event=None):
+        self._thread = threading.Thread(target=self._run, args=(stop_event,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _stopping(self, stop_event):
+        return self._stop.is_set() or (stop_event is not None and stop_event.is_set())
+
+    def _run(self, stop_event):
+        if self.buffered is not None:
+            self.buffered.start()
+            try:
+                while not self._stopping(stop_event):
+                    values = self.buffered.read(timeout=0.5)
+                    if len(values):
+                        if self.recorder is not None:
+                            now = time.time()
+                            for value in values.tolist():
+                                self.recorder.record_alcohol(now, value)
+                        with self._lock:
+                            self.samples.extend(values.tolist())
+                        self._maybe_publish(len(values))
+            finally:
+                self.buffered.stop()
+            return
+
+        period = 1.0 / self.rate_hz
+        next_time = time.monotonic()
+        while not self._stopping(stop_event):
+            try:
+                value = self.sensor._read_raw()
+            except (OSError, ValueError) as e:
+                self._on_error(e)
+                # 连续失败时按指数退避重试，不以采样率反复打开设备
+                self._stop.wait(min(period * 2 ** self.consecutive_errors, ERROR_BACKOFF_MAX))
+                next_time = time.monotonic()
+                continue
+            if self.consecutive_errors:
+                self._on_recover()
+            if self.recorder is not None:
+                self.recorder.record_alcohol(time.time(), value)
+            with self._lock:
+                self.samples.append(value)
+            self._maybe_publish(1)
+            next_time += period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                next_time = time.monotonic()  # 落后太多时不追赶
+
+    def _on_error(self, e):
+        self.errors += 1
+        self.consecutive_errors += 1
+        if self.consecutive_errors == 1:
+            print(f"[酒精] 读取传感器失败: {e}")
+        if self.consecutive_errors == self.fault_after:
+            self.faulted = True
+            print(f"[酒精] 连续 {self.fault_after} 次读取失败，传感器故障")
+            # 丢弃故障前的样本，滚动中位数不再代表当前读数
+            with self._lock:
+                self.samples.clear()
+            self._since_publish = 0
+            self.vitals.publish(vitals_bus.ALCOHOL_FAULT, 1, source="alcohol")
+            self.vitals.publish(vitals_bus.ALCOHOL, None, source="alcohol")
+
+    def _on_recover(self):
+        print(f"[酒精] 传感器恢复（此前连续失败 {self.consecutive_errors} 次）")
+        self.consecutive_errors = 0
+        if self.faulted:
+            self.faulted = False
+            self.vitals.publish(vitals_bus.ALCOHOL_FAULT, 0, source="alcohol")
+
+    def _maybe_publish(self, count):
+        if not self.publish_every:
+            return
+        self._since_publish += count
+        if self._since_publish >= self.publish_every:
+            self._since_publish = 0
+            raw_value, _ = self.median()
+            self.vitals.publish(vitals_bus.ALCOHOL, raw_value, source="alcohol")
+
+    def _stat(self, func):
+        with self._lock:
+            if not self.samples:
+                return None, None
+            raw_value = float(func(np.fromiter(self.samples, dtype=np.float64)))
+        return raw_value, raw_to_voltage(raw_value, self.vref, self.max_raw)
+
+    def median(self):
+        # 返回 (原始值, 电压)，两者来自同一组样本
+        return self._stat(np.median)
+
+    def mean(self):
+        return self._stat(np.mean)
+
 
 #测试用
 '''
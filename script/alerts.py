@@ -0,0 +1,102 @@
+from script import motor, vitals_bus, event_store, speech_ipc
+
+#告警规则、提示语和显示设置，main.py（单进程）与 script.supervisor（多进程）共用。
+#本模块只依赖轻量模块，监督进程导入它时不会加载 dlib、OpenCV 或语音合成。
+
+HOLD_FLAG = 1000
+SHOW_PLOT = True  # 车载无显示器时设为 False，心率血氧采集在后台线程独立运行
+SHOW_VIDEO = True  # 车载无显示器时设为 False，眨眼检测不做任何绘制和窗口调用
+
+FATIGUE_WARNING_TEXT = "检测到您已连续驾驶较长时间，疲劳会降低反应速度哦～建议在安全区域休息20分钟再出发吧！"
+ALCOHOL_WARNING_TEXT = "系统检测到您可能饮酒，方向盘和酒精的‘组合技’风险超高！建议您改日再开车~"
+
+# 播放告警语音的对象（需有 enqueue(text, priority=...)）；None 时使用本进程的 messedge_tts 服务，
+# 多进程模式下由监督进程设为转发到语音子进程的代理
+speech = None
+
+
+def speak(text):
+    if speech is None:
+        from script import messedge_tts  # 语音栈较重，首次告警时才导入
+        messedge_tts.enqueue(text, priority=speech_ipc.PRIORITY_ALERT)
+    else:
+        speech.enqueue(text, priority=speech_ipc.PRIORITY_ALERT)
+
+
+def log_abnormal(info, kind="abnormal", value=None, source=None):
+    # 写入异常事件库（后台批量写入，不阻塞调用线程）
+    event_store.get_store().append(info, kind=kind, value=value, source=source)
+
+#eg:log_abnormal("血氧过低")
+
+
+def hand_on_sensor(bus):
+    return bus.value(vitals_bus.HAND_FLAG) > HOLD_FLAG
+
+
+def low_spo2(reading, bus):
+    return reading.value < 90 and bus.value(vitals_bus.BPM) != 0 and hand_on_sensor(bus)
+
+
+def on_low_spo2(reading):
+    print("[警告] SpO₂ 低于 90%")
+    log_abnormal("血氧过低", kind="low_spo2", value=reading.value, source="hrspo2")
+    motor.play_pattern("escalate")
+
+
+class StableHeartRate:
+    # 心率一直保持在参考值 ±threshold 以内时条件成立，持续时长由规则的 debounce 控制
+    def __init__(self, threshold=2):
+        self.threshold = threshold
+        self.reference = None
+
+    def __call__(self, reading, bus):
+        bpm = reading.value
+        if bpm == 0:
+            return False
+        if self.reference is None or abs(bpm - self.reference) > self.threshold:
+            self.reference = bpm
+            return False
+        return hand_on_sensor(bus)
+
+
+def on_stable_heart_rate(reading):
+    try:
+        print("[警告] 心率稳定时间过长，疑似疲劳")
+        log_abnormal("心率稳定时间过长，疑似疲劳", kind="stable_heart_rate", value=reading.value, source="hrspo2")
+        speak(FATIGUE_WARNING_TEXT)
+        motor.play_pattern("pulse_train")
+    except Exception as e:
+        print(f"[错误] 触发马达失败: {e}")
+
+
+def alcohol_detected(reading, bus):
+    return reading.value is not None and reading.value < 2000
+
+
+def on_alcohol(reading):
+    # 相同内容还在排队时会被合并，不会重复播报
+    speak(ALCOHOL_WARNING_TEXT)
+
+
+def build_rules():
+    return [
+        vitals_bus.AlertRule("low_spo2", [vitals_bus.SPO2], low_spo2, on_low_spo2,
+                             debounce=1.0, cooldown=10.0),
+        vitals_bus.AlertRule("stable_heart_rate", [vitals_bus.BPM], StableHeartRate(), on_stable_heart_rate,
+                             debounce=50.0, cooldown=50.0),
+        vitals_bus.AlertRule("alcohol", [vitals_bus.ALCOHOL], alcohol_detected, on_alcohol,
+                             debounce=1.0, cooldown=30.0),
+    ]
+
+
+def print_status(stop_event, bus=None):
+    # 只负责定期打印，告警由规则引擎在新读数到达时触发
+    bus = bus or vitals_bus.bus
+    while not stop_event.wait(5):
+        print(f"[监控] 当前心率: {bus.value(vitals_bus.BPM)} BPM, 血氧: {bus.value(vitals_bus.SPO2):.1f}%")
+        value = bus.value(vitals_bus.ALCOHOL, None)
+        if bus.value(vitals_bus.ALCOHOL_FAULT):
+            print("酒精传感器故障，读数不可用")
+        elif value is not None:
+            print(f"酒精传感器原始值: {value:.0f}")
@@ -1,11 +1,15 @@
 from scipy.spatial import distance as dist
-from collections import OrderedDict
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 import numpy as np
 import time
+import threading
+import queue
 import dlib
 import cv2
 import os
+from script import vitals_bus, metrics
 
 ear = {'value': 0}
 blinks = {'value': 0}
@@ -32,117 +36,547 @@ def shape_to_np(shape, dtype="int"):
         coords[i] = (shape.part(i).x, shape.part(i).y)
     return coords
 
-def run_blink_detection(stop_event=None, video_source=''):
+#快速路径：只取双眼的 12 个关键点，顺序为右眼、左眼
+EYE_IDXS = tuple(range(*FACIAL_LANDMARKS_68_IDXS["right_eye"])) + tuple(range(*FACIAL_LANDMARKS_68_IDXS["left_eye"]))
+
+def shape_to_eyes_np(shape, dtype="int"):
+    coords = [(p.x, p.y) for p in map(shape.part, EYE_IDXS)]
+    return np.array(coords, dtype=dtype).reshape(2, 6, 2)
+
+def eyes_aspect_ratio(eyes):
+    # 一次向量化计算所有眼睛的 EAR，eyes 形状为 (..., 6, 2)
+    eyes = np.asarray(eyes, dtype=np.float64)
+    diff = eyes[..., (1, 2, 0), :] - eyes[..., (5, 4, 3), :]
+    d = np.sqrt((diff * diff).sum(axis=-1))
+    return (d[..., 0] + d[..., 1]) / (2.0 * d[..., 2])
+
+def detect_face(detector, gray, scale=0.5):
+    # 在缩小的灰度图上检测人脸，再把矩形映射回原图坐标供关键点预测使用
+    if scale != 1.0:
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    else:
+        small = gray
+    rects = detector(small, 0)
+    if len(rects) == 0:
+        return None
+    r = rects[0]
+    return dlib.rectangle(int(r.left() / scale), int(r.top() / scale),
+                          int(r.right() / scale), int(r.bottom() / scale))
+
+class StageTimer:
+    # 各处理阶段耗时统计，每 report_every 帧打印一次平均值（毫秒），同时计入 metrics 直方图
+    def __init__(self, report_every=100, name="blink"):
+        self.report_every = report_every
+        self.name = name
+        self.totals = {}
+        self.frames = 0
+        self._histograms = {}
+
+    @contextmanager
+    def stage(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def add(self, stage, seconds):
+        self.totals[stage] = self.totals.get(stage, 0.0) + seconds
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            histogram = self._histograms[stage] = metrics.stage(self.name, stage)
+        histogram.observe(seconds)
+
+    def frame_done(self):
+        self.frames += 1
+        if self.report_every and self.frames >= self.report_every:
+            print(f"[{self.name}] " + self.summary())
+            self.totals = {}
+            self.frames = 0
+
+    def averages(self):
+        return {k: v / max(1, self.frames) * 1000 for k, v in self.totals.items()}
+
+    def summary(self):
+        return ", ".join(f"{k}: {v:.1f}ms" for k, v in self.averages().items())
+
+
+class LatestFrameCapture:
+    """
+    采集线程：持续读取摄像头，只保留最新一帧并统计丢帧数，处理端总是拿到最新的画面，
+    避免慢帧在 V4L2 缓冲区里堆积。输入为视频文件时默认不丢帧（等待处理端取走上一帧），
+    便于测试结果可复现。
+    """
+
+    def __init__(self, source, width=1056, height=784, drop_frames=None, capture=None, recorder=None):
+        self.source = source
+        # capture 可传入与 cv2.VideoCapture 接口相同的对象（如 script.recording.ReplayCapture）
+        self.cap = capture if capture is not None else cv2.VideoCapture(source)
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        if drop_frames is None:
+            if capture is not None:
+                drop_frames = getattr(capture, "realtime", True)
+            else:
+                drop_frames = not (isinstance(source, str) and os.path.isfile(source))
+        self.drop_frames = drop_frames
+        self.recorder = recorder
+        self._capture_histogram = metrics.stage("blink", "capture")
+        self._dropped_counter = metrics.REGISTRY.counter(
+            "safedrive_frames_dropped_total", "采集线程覆盖掉的未处理帧数").labels()
+
+        self.dropped = 0
+        self.captured = 0
+        self.capture_time = 0.0  # 累计 read() 耗时
+        self._cond = threading.Condition()
+        self._frame = None
+        self._frame_time = None
+        self._eof = False
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped:
+            start = time.perf_counter()
+            ret, frame = self.cap.read()
+            grabbed_at = time.perf_counter()
+            if ret and self.recorder is not None:
+                self.recorder.record_frame(time.time(), frame)
+            with self._cond:
+                if not ret:
+                    self._eof = True
+                    self._cond.notify_all()
+                    break
+                self.capture_time += grabbed_at - start
+                self._capture_histogram.observe(grabbed_at - start)
+                self.captured += 1
+                if not self.drop_frames:
+                    self._cond.wait_for(lambda: self._frame is None or self._stopped)
+                elif self._frame is not None:
+                    self.dropped += 1  # 上一帧还没被处理就被新帧覆盖
+                    self._dropped_counter.inc()
+                self._frame = frame
+                self._frame_time = grabbed_at
+                self._cond.notify_all()
+
+    def read(self, timeout=1.0):
+        # 返回 (ret, frame, 采集时刻)；frame 只会被取走一次
+        with self._cond:
+            self._cond.wait_for(lambda: self._frame is not None or self._eof or self._stopped, timeout)
+            if self._frame is None:
+                return False, None, None
+            frame, grabbed_at = self._frame, self._frame_time
+            self._frame = None
+            self._cond.notify_all()
+            return True, frame, grabbed_at
+
+    def finished(self):
+        with self._cond:
+            return self._frame is None and (self._eof or self._stopped)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        self.cap.release()
+
+
+class FrameResult:
+    def __init__(self, rect=None, eyes=None, ear=None, fatigue=False):
+        self.rect = rect
+        self.eyes = eyes        # (2, 6, 2)，右眼、左眼
+        self.ear = ear
+        self.fatigue = fatigue  # 60秒内眨眼超过阈值
+
+
+class BlinkDetector:
+    """
+    处理阶段：人脸检测/跟踪、关键点、EAR 与眨眼计数。
+    """
+
+    EYE_AR_THRESH = 0.2 #判断闭眼的阈值
+    EYE_AR_CONSEC_FRAMES = 12 #连续EYE_AR_CONSEC_FRAMES帧EAR低于阈值才计为一次有效眨眼
+    FATIGUE_BLINKS = 8 #60秒内眨眼次数超过该值判定为疲劳
+
+    def __init__(self, predictor_path, detect_scale=0.5, track_psr_thresh=7.0,
+                 max_track_frames=300, timer=None):
+        self.detector = dlib.get_frontal_face_detector()
+        self.predictor = dlib.shape_predictor(predictor_path)
+        self.tracker = dlib.correlation_tracker()
+        self.detect_scale = detect_scale
+        self.track_psr_thresh = track_psr_thresh
+        self.max_track_frames = max_track_frames
+        self.timer = timer or StageTimer(report_every=0)
+
+        self.tracking_face = False
+        self.frames_since_detect = 0
+        self.rect = None
+        self.counter = 0
+        self.total = 0
+        self.blink_timestamps = deque()  # 用于记录眨眼时间戳
+
+    def _locate_face(self, frame, gray):
+        if self.tracking_face:
+            with self.timer.stage("track"):
+                # update() 返回峰值旁瓣比，跟踪置信度低时才重新检测
+                psr = self.tracker.update(frame)
+            self.frames_since_detect += 1
+            if psr < self.track_psr_thresh or self.frames_since_detect >= self.max_track_frames:
+                self.tracking_face = False
+            else:
+                pos = self.tracker.get_position()
+                self.rect = dlib.rectangle(int(pos.left()), int(pos.top()), int(pos.right()), int(pos.bottom()))
+
+        if not self.tracking_face:
+            with self.timer.stage("detect"):
+                self.rect = detect_face(self.detector, gray, self.detect_scale)
+                if self.rect is not None:
+                    self.tracker.start_track(frame, self.rect)
+                    self.tracking_face = True
+                    self.frames_since_detect = 0
+        return self.rect
+
+    def process(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        rect = self._locate_face(frame, gray)
+        if rect is None:
+            return FrameResult()
+
+        with self.timer.stage("landmarks"):
+            shape = self.predictor(gray, rect)
+            eyes = shape_to_eyes_np(shape)
+
+        with self.timer.stage("ear"):
+            rightEAR, leftEAR = eyes_aspect_ratio(eyes)
+            avg_ear = float(leftEAR + rightEAR) / 2.0
+
+            now = datetime.now()
+            if avg_ear < self.EYE_AR_THRESH:
+                self.counter += 1
+            else:
+                if self.counter >= self.EYE_AR_CONSEC_FRAMES:
+                    self.total += 1
+                    self.blink_timestamps.append(now)  # 添加当前眨眼时间
+                self.counter = 0
+
+            # 保留最近60秒内的眨眼记录
+            while self.blink_timestamps and now - self.blink_timestamps[0] >= timedelta(seconds=60):
+                self.blink_timestamps.popleft()
+
+        return FrameResult(rect, eyes, avg_ear, len(self.blink_timestamps) > self.FATIGUE_BLINKS)
+
+
+PHOTO_NAME_FORMAT = "%Y-%m-%d_%H-%M-%S"  # 与 flask_server.get_recent_photos 解析的格式一致
+
+
+class FrameHistory:
+    """
+    疲劳事件前的画面缓存：每 interval 秒保留一帧缩小后的画面，只保留最近 seconds 秒，
+    内存占用有上限。JPEG 编码推迟到写盘线程中完成。
+    """
+
+    def __init__(self, seconds=5.0, interval=1.0, scale=0.5):
+        self.interval = interval
+        self.scale = scale
+        self.frames = deque(maxlen=max(1, int(seconds / interval)))
+        self._last_added = None
+
+    def add(self, frame, now):
+        if self._last_added is not None and (now - self._last_added).total_seconds() < self.interval:
+            return
+        small = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        self.frames.append((now, small))
+        self._last_added = now
+
+    def before(self, now):
+        # 触发时刻之前、且与触发帧不在同一秒的缓存帧（文件名精确到秒）
+        trigger_name = now.strftime(PHOTO_NAME_FORMAT)
+        return [(t, f) for t, f in self.frames if t.strftime(PHOTO_NAME_FORMAT) != trigger_name]
+
+
+class AsyncPhotoWriter:
+    """
+    后台编码、写盘线程，避免 cv2.imwrite 阻塞检测循环。队列有上限，满时丢弃并计数。
+    """
+
+    def __init__(self, folder="captured_images", max_pending=16, quality=90):
+        self.folder = folder
+        self.quality = quality
+        self.dropped = 0
+        self.written = 0
+        self.queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, when, frame):
+        filename = when.strftime(PHOTO_NAME_FORMAT) + ".jpg"
+        try:
+            self.queue.put_nowait((filename, frame))
+            return filename
+        except queue.Full:
+            self.dropped += 1
+            return None
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            filename, frame = item
+            path = os.path.join(self.folder, filename)
+            try:
+                if os.path.exists(path):
+                    continue
+                ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+                if ok:
+                    # 先写临时文件再改名，避免接口读到不完整的图片
+                    tmp_path = path + ".part"
+                    with open(tmp_path, "wb") as f:
+                        f.write(buf.tobytes())
+                    os.replace(tmp_path, path)
+                    self.written += 1
+            except Exception as e:
+                print(f"[ERROR] failed to save {filename}: {e}")
+
+    def close(self, timeout=5):
+        self.queue.put(None)
+        self._thread.join(timeout=timeout)
+
+
+def draw_overlay(frame, result, total, fps):
+    if result.rect is not None:
+        rightEye, leftEye = result.eyes
+        leftEyeHull = cv2.convexHull(leftEye)
+        rightEyeHull = cv2.convexHull(rightEye)
+        cv2.drawContours(frame, [leftEyeHull], -1, (0, 255, 0), 1)
+        cv2.drawContours(frame, [rightEyeHull], -1, (0, 255, 0), 1)
+
+        cv2.putText(frame, f"Blinks: {total}", (10, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+        cv2.putText(frame, f"EAR: {result.ear:.2f}", (300, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+
+    cv2.putText(frame, f"FPS: {fps:.2f}", (10, 60),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
+    return frame
+
+
+class WindowSink:
+    # 调试画面输出到 OpenCV 窗口，按 ESC 返回 False 以退出
+    def write(self, frame):
+        cv2.imshow("Frame", frame)
+        return (cv2.waitKey(1) & 0xFF) != 27
+
+    def close(self):
+        cv2.destroyAllWindows()
+
+
+class VideoFileSink:
+    # 调试画面写入视频文件
+    def __init__(self, path, fps=10.0, fourcc="MJPG"):
+        self.path = path
+        self.fps = fps
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.writer = None
+
+    def write(self, frame):
+        if self.writer is None:
+            h, w = frame.shape[:2]
+            self.writer = cv2.VideoWriter(self.path, self.fourcc, self.fps, (w, h))
+        self.writer.write(frame)
+        return True
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.release()
+
+
+class MjpegSink:
+    """
+    以 MJPEG (multipart/x-mixed-replace) 形式推送调试画面，浏览器访问 http://<ip>:<port>/ 即可查看。
+    只保存最新一帧的 JPEG，没有客户端连接时也只有编码开销。
+    """
+
+    def __init__(self, port=8081, quality=70):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        self.quality = quality
+        self._cond = threading.Condition()
+        self._jpeg = None
+        self._seq = 0
+        self._closed = False
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+                self.end_headers()
+                seq = 0
+                try:
+                    while True:
+                        with sink._cond:
+                            sink._cond.wait_for(lambda: sink._seq != seq or sink._closed, timeout=5)
+                            if sink._closed:
+                                break
+                            seq, jpeg = sink._seq, sink._jpeg
+                        if jpeg is None:
+                            continue
+                        self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\n")
+                        self.wfile.write(f"Content-Length: {len(jpeg)}\r\n\r\n".encode())
+                        self.wfile.write(jpeg)
+                        self.wfile.write(b"\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def write(self, frame):
+        ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if ok:
+            with self._cond:
+                self._jpeg = buf.tobytes()
+                self._seq += 1
+                self._cond.notify_all()
+        return True
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def make_debug_sink(spec):
+    # "window"、"file:<路径>"、"mjpeg:<端口>"，也可以直接传入带 write()/close() 的对象
+    if spec is None or not isinstance(spec, str):
+        return spec
+    if spec == "window":
+        return WindowSink()
+    if spec.startswith("file:"):
+        return VideoFileSink(spec[len("file:"):])
+    if spec.startswith("mjpeg:"):
+        return MjpegSink(int(spec[len("mjpeg:"):]))
+    raise ValueError(f"未知的调试输出: {spec}")
+
+
+def run_blink_detection(stop_event=None, video_source='', detect_scale=0.5,
+                        track_psr_thresh=7.0, max_track_frames=300, report_every=100,
+                        headless=False, debug_sink=None, debug_every=1, pre_event_seconds=5.0,
+                        capture=None, recorder=None):
+    """
+    :param video_source: 视频文件路径，为空时使用摄像头 /dev/video11
+    :param detect_scale: 人脸检测时的图像缩放比例
+    :param track_psr_thresh: 跟踪器峰值旁瓣比低于该值时重新检测人脸
+    :param max_track_frames: 连续跟踪的最大帧数，超过后强制重新检测
+    :param report_every: 每处理多少帧打印一次各阶段耗时，0 为不打印
+    :param headless: 无界面模式，不做任何绘制和窗口调用（车载运行）
+    :param debug_sink: 调试画面输出，"window"、"file:<路径>"、"mjpeg:<端口>" 或自定义对象；
+                       非 headless 且未指定时默认为 "window"
+    :param debug_every: 每隔多少帧才绘制并输出一次调试画面
+    :param pre_event_seconds: 疲劳拍照时一并保存的事件前画面时长（每秒一张，缩小保存）
+    :param capture: 可选的采集对象，替代 cv2.VideoCapture（用于回放）
+    :param recorder: 可选的 script.recording.Recorder，记录采集到的每一帧
+    """
+    if int(debug_every) < 1:
+        raise ValueError(f"debug_every 必须为正整数，当前为 {debug_every}")
+    debug_every = int(debug_every)
     args = {
         "shape_predictor": "./script/shape_predictor_68_face_landmarks.dat",
         "video": video_source
     }
 
-    EYE_AR_THRESH = 0.2 #判断闭眼的阈值
-    EYE_AR_CONSEC_FRAMES = 12 #连续EYE_AR_CONSEC_FRAMES帧EAR低于阈值才计为一次有效眨眼
-    COUNTER = 0
-    TOTAL = 0
-
-    blink_timestamps = []  # 用于记录眨眼时间戳
     last_photo_time = None
     PHOTO_COOLDOWN = 10  # 拍照冷却时间（秒）
 
     if not os.path.exists("captured_images"):
         os.makedirs("captured_images")
+    photo_writer = AsyncPhotoWriter("captured_images")
+    history = FrameHistory(seconds=pre_event_seconds)
+
+    if debug_sink is None and not headless:
+        debug_sink = "window"
+    sink = make_debug_sink(debug_sink)
 
+    timer = StageTimer(report_every=report_every)
     print("[INFO] loading facial landmark predictor...")
-    detector = dlib.get_frontal_face_detector()
-    predictor = dlib.shape_predictor(args["shape_predictor"])
-    (lStart, lEnd) = FACIAL_LANDMARKS_68_IDXS["left_eye"]
-    (rStart, rEnd) = FACIAL_LANDMARKS_68_IDXS["right_eye"]
+    blink_detector = BlinkDetector(args["shape_predictor"], detect_scale, track_psr_thresh,
+                                   max_track_frames, timer=timer)
 
     print("[INFO] starting video stream...")
-    vs = cv2.VideoCapture('/dev/video11' if args["video"] == "" else args["video"])
-    time.sleep(1.0)
-    vs.set(cv2.CAP_PROP_FRAME_WIDTH, 1056)
-    vs.set(cv2.CAP_PROP_FRAME_HEIGHT, 784)
+    vs = LatestFrameCapture('/dev/video11' if args["video"] == "" else args["video"],
+                            capture=capture, recorder=recorder).start()
 
-    tracker = dlib.correlation_tracker()
-    tracking_face = False
     frame_count = 0
-    TRACK_EVERY_N_FRAMES = 20
-    rect = None
+    try:
+        while True:
+            if stop_event and stop_event.is_set():
+                break
 
-    while True:
-        if stop_event and stop_event.is_set():
-            break
+            ret, frame, grabbed_at = vs.read()
+            if not ret:
+                if vs.finished():
+                    break
+                continue
 
-        ret, frame = vs.read()
-        if not ret:
-            break
+            start_time = time.perf_counter()
+            timer.add("queue", start_time - grabbed_at)
+            result = blink_detector.process(frame)
+            # FPS 只统计处理本身，不含绘制和显示
+            fps = 1.0 / max(1e-6, time.perf_counter() - start_time)
+            frame_count += 1
 
-        start_time = time.time()
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        frame_count += 1
-
-        if not tracking_face or frame_count % TRACK_EVERY_N_FRAMES == 0:
-            rects = detector(gray, 0)
-            if len(rects) > 0:
-                rect = rects[0]
-                tracker.start_track(frame, rect)
-                tracking_face = True
-            else:
-                tracking_face = False
-                rect = None
-        elif tracking_face:
-            tracker.update(frame)
-            pos = tracker.get_position()
-            rect = dlib.rectangle(int(pos.left()), int(pos.top()), int(pos.right()), int(pos.bottom()))
-
-        if rect is not None:
-            shape = predictor(gray, rect)
-            shape = shape_to_np(shape)
-
-            leftEye = shape[lStart:lEnd]
-            rightEye = shape[rStart:rEnd]
-            leftEAR = eye_aspect_ratio(leftEye)
-            rightEAR = eye_aspect_ratio(rightEye)
-            ear = (leftEAR + rightEAR) / 2.0
-
-            if ear < EYE_AR_THRESH:
-                COUNTER += 1
-            else:
-                if COUNTER >= EYE_AR_CONSEC_FRAMES:
-                    TOTAL += 1
-                    blink_timestamps.append(datetime.now())  # 添加当前眨眼时间
-                COUNTER = 0
+            # 读数时间戳取采集时刻，规则引擎据此统计采集到告警的端到端延迟
+            sensed_at = time.time() - (time.perf_counter() - grabbed_at)
+            if result.ear is not None:
+                ear['value'] = result.ear
+                vitals_bus.bus.publish(vitals_bus.EAR, result.ear, source="detect_blinks", timestamp=sensed_at)
+            if blink_detector.total != blinks['value']:
+                blinks['value'] = blink_detector.total
+                vitals_bus.bus.publish(vitals_bus.BLINKS, blink_detector.total, source="detect_blinks",
+                                       timestamp=sensed_at)
 
-            # 保留最近60秒内的眨眼记录
             now = datetime.now()
-            blink_timestamps = [t for t in blink_timestamps if now - t < timedelta(seconds=60)]
-
-            # 检测是否需要拍照
-            if len(blink_timestamps) > 8:
+            if result.fatigue:
+                # 检测是否需要拍照：触发帧及事件前几秒的缓存帧都交给后台线程写盘
                 if last_photo_time is None or (now - last_photo_time).total_seconds() > PHOTO_COOLDOWN:
-                    filename = now.strftime("%Y-%m-%d_%H-%M-%S") + ".jpg"
-                    cv2.imwrite(os.path.join("captured_images", filename), frame)
-                    print(f"[INFO] Fatigue detected, photo saved as {filename}")
+                    for t, small in history.before(now):
+                        photo_writer.submit(t, small)
+                    filename = photo_writer.submit(now, frame.copy())
+                    if filename:
+                        print(f"[INFO] Fatigue detected, photo saved as {filename}")
+                    else:
+                        print("[INFO] Fatigue detected, photo queue full, frame dropped")
                     last_photo_time = now
+            with timer.stage("history"):
+                history.add(frame, now)
 
-            leftEyeHull = cv2.convexHull(leftEye)
-            rightEyeHull = cv2.convexHull(rightEye)
-            cv2.drawContours(frame, [leftEyeHull], -1, (0, 255, 0), 1)
-            cv2.drawContours(frame, [rightEyeHull], -1, (0, 255, 0), 1)
-
-            cv2.putText(frame, f"Blinks: {TOTAL}", (10, 30),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-            cv2.putText(frame, f"EAR: {ear:.2f}", (300, 30),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-
-        end_time = time.time()
-        fps = 1.0 / (end_time - start_time)
-        cv2.putText(frame, f"FPS: {fps:.2f}", (10, 60),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
-
-        cv2.imshow("Frame", frame)
-        key = cv2.waitKey(1) & 0xFF
-        if key == 27:
-            break
+            # 端到端延迟：从采集到处理完成
+            timer.add("latency", time.perf_counter() - grabbed_at)
 
-    vs.release()
-    cv2.destroyAllWindows()
+            keep_running = True
+            if sink is not None and frame_count % debug_every == 0:
+                with timer.stage("debug"):
+                    keep_running = sink.write(draw_overlay(frame, result, blink_detector.total, fps))
+            timer.frame_done()
+            if keep_running is False:
+                break
+    finally:
+        vs.stop()
+        print(f"[INFO] captured {vs.captured} frames, dropped {vs.dropped}")
+        photo_writer.close()
+        if sink is not None:
+            sink.close()
@@ -0,0 +1,278 @@
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(BASE_DIR, "abnormal_events.db")
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+Event = namedtuple("Event", "id ts kind value source message")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    value REAL,
+    source TEXT,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_ts ON events (ts);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def format_line(event):
+    # 与原 abnormal_log.txt 相同的 "时间 | 信息" 格式
+    return f"{datetime.fromtimestamp(event.ts).strftime(TIME_FORMAT)} | {event.message}"
+
+
+class EventStore:
+    """
+    异常事件存储：SQLite WAL 模式，按时间建索引，时间范围查询为 O(log n + k)。
+    append() 只把事件放入队列，由后台线程批量写入，不阻塞调用方。
+    main.py 写入、flask_server.py 读取，WAL 模式下读写互不阻塞。
+    """
+
+    def __init__(self, path=None, batch_size=64, max_pending=10000):
+        self.path = path or DB_PATH  # 调用时再取 DB_PATH，测试/回放可在导入后修改
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._local = threading.local()
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+    def _conn(self):
+        # 每个线程使用自己的连接
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def append(self, message, kind="abnormal", value=None, source=None, ts=None):
+        self._ensure_writer()
+        row = (time.time() if ts is None else ts, kind, value, source, message)
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _ensure_writer(self):
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        conn = self._conn()
+        while True:
+            row = self._queue.get()
+            if row is None:
+                self._queue.task_done()
+                break
+            rows = [row]
+            stop = False
+            # 把已排队的事件合并到同一个事务里
+            while len(rows) < self.batch_size:
+                try:
+                    row = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if row is None:
+                    stop = True
+                    break
+                rows.append(row)
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO events (ts, kind, value, source, message) VALUES (?, ?, ?, ?, ?)", rows)
+            except sqlite3.Error as e:
+                print(f"[事件] 写入失败: {e}")
+            for _ in range(len(rows) + (1 if stop else 0)):
+                self._queue.task_done()
+            if stop:
+                break
+
+    def flush(self):
+        # 等待队列中的事件全部写入
+        if self._writer is not None:
+            self._queue.join()
+
+    def close(self):
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(timeout=5)
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def query(self, since=None, until=None, limit=None, after_id=None, kind=None, newest_first=False):
+        """
+        按时间范围查询，since/until 为 datetime 或时间戳（含 since，不含 until）。
+        after_id 用于增量拉取：只返回 id 大于该值的事件。
+        """
+        where, params = _where(since, until, after_id, kind)
+        sql = "SELECT id, ts, kind, value, source, message FROM events" + where
+        if after_id is not None:
+            sql += " ORDER BY id"  # 增量拉取按写入顺序
+        else:
+            sql += " ORDER BY ts DESC, id DESC" if newest_first else " ORDER BY ts, id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        return [Event(*row) for row in self._conn().execute(sql, params)]
+
+    def wait_for_events(self, after_id, timeout=15.0, poll_interval=0.2, limit=100):
+        """
+        等待 id 大于 after_id 的新事件，超时返回空列表。
+        写入方通常是另一个进程（main.py），用 PRAGMA data_version 低成本地判断是否有新提交。
+        """
+        conn = self._conn()
+        deadline = time.monotonic() + timeout
+        version = None
+        while True:
+            current = conn.execute("PRAGMA data_version").fetchone()[0]
+            if current != version:
+                version = current
+                events = self.query(after_id=after_id, limit=limit)
+                if events:
+                    return events
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return []
+            time.sleep(min(poll_interval, remaining))
+
+    def stats(self, since=None, until=None, after_id=None, kind=None):
+        """
+        一次聚合查询返回 (范围内条数, 最小 id, 最大 id, 全表最大 id)，条件同 query()。
+        事件只追加不修改，这几个值不变即查询结果不变，可用于生成 ETag 而无需取出事件。
+        """
+        where, params = _where(since, until, after_id, kind)
+        sql = f"SELECT COUNT(*), MIN(id), MAX(id), (SELECT MAX(id) FROM events) FROM events{where}"
+        count, min_id, max_id, last_id = self._conn().execute(sql, params).fetchone()
+        return count, min_id or 0, max_id or 0, last_id or 0
+
+    def count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    def last_id(self):
+        row = self._conn().execute("SELECT MAX(id) FROM events").fetchone()
+        return row[0] or 0
+
+    def import_text_log(self, log_path, encodings=("utf-8", "gbk")):
+        """
+        一次性导入旧的 abnormal_log.txt（"时间 | 信息" 每行一条），自动识别 UTF-8/GBK 编码。
+        已存在相同时间和内容的事件会跳过，重复导入不会产生重复记录。返回导入条数。
+        """
+        with open(log_path, "rb") as f:
+            data = f.read()
+        text = None
+        for encoding in encodings:
+            try:
+                text = data.decode(encoding)
+                break
+            except UnicodeDecodeError:
+                continue
+        if text is None:
+            text = data.decode(encodings[0], errors="replace")
+
+        rows = []
+        for line in text.splitlines():
+            try:
+                date_str, message = line.strip().split(" | ", 1)
+                ts = datetime.strptime(date_str, TIME_FORMAT).timestamp()
+            except ValueError:
+                continue
+            rows.append((ts, "abnormal", None, "import", message))
+
+        conn = self._conn()
+        imported = 0
+        with conn:
+            for row in rows:
+                exists = conn.execute("SELECT 1 FROM events WHERE ts = ? AND message = ? LIMIT 1",
+                                      (row[0], row[4])).fetchone()
+                if exists is None:
+                    conn.execute("INSERT INTO events (ts, kind, value, source, message) VALUES (?, ?, ?, ?, ?)", row)
+                    imported += 1
+        return imported
+
+    def sync_text_log(self, log_path):
+        """
+        旧日志自上次导入后有变化（大小或修改时间不同）时重新导入，否则直接返回 0。
+        导入标记保存在 meta 表里；import_text_log 会跳过已有记录，重复导入是安全的。
+        """
+        try:
+            st = os.stat(log_path)
+        except OSError:
+            return 0
+        key = f"imported:{os.path.abspath(log_path)}"
+        marker = f"{st.st_size}:{st.st_mtime_ns}"
+        conn = self._conn()
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        if row is not None and row[0] == marker:
+            return 0
+        imported = self.import_text_log(log_path)
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, marker))
+        return imported
+
+
+def _where(since, until, after_id, kind):
+    clauses, params = [], []
+    if since is not None:
+        clauses.append("ts >= ?")
+        params.append(_to_ts(since))
+    if until is not None:
+        clauses.append("ts < ?")
+        params.append(_to_ts(until))
+    if after_id is not None:
+        clauses.append("id > ?")
+        params.append(after_id)
+    if kind is not None:
+        clauses.append("kind = ?")
+        params.append(kind)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+def _to_ts(value):
+    return value.timestamp() if isinstance(value, datetime) else float(value)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store(path=None):
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = EventStore(path)
+        return _store
+
+
+#一次性导入旧日志: python -m script.event_store import abnormal_log.txt
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "import":
+        store = EventStore()
+        print(f"导入 {store.import_text_log(sys.argv[2])} 条记录")
+        store.close()
+    else:
+        print("用法: python -m script.event_store import <abnormal_log.txt>")
@@ -1,14 +1,16 @@
 import time
 import threading
 from smbus2 import SMBus
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
 from collections import deque
 import numpy as np
-from scipy.signal import butter, filtfilt
+from functools import lru_cache
+from scipy.signal import butter, filtfilt, sosfilt, sosfilt_zi, sosfiltfilt
+from smbus2 import i2c_msg
+from script import vitals_bus, metrics
 
 latest_bpm = {'value': 0}
 latest_spo2 = {'value': 0}
+latest_bpm_confidence = {'value': 0.0} #心率置信度 0~1，由 RR 间期的离散程度得出
 flag = {'value': 0} #用于判断驾驶员的手是否在传感器上，以免误报
 #I2C设置
 I2C_BUS_NUM = 7
@@ -28,11 +30,62 @@ REG_SPO2_CONFIG = 0x0A
 REG_LED1_PA = 0x0C
 REG_LED2_PA = 0x0D
 
+#采样设置，需与 setup_sensor() 中的寄存器配置保持一致
+SPO2_SAMPLE_RATE = 100  # REG_SPO2_CONFIG=0x27 -> 100Hz
+FIFO_SAMPLE_AVG = 4     # REG_FIFO_CONFIG=0x4F -> 每4个样本平均后写入FIFO
+SAMPLE_RATE = SPO2_SAMPLE_RATE / FIFO_SAMPLE_AVG  # FIFO 实际出数速率
+FIFO_DEPTH = 32
+FIFO_A_FULL_SAMPLES = FIFO_DEPTH - 0xF  # REG_FIFO_CONFIG 低 4 位 FIFO_A_FULL=15：未读样本达到 17 个时置位将满中断
+INTR_A_FULL = 0x80  # REG_INTR_STATUS_1 第 7 位，读该寄存器时清除
+BYTES_PER_SAMPLE = 6  # SpO2 模式下 RED、IR 各 3 字节
+
 #滤波器
-def lowpass_filter(data, cutoff=8, fs=100, order=1):
-    b, a = butter(order, cutoff / (0.5 * fs), btype='low')
+# 截止频率按采样率的比例给出：原 100Hz 下 8Hz 即 0.16 倍奈奎斯特频率，25Hz 下对应 2Hz，
+# 保留心率基频（最高约 3Hz），滤掉高频噪声。采样率变化时不需要手动调整
+LOWPASS_CUTOFF_RATIO = 0.08
+
+@lru_cache(maxsize=16)
+def design_lowpass(cutoff, fs, order, output='ba'):
+    # 滤波器系数只设计一次
+    return butter(order, cutoff / (0.5 * fs), btype='low', output=output)
+
+def lowpass_filter(data, cutoff=None, fs=SAMPLE_RATE, order=1):
+    # cutoff 为 None 时取 LOWPASS_CUTOFF_RATIO * fs
+    b, a = design_lowpass(cutoff or LOWPASS_CUTOFF_RATIO * fs, fs, order)
     return filtfilt(b, a, data)
 
+
+class StreamingLowpass:
+    """
+    流式巴特沃斯低通滤波器：系数预先计算，滤波状态 zi 在多次调用间保持，
+    每批数据的开销只与批大小有关。zero_phase=True 时对每个数据块单独做
+    sosfiltfilt，适合离线按块处理（块之间不保持状态）。
+    """
+
+    def __init__(self, cutoff=None, fs=SAMPLE_RATE, order=1, zero_phase=False):
+        self.sos = design_lowpass(cutoff or LOWPASS_CUTOFF_RATIO * fs, fs, order, output='sos')
+        self.zero_phase = zero_phase
+        self._zi_unit = sosfilt_zi(self.sos)
+        self.zi = None
+
+    def reset(self):
+        self.zi = None
+
+    def process(self, data):
+        data = np.asarray(data, dtype=np.float64)
+        if len(data) == 0:
+            return data
+        if self.zero_phase:
+            # sosfiltfilt 需要足够长的数据块做边界填充
+            padlen = min(len(data) - 1, 3 * (2 * len(self.sos) + 1))
+            return sosfiltfilt(self.sos, data, padlen=padlen)
+        if self.zi is None:
+            # 以第一个样本初始化状态，避免上电时的阶跃瞬态
+            self.zi = self._zi_unit * data[0]
+        out, self.zi = sosfilt(self.sos, data, zi=self.zi)
+        return out
+
+
 def setup_sensor(bus):
     bus.write_byte_data(I2C_ADDR, REG_MODE_CONFIG, 0x40)
     time.sleep(0.1)
@@ -55,153 +108,469 @@ def read_fifo(bus):
         print(f"读取错误: {e}")
         return 0, 0
 
+def read_fifo_block(bus, length):
+    # 一次 I2C 事务读出 length 字节的 FIFO 数据（read_i2c_block_data 最多 32 字节）
+    if hasattr(bus, 'i2c_rdwr'):
+        write = i2c_msg.write(I2C_ADDR, [REG_FIFO_DATA])
+        read = i2c_msg.read(I2C_ADDR, length)
+        bus.i2c_rdwr(write, read)
+        return bytes(list(read))
+    return bytes(bus.read_i2c_block_data(I2C_ADDR, REG_FIFO_DATA, length))
+
+def decode_fifo(data):
+    # 将 FIFO 原始字节解码为 (ir, red) 二维数组
+    raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, BYTES_PER_SAMPLE).astype(np.uint32)
+    red = (raw[:, 0] << 16) | (raw[:, 1] << 8) | raw[:, 2]
+    ir = (raw[:, 3] << 16) | (raw[:, 4] << 8) | raw[:, 5]
+    return np.column_stack((ir & 0x3FFFF, red & 0x3FFFF))
+
+
+class FifoBatch:
+    def __init__(self, samples, timestamps, first_index, overflow, read_at=None):
+        self.samples = samples          # shape (n, 2)，列依次为 ir、red
+        self.timestamps = timestamps    # 每个样本的时间戳（秒），按采样率推算
+        self.first_index = first_index  # 第一个样本的全局序号
+        self.overflow = overflow        # FIFO 满后丢失的样本数，缺口位于本批样本之后
+        self.read_at = read_at          # 读出时的 time.time()，用于统计端到端延迟
+
+    def __len__(self):
+        return len(self.samples)
+
+
+class FifoReader:
+    """
+    批量读取 MAX30102 FIFO：根据读写指针一次读出所有待处理样本。
+    样本时间戳由采样率推算，不依赖调用时刻，溢出丢失的样本也计入时钟。
+    """
+
+    def __init__(self, bus, sample_rate=SAMPLE_RATE, start_time=None, clock=time.monotonic):
+        self.bus = bus
+        self.sample_rate = sample_rate
+        self.start_time = time.time() if start_time is None else start_time
+        self.clock = clock
+        self.sample_index = 0
+        self.total_overflow = 0
+        self._last_read = None  # 上次读出 FIFO 的时刻（clock），None 表示尚未读过
+        self._a_full = False    # 读中断状态会清除将满标志，在下次读出 FIFO 前保留
+
+    def pending(self):
+        wr = self.bus.read_byte_data(I2C_ADDR, REG_FIFO_WR_PTR) & 0x1F
+        rd = self.bus.read_byte_data(I2C_ADDR, REG_FIFO_RD_PTR) & 0x1F
+        overflow = self.bus.read_byte_data(I2C_ADDR, REG_OVF_COUNTER) & 0x1F
+        if overflow:
+            count = FIFO_DEPTH  # 溢出时 FIFO 已满，读写指针相等
+        elif wr != rd:
+            count = (wr - rd) & 0x1F
+        else:
+            # 指针相等时 FIFO 可能为空，也可能恰好存满 32 个样本、尚未溢出。
+            # 满时必然经过了将满中断；同时要求距上次读出已足够产生 17 个样本，
+            # 避免把上次读出之前遗留的中断标志误当作 FIFO 已满
+            if self.bus.read_byte_data(I2C_ADDR, REG_INTR_STATUS_1) & INTR_A_FULL:
+                self._a_full = True
+            elapsed_ok = (self._last_read is None or
+                          self.clock() - self._last_read >= FIFO_A_FULL_SAMPLES / self.sample_rate)
+            count = FIFO_DEPTH if self._a_full and elapsed_ok else 0
+        return count, overflow
+
+    def read(self):
+        count, overflow = self.pending()
+        self._last_read = self.clock()
+        self._a_full = False
+        if count == 0:
+            samples = np.empty((0, 2), dtype=np.uint32)
+        else:
+            samples = decode_fifo(read_fifo_block(self.bus, count * BYTES_PER_SAMPLE))
+
+        first_index = self.sample_index
+        indices = np.arange(first_index, first_index + len(samples))
+        timestamps = self.start_time + indices / self.sample_rate
+        # FIFO_ROLLOVER 关闭：FIFO 满后丢弃的是新样本，缺口在本批样本之后
+        self.sample_index += len(samples) + overflow
+        self.total_overflow += overflow
+        return FifoBatch(samples, timestamps, first_index, overflow, read_at=time.time())
+
+class RingBuffer:
+    """
+    预分配的环形缓冲区。数据同时写入前后两半（长度 2*capacity），最近 capacity 个样本
+    始终是一段连续内存，view()/tail() 直接返回切片视图而不拷贝。
+    同时维护累加和与平方和，mean()/std() 的开销为 O(1)。
+    """
+
+    def __init__(self, capacity, fill=0.0):
+        self.capacity = capacity
+        self._data = np.full(2 * capacity, fill, dtype=np.float64)
+        self._pos = 0
+        self._sum = float(fill) * capacity
+        self._sumsq = float(fill) * float(fill) * capacity
+        self._since_resync = 0
+
+    def __len__(self):
+        return self.capacity
+
+    def append(self, value):
+        cap = self.capacity
+        old = self._data[self._pos]
+        self._data[self._pos] = value
+        self._data[self._pos + cap] = value
+        self._sum += value - old
+        self._sumsq += value * value - old * old
+        self._pos = (self._pos + 1) % cap
+        self._since_resync += 1
+        if self._since_resync >= cap:
+            self._resync()
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        n = len(values)
+        cap = self.capacity
+        if n == 0:
+            return
+        if n >= cap:
+            self._data[:cap] = values[-cap:]
+            self._data[cap:] = values[-cap:]
+            self._pos = 0
+            self._resync()
+            return
+        old = self.view()[:n]
+        self._sum += values.sum() - old.sum()
+        self._sumsq += np.dot(values, values) - np.dot(old, old)
+        first = min(n, cap - self._pos)
+        for offset in (0, cap):
+            self._data[self._pos + offset:self._pos + offset + first] = values[:first]
+            self._data[offset:offset + n - first] = values[first:]
+        self._pos = (self._pos + n) % cap
+        self._since_resync += n
+        if self._since_resync >= cap:
+            self._resync()
+
+    def _resync(self):
+        # 定期重新求和，消除浮点累加误差
+        window = self.view()
+        self._sum = float(window.sum())
+        self._sumsq = float(np.dot(window, window))
+        self._since_resync = 0
+
+    def view(self):
+        # 由旧到新排列的最近 capacity 个样本（零拷贝）
+        return self._data[self._pos:self._pos + self.capacity]
+
+    def tail(self, n):
+        end = self._pos + self.capacity
+        return self._data[end - n:end]
+
+    def last(self):
+        return self._data[self._pos + self.capacity - 1]
+
+    def mean(self):
+        return self._sum / self.capacity
+
+    def std(self):
+        mean = self.mean()
+        return max(0.0, self._sumsq / self.capacity - mean * mean) ** 0.5
+
+
+class HeartRateEstimator:
+    """
+    批量心率估计：对每批新数据做向量化峰值检测，峰值间隔用样本序号和采样率计算，
+    与系统时钟和界面刷新无关。RR 间期取滚动中位数得到 BPM，并给出置信度。
+    阈值为最近 threshold_window 个样本的 mean + k*std，与原逐样本逻辑一致。
+    """
+
+    def __init__(self, fs=SAMPLE_RATE, threshold_window=30, k=0.4,
+                 min_interval=0.3, max_interval=2.0, rr_history=8):
+        self.fs = fs
+        self.threshold_window = threshold_window
+        self.k = k
+        self.min_gap = min_interval * fs
+        self.max_gap = max_interval * fs
+        self.rr = deque(maxlen=rr_history)  # RR 间期，单位为样本数
+        self._history = np.empty(0)
+        self._next_index = 0
+        self.last_peak_index = None
+        self.bpm = 0
+        self.confidence = 0.0
+
+    def process(self, block, start_index=None):
+        """
+        处理一批连续样本，返回本批检测到的峰值全局序号。
+        start_index 为该批第一个样本的序号；与上一批不连续（如 FIFO 溢出）时丢弃历史。
+        """
+        block = np.asarray(block, dtype=np.float64)
+        if start_index is None:
+            start_index = self._next_index
+        if start_index != self._next_index:
+            self._history = np.empty(0)
+        x = np.concatenate((self._history, block))
+        base = start_index - len(self._history)
+        self._next_index = start_index + len(block)
+        self._history = x[-(self.threshold_window + 1):]
+        if len(x) < 3:
+            return np.empty(0, dtype=np.int64)
+
+        # 滑动窗口均值/标准差：先去均值再做累加和，长数据也不会损失精度
+        xc = x - x.mean()
+        c1 = np.concatenate(([0.0], np.cumsum(xc)))
+        c2 = np.concatenate(([0.0], np.cumsum(xc * xc)))
+        # 候选点 i 的阈值窗口为 [i+2-W, i+1]，包含其后一个样本
+        ends = np.arange(3, len(x) + 1)
+        starts = np.maximum(ends - self.threshold_window, 0)
+        n = ends - starts
+        mean = (c1[ends] - c1[starts]) / n
+        var = np.maximum((c2[ends] - c2[starts]) / n - mean * mean, 0.0)
+        threshold = mean + self.k * np.sqrt(var) + x.mean()
+
+        mid = x[1:-1]
+        is_peak = (x[:-2] < mid) & (mid > x[2:]) & (mid > threshold)
+        # 历史中已判断过的候选点不再重复判断
+        first_new = max(len(x) - len(block) - 1, 1)
+        is_peak[:first_new - 1] = False
+        peaks = np.flatnonzero(is_peak) + 1 + base
+
+        for p in peaks.tolist():
+            if self.last_peak_index is not None:
+                gap = p - self.last_peak_index
+                if gap < self.min_gap:
+                    continue  # 不应期内的重复峰
+                if gap < self.max_gap:
+                    self.rr.append(gap)
+            self.last_peak_index = p
+        self._update_estimate()
+        return peaks
+
+    def _update_estimate(self):
+        if not self.rr:
+            return
+        rr = np.asarray(self.rr, dtype=np.float64)
+        median = np.median(rr)
+        self.bpm = int(round(60 * self.fs / median))
+        spread = np.median(np.abs(rr - median)) / median
+        self.confidence = max(0.0, 1.0 - 4 * spread) * len(rr) / self.rr.maxlen
+
+
+def estimate_heart_rate(signal, fs=SAMPLE_RATE, block_size=1024, **kwargs):
+    # 离线验证：按块处理录制的 PPG，返回所有峰值序号及每块结束时的 (bpm, confidence)
+    estimator = HeartRateEstimator(fs=fs, **kwargs)
+    peaks, estimates = [], []
+    for start in range(0, len(signal), block_size):
+        peaks.append(estimator.process(signal[start:start + block_size], start))
+        estimates.append((estimator.bpm, estimator.confidence))
+    return np.concatenate(peaks) if peaks else np.empty(0, dtype=np.int64), np.asarray(estimates)
+
+def estimate_spo2(red_buffer, ir_buffer):
+    # 由 AC/DC 比值估算血氧：SpO2 = 110 - 25 * R
+    red_ac, ir_ac = red_buffer.std(), ir_buffer.std()
+    red_dc, ir_dc = red_buffer.mean(), ir_buffer.mean()
+    if ir_ac <= 0 or red_ac <= 0 or red_dc <= 0 or ir_dc <= 0:
+        return 0
+    r = (red_ac / red_dc) / (ir_ac / ir_dc)
+    return max(0, min(100, 110 - 25 * r)) if r > 0 else 0
+
 def calculate_ylim(data, margin=0.1):
-    valid_data = [x for x in data if x > 1000]
-    if not valid_data:
+    data = np.asarray(data)
+    valid_data = data[data > 1000]
+    if len(valid_data) == 0:
         return 0, 100000
-    min_val = min(valid_data)
-    max_val = max(valid_data)
+    min_val = valid_data.min()
+    max_val = valid_data.max()
     range_val = max(1, max_val - min_val)
     return (min_val - margin * range_val, max_val + margin * range_val)
 
-def run_hrspo2(stop_event=None):
-    # 初始化状态标志
-    animation_running = True
-    resources_initialized = False
-    
-    try:
-        window_size = 200
-        ir_buffer = deque([0]*window_size, maxlen=window_size)
-        red_buffer = deque([0]*window_size, maxlen=window_size)
-        ir_filtered = deque([0]*window_size, maxlen=window_size)
-        sample_index = 0
-        peak_x, peak_y = deque([], maxlen=20), deque([], maxlen=20)
-        last_peak_time = [None]
-
-        # 初始化图形界面
-        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 6), sharex=True)
-        x_vals = list(range(window_size))
-
-        line_ir, = ax1.plot(x_vals, ir_buffer, label='IR Raw', color='red')
-        line_ir_filt, = ax1.plot(x_vals, ir_filtered, label='IR Filtered', color='darkred')
-        scatter_peak = ax1.scatter([], [], color='green', s=40, label='Peaks')
-        text_info = ax1.text(0.02, 0.95, '', transform=ax1.transAxes, fontsize=10, verticalalignment='top')
-        line_red, = ax2.plot(x_vals, red_buffer, label='RED', color='blue')
-
-        ax1.set_title("MAX30102 Heart Rate & SpO₂ Monitor")
-        ax1.set_ylabel("IR Value")
-        ax1.legend(loc="upper right")
-        ax2.set_ylabel("RED Value")
-        ax2.set_xlabel("Sample Index")
-        ax2.legend(loc="upper right")
-        plt.tight_layout()
+class HrSpo2Engine:
+    """
+    与界面解耦的采集线程：批量读取 FIFO，完成滤波、峰值检测和血氧计算，
+    结果写入 latest_bpm / latest_spo2 / flag。绘图只是可选的订阅者，通过 snapshot() 取数据。
+    """
 
-        # 初始化硬件
-        bus = SMBus(I2C_BUS_NUM)
-        setup_sensor(bus)
-        resources_initialized = True
+    def __init__(self, bus, window_size=200, poll_interval=0.1, vitals=None, recorder=None):
+        self.bus = bus
+        self.recorder = recorder  # 可选，记录原始 FIFO 样本以便回放
+        self.vitals = vitals or vitals_bus.bus  # 读数发布到的总线
+        self.fifo = FifoReader(bus)
+        self.window_size = window_size
+        self.poll_interval = poll_interval  # FIFO 深度 32，25Hz 下约 1.3s 才会写满
+
+        self.ir_buffer = RingBuffer(window_size)
+        self.red_buffer = RingBuffer(window_size)
+        self.ir_filtered = RingBuffer(window_size)
+        self.heart_rate = HeartRateEstimator()
+        self.lowpass = StreamingLowpass()
+        self.peak_x, self.peak_y = deque([], maxlen=20), deque([], maxlen=20)
+        self.stages = {name: metrics.stage("hrspo2", name) for name in ("i2c_read", "filter", "peaks", "spo2")}
+
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, stop_event=None):
+        self._thread = threading.Thread(target=self._run, args=(stop_event,), daemon=True)
+        self._thread.start()
+        return self
 
-        def update(frame):
-            nonlocal sample_index, animation_running
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
 
-            # 检查停止信号
-            if stop_event and stop_event.is_set():
-                if animation_running:
-                    animation_running = False
-                    plt.close(fig)
-                return []
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
 
+    def _should_stop(self, stop_event):
+        return self._stop.is_set() or (stop_event is not None and stop_event.is_set())
+
+    def _run(self, stop_event):
+        while not self._should_stop(stop_event):
+            try:
+                with self.stages["i2c_read"].time():
+                    batch = self.fifo.read()
+            except Exception as e:
+                print(f"读取错误: {e}")
+                self._stop.wait(self.poll_interval)
+                continue
+            if batch.overflow:
+                print(f"[hrspo2] FIFO 溢出，丢失 {batch.overflow} 个样本")
+            if self.recorder is not None and len(batch):
+                self.recorder.record_ppg(batch)
             try:
-                ir, red = read_fifo(bus)
-                sample_index += 1
-                ir_buffer.append(ir)
-                red_buffer.append(red)
-
-                if len(ir_buffer) == window_size:
-                    ir_filtered_np = lowpass_filter(list(ir_buffer))
-                    ir_filtered.clear()
-                    ir_filtered.extend(ir_filtered_np)
-
-                    #标记变量以检测驾驶员的手是否在方向盘上
-                    flag['value'] = list(ir_filtered)[-1]
-
-                    raw = list(ir_buffer)
-                    if sample_index >= 5:
-                        mid = raw[-3]
-                        prev1 = raw[-4]
-                        next1 = raw[-2]
-
-                        mean_val = np.mean(raw[-30:])
-                        std_val = np.std(raw[-30:])
-                        threshold = mean_val + 0.4 * std_val
-
-                        if prev1 < mid > next1 and mid > threshold:
-                            now = time.time()
-                            if last_peak_time[0]:
-                                interval = now - last_peak_time[0]
-                                if 0.3 < interval < 2.0:
-                                    bpm = int(60 / interval)
-                                    latest_bpm['value'] = bpm
-                            last_peak_time[0] = now
-                            peak_x.append(sample_index - 3)
-                            peak_y.append(mid)
-
-                    # 计算血氧
-                    red_np = np.array(red_buffer)
-                    ir_np = np.array(ir_buffer)
-                    red_ac = np.std(red_np)
-                    ir_ac = np.std(ir_np)
-                    red_dc = np.mean(red_np)
-                    ir_dc = np.mean(ir_np)
-                    r = (red_ac / red_dc) / (ir_ac / ir_dc) if ir_ac > 0 and red_ac > 0 else 0
-                    spo2 = max(0, min(100, 110 - 25 * r)) if r > 0 else 0
-                    latest_spo2['value'] = spo2
-
-                # 更新图形
-                line_ir.set_ydata(list(ir_buffer))
-                line_ir_filt.set_ydata(list(ir_filtered))
-                scatter_peak.set_offsets(np.c_[(peak_x, peak_y)])
-                line_red.set_ydata(list(red_buffer))
-                text_info.set_text(f"Heart Rate: {latest_bpm['value']} BPM\nSpO₂: {latest_spo2['value']:.1f}%")
-
-                ax1.set_ylim(calculate_ylim(ir_buffer))
-                ax2.set_ylim(calculate_ylim(red_buffer))
-                
-                return [line_ir, line_ir_filt, scatter_peak, line_red, text_info]
-                
+                self.process_batch(batch)
             except Exception as e:
                 print(f"[hrspo2] 数据采集错误: {e}")
-                return []
-
-        # 创建动画
-        ani = animation.FuncAnimation(
-            fig, 
-            update, 
-            interval=50,
-            blit=False,
-            cache_frame_data=False
-        )
-        
+            self._stop.wait(self.poll_interval)
+
+    def process_batch(self, batch):
+        if len(batch) == 0:
+            return
+        ir = batch.samples[:, 0]
+        red = batch.samples[:, 1]
+        # 该批最早样本的采集时刻（读出时刻往前推），作为本批读数的时间戳
+        sensed_at = (batch.read_at or time.time()) - (len(batch) - 1) / SAMPLE_RATE
+        with self.stages["filter"].time():
+            ir_filtered = self.lowpass.process(ir)
+        with self.stages["peaks"].time():
+            peaks = self.heart_rate.process(ir_filtered, batch.first_index)
+
+        with self.lock:
+            self.ir_buffer.extend(ir)
+            self.red_buffer.extend(red)
+            self.ir_filtered.extend(ir_filtered)
+            newest = batch.first_index + len(batch) - 1
+            window = self.ir_filtered.view()
+            for p in peaks.tolist():
+                # 峰值可能落在上一批的最后一个样本上，统一从环形缓冲区取值
+                self.peak_x.append(p)
+                self.peak_y.append(window[p - newest - 1])
+
+        #标记变量以检测驾驶员的手是否在方向盘上
+        flag['value'] = float(ir_filtered[-1])
+        self.vitals.publish(vitals_bus.HAND_FLAG, flag['value'], source="hrspo2", timestamp=sensed_at)
+        if self.heart_rate.bpm:
+            latest_bpm['value'] = self.heart_rate.bpm
+            latest_bpm_confidence['value'] = self.heart_rate.confidence
+            if len(peaks):
+                self.vitals.publish(vitals_bus.BPM_CONFIDENCE, self.heart_rate.confidence, source="hrspo2",
+                                    timestamp=sensed_at)
+                self.vitals.publish(vitals_bus.BPM, self.heart_rate.bpm, source="hrspo2", timestamp=sensed_at)
+
+        # 计算血氧
+        with self.stages["spo2"].time():
+            latest_spo2['value'] = estimate_spo2(self.red_buffer, self.ir_buffer)
+        self.vitals.publish(vitals_bus.SPO2, latest_spo2['value'], source="hrspo2", timestamp=sensed_at)
+
+    def snapshot(self):
+        # 供绘图使用的数据副本
+        with self.lock:
+            return {
+                'ir': self.ir_buffer.view().copy(),
+                'ir_filtered': self.ir_filtered.view().copy(),
+                'red': self.red_buffer.view().copy(),
+                'peaks': np.c_[(self.peak_x, self.peak_y)],
+            }
+
+
+def run_plot(engine, stop_event=None, plot_rate=5):
+    # 绘图订阅者：按 plot_rate(Hz) 降频重绘，不参与数据处理
+    import matplotlib.pyplot as plt
+    import matplotlib.animation as animation
+
+    window_size = engine.window_size
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 6), sharex=True)
+    x_vals = list(range(window_size))
+    zeros = [0] * window_size
+
+    line_ir, = ax1.plot(x_vals, zeros, label='IR Raw', color='red')
+    line_ir_filt, = ax1.plot(x_vals, zeros, label='IR Filtered', color='darkred')
+    scatter_peak = ax1.scatter([], [], color='green', s=40, label='Peaks')
+    text_info = ax1.text(0.02, 0.95, '', transform=ax1.transAxes, fontsize=10, verticalalignment='top')
+    line_red, = ax2.plot(x_vals, zeros, label='RED', color='blue')
+
+    ax1.set_title("MAX30102 Heart Rate & SpO₂ Monitor")
+    ax1.set_ylabel("IR Value")
+    ax1.legend(loc="upper right")
+    ax2.set_ylabel("RED Value")
+    ax2.set_xlabel("Sample Index")
+    ax2.legend(loc="upper right")
+    plt.tight_layout()
+
+    closed = [False]
+
+    def update(frame):
+        if (stop_event and stop_event.is_set()) or not engine.is_alive():
+            if not closed[0]:
+                closed[0] = True
+                plt.close(fig)
+            return []
+
+        data = engine.snapshot()
+        line_ir.set_ydata(data['ir'])
+        line_ir_filt.set_ydata(data['ir_filtered'])
+        scatter_peak.set_offsets(data['peaks'])
+        line_red.set_ydata(data['red'])
+        text_info.set_text(f"Heart Rate: {latest_bpm['value']} BPM\nSpO₂: {latest_spo2['value']:.1f}%")
+
+        ax1.set_ylim(calculate_ylim(data['ir']))
+        ax2.set_ylim(calculate_ylim(data['red']))
+        return [line_ir, line_ir_filt, scatter_peak, line_red, text_info]
+
+    ani = animation.FuncAnimation(
+        fig,
+        update,
+        interval=int(1000 / plot_rate),
+        blit=False,
+        cache_frame_data=False
+    )
+    try:
         plt.show()
-        
+    finally:
+        ani.event_source.stop()
+        plt.close(fig)
+
+
+def run_hrspo2(stop_event=None, show_plot=True, plot_rate=5, bus=None, recorder=None):
+    """
+    :param bus: 可传入回放用的总线对象（见 script.recording.ReplayBus），默认打开 I2C 总线
+    :param recorder: 可选的 script.recording.Recorder，记录原始 FIFO 样本
+    """
+    engine = None
+    try:
+        # 初始化硬件
+        if bus is None:
+            bus = SMBus(I2C_BUS_NUM)
+        setup_sensor(bus)
+        engine = HrSpo2Engine(bus, recorder=recorder).start(stop_event)
+
+        if show_plot:
+            run_plot(engine, stop_event, plot_rate)
+        else:
+            # 无显示器时只等待停止信号
+            while engine.is_alive() and not (stop_event and stop_event.is_set()):
+                time.sleep(0.5)
     except Exception as e:
         print(f"[hrspo2] 初始化错误: {e}")
     finally:
         # 资源清理
+        if engine is not None:
+            engine.stop()
         try:
-            if 'ani' in locals() and ani is not None:
-                ani.event_source.stop()
-        except:
-            pass
-            
-        try:
-            if 'fig' in locals() and fig is not None:
-                plt.close(fig)
-        except:
-            pass
-            
-        try:
-            if resources_initialized and 'bus' in locals():
+            if bus is not None:
                 bus.close()
         except:
-            pass
\ No newline at end of file
+            pass
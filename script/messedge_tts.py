@@ -2,24 +2,250 @@ import edge_tts
 import asyncio
 import pygame
 import io
+import heapq
+import itertools
+import threading
+import time
+import uuid
+import os
+import hashlib
+import json
+import shutil
+from collections import OrderedDict
+from script import metrics, speech_ipc
+
+DEFAULT_VOICE = "zh-CN-XiaoxiaoNeural"
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tts_cache")
+
+#播放优先级，数值越小越优先，安全警告可打断提醒
+PRIORITY_ALERT = speech_ipc.PRIORITY_ALERT
+PRIORITY_REMINDER = speech_ipc.PRIORITY_REMINDER
+
+# 各阶段耗时直方图：排队等待、合成（缓存未命中时）、首音延迟、播放
+TTS_STAGES = {name: metrics.stage("tts", name) for name in ("queue", "synthesis", "first_audio", "playback")}
 
 # 异步函数：将文本转为语音并播放
 
 
-async def text_to_speech_play(text, voice="zh-CN-XiaoxiaoNeural", rate="+0%"):
+async def synthesize(text, voice=DEFAULT_VOICE, rate="+0%"):
+    # 合成语音，返回完整的 mp3 字节
+    communicate = edge_tts.Communicate(text, voice=voice, rate=rate)
+    chunks = []
+    async for chunk in communicate.stream():
+        if chunk["type"] == "audio":
+            chunks.append(chunk["data"])
+    return b"".join(chunks)
+
+
+class AudioCache:
+    """
+    合成语音缓存，以 (text, voice, rate) 的哈希为键：内存 + 磁盘两级，均按 LRU 限制总大小。
+    固定的警告语预先合成后，命中时无需联网即可播放。
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_memory_bytes=8 * 1024 * 1024,
+                 max_disk_bytes=64 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(text, voice, rate):
+        return hashlib.sha256(json.dumps([text, voice, rate], ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".mp3")
+
+    def get(self, text, voice=DEFAULT_VOICE, rate="+0%"):
+        key = self.key(text, voice, rate)
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return audio
+        audio = None
+        if self.cache_dir:
+            path = self._path(key)
+            try:
+                with open(path, "rb") as f:
+                    audio = f.read()
+                os.utime(path)  # 以修改时间作为磁盘 LRU 的依据
+            except OSError:
+                audio = None
+        with self._lock:
+            if audio:
+                self.hits += 1
+                self._remember(key, audio)
+            else:
+                self.misses += 1
+        return audio
+
+    def put(self, text, voice, rate, audio):
+        if not audio:
+            return  # 合成失败的空结果不缓存，否则之后每次命中都播放空音频
+        key = self.key(text, voice, rate)
+        with self._lock:
+            self._remember(key, audio)
+        if self.cache_dir:
+            path = self._path(key)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(audio)
+                os.replace(tmp_path, path)
+                self._evict_disk()
+            except OSError as e:
+                print(f"[语音] 写入缓存失败: {e}")
+
+    def _remember(self, key, audio):
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            _, old = self._memory.popitem(last=False)
+            self._memory_bytes -= len(old)
+
+    def _evict_disk(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".mp3"):
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    async def get_or_synthesize(self, text, voice=DEFAULT_VOICE, rate="+0%"):
+        audio = self.get(text, voice, rate)
+        if audio is None:
+            audio = await synthesize(text, voice, rate)
+            if audio:
+                self.put(text, voice, rate, audio)
+        return audio
+
+
+#流式播放：收到足够的 mp3 数据后立即交给支持从标准输入解码的播放器，边合成边播放
+STREAM_PLAYERS = (
+    ["mpg123", "-q", "-"],
+    ["ffplay", "-nodisp", "-autoexit", "-loglevel", "quiet", "-i", "-"],
+)
+MIN_PREFIX_BYTES = 4096  # 约 0.7 秒的 48kbps mp3，足够解码器起播
+_warned_no_player = False
+
+
+def find_stream_player():
+    global _warned_no_player
+    for cmd in STREAM_PLAYERS:
+        if shutil.which(cmd[0]):
+            return cmd
+    if not _warned_no_player:
+        _warned_no_player = True
+        names = "/".join(cmd[0] for cmd in STREAM_PLAYERS)
+        print(f"[语音] 未找到 {names}，缓存未命中时将等待合成完成后整段播放（首音延迟较高）")
+    return None
+
+
+async def stream_and_play(text, voice, rate, player_cmd, should_stop=lambda: False,
+                          min_prefix=MIN_PREFIX_BYTES):
+    """
+    边合成边播放。返回 (完整音频字节, 指标)；被打断时音频为 None。
+    指标包括 time_to_first_audio（开始合成到播放器起播）和 synthesis_time（合成总耗时），单位秒。
+    """
+    start = time.perf_counter()
+    communicate = edge_tts.Communicate(text, voice=voice, rate=rate)
+    chunks = []
+    buffered = 0
+    proc = None
+    pipe_ok = True
+    timing = {"streamed": True, "cache_hit": False, "time_to_first_audio": None}
+
+    async def start_player():
+        nonlocal proc
+        proc = await asyncio.create_subprocess_exec(
+            *player_cmd, stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+        timing["time_to_first_audio"] = time.perf_counter() - start
+        await feed(b"".join(chunks))
+
+    async def feed(data):
+        nonlocal pipe_ok
+        if not pipe_ok:
+            return
+        try:
+            proc.stdin.write(data)
+            await proc.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pipe_ok = False
+
+    async for chunk in communicate.stream():
+        if should_stop():
+            break
+        if chunk["type"] != "audio":
+            continue
+        chunks.append(chunk["data"])
+        if proc is None:
+            buffered += len(chunk["data"])
+            if buffered >= min_prefix:
+                await start_player()
+        else:
+            await feed(chunk["data"])
+    timing["synthesis_time"] = time.perf_counter() - start
+
+    complete = not should_stop()
+    if proc is None and chunks and complete:
+        # 文本很短，合成结束时还不到起播门限
+        await start_player()
+    if proc is not None:
+        try:
+            proc.stdin.close()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        while proc.returncode is None:
+            if should_stop():
+                proc.kill()
+            try:
+                await asyncio.wait_for(proc.wait(), 0.05)
+            except asyncio.TimeoutError:
+                pass
+    return (b"".join(chunks) if complete else None), timing
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = AudioCache()
+    return _cache
+
+
+async def text_to_speech_play(text, voice=DEFAULT_VOICE, rate="+0%"):
     """
     使用 edge-tts 将文本合成为语音，并用 pygame 播放，无需生成临时文件。
     :param text: 要合成的文本内容
     :param voice: 语音名称（微软Edge TTS支持的voice）
     :param rate: 语速（如"0%"为正常，"+20%"更快，"-20%"更慢）
     """
-    # 创建 edge-tts 通信对象
-    communicate = edge_tts.Communicate(text, voice=voice, rate=rate)
-    audio_bytes = b""  # 用于存储音频数据
-    # 异步获取音频流数据
-    async for chunk in communicate.stream():
-        if chunk["type"] == "audio":
-            audio_bytes += chunk["data"]
+    # 优先使用缓存，未命中时再联网合成
+    audio_bytes = await get_cache().get_or_synthesize(text, voice, rate)
 
     # 初始化 pygame 音频模块
     pygame.mixer.init()
@@ -34,6 +260,271 @@ async def text_to_speech_play(text, voice="zh-CN-XiaoxiaoNeural", rate="+0%"):
         pygame.time.Clock().tick(10)
 
 
+class SpeechRequest:
+    # 一条待播放的语音，enqueue() 返回给调用方，可查询状态或取消
+    def __init__(self, text, voice, rate, priority):
+        self.id = uuid.uuid4().hex
+        self.text = text
+        self.voice = voice
+        self.rate = rate
+        self.priority = priority
+        self.status = "queued"  # queued / synthesizing / playing / done / failed / cancelled
+        self.error = None
+        self.metrics = {}
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._done = threading.Event()
+        self._service = None
+
+    @property
+    def key(self):
+        return (self.text, self.voice, self.rate)
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def cancel(self):
+        if self._service is not None:
+            return self._service.cancel(self)
+        return False
+
+
+class AudioService:
+    """
+    常驻语音服务：独立线程运行自己的事件循环，pygame.mixer 只初始化一次。
+    请求按优先级排队，安全警告可以打断正在播放的提醒（被打断的提醒稍后重播）；
+    尚未播放的相同内容会合并为一条。enqueue() 不阻塞调用方。
+    """
+
+    def __init__(self, cache=None, streaming=True):
+        self.cache = cache or get_cache()
+        # 缓存未命中时优先流式播放，找不到播放器则退回 pygame 整段播放
+        self.stream_player = find_stream_player() if streaming else None
+        self._lock = threading.Lock()
+        self._heap = []
+        self._seq = itertools.count()
+        self._pending = {}  # key -> SpeechRequest，用于合并重复内容
+        self._current = None
+        self._interrupt = False
+        self._loop = asyncio.new_event_loop()
+        self._wakeup = None
+        self._thread = None
+        self._stopped = False
+        self.audio_error = None  # 音频设备初始化失败的原因，此后所有请求直接失败
+
+    def start(self):
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(ready,), daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def _run(self, ready):
+        asyncio.set_event_loop(self._loop)
+        self._wakeup = asyncio.Event()
+        ready.set()
+        self._loop.run_until_complete(self._worker())
+
+    def _notify(self):
+        # start() 之前入队的请求由服务线程启动后直接取出，不需要唤醒
+        if self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def enqueue(self, text, priority=PRIORITY_REMINDER, voice=DEFAULT_VOICE, rate="+0%"):
+        with self._lock:
+            existing = self._pending.get((text, voice, rate))
+            if existing is not None:
+                if priority < existing.priority:
+                    existing.priority = priority
+                    heapq.heappush(self._heap, (priority, next(self._seq), existing))
+                    self._check_preempt(priority)
+                request = existing
+            else:
+                request = SpeechRequest(text, voice, rate, priority)
+                request._service = self
+                heapq.heappush(self._heap, (priority, next(self._seq), request))
+                self._pending[request.key] = request
+                self._check_preempt(priority)
+        self._notify()
+        return request
+
+    def _check_preempt(self, priority):
+        current = self._current
+        if current is not None and priority < current.priority:
+            self._interrupt = True
+
+    def prewarm(self, phrases, voice=DEFAULT_VOICE, rate="+0%"):
+        # 在服务线程中预先合成固定语句，返回 concurrent.futures.Future
+        async def _prewarm():
+            for text in phrases:
+                try:
+                    await self.cache.get_or_synthesize(text, voice, rate)
+                except Exception as e:
+                    print(f"[语音] 预合成失败: {e}")
+        return asyncio.run_coroutine_threadsafe(_prewarm(), self._loop)
+
+    def cancel(self, request):
+        with self._lock:
+            if request.status == "queued":
+                self._pending.pop(request.key, None)
+                self._finish(request, "cancelled")
+                return True
+            if request is self._current:
+                request.status = "cancelled"
+                self._interrupt = True
+                return True
+        return False
+
+    def stop(self):
+        self._stopped = True
+        with self._lock:
+            self._interrupt = True
+        self._notify()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def _finish(self, request, status, error=None):
+        request.status = status
+        request.error = error
+        request.finished_at = time.time()
+        request._done.set()
+
+    def _pop(self):
+        with self._lock:
+            while self._heap:
+                priority, _, request = heapq.heappop(self._heap)
+                # 跳过已取消或优先级被提升后留下的旧条目
+                if request.status != "queued" or priority != request.priority:
+                    continue
+                self._pending.pop(request.key, None)
+                request.status = "synthesizing"
+                if request.started_at is None:
+                    request.started_at = time.time()
+                    TTS_STAGES["queue"].observe(request.started_at - request.created_at)
+                self._current = request
+                self._interrupt = False
+                return request
+        return None
+
+    async def _worker(self):
+        try:
+            pygame.mixer.init()
+        except Exception as e:
+            # 没有音频设备时服务线程不退出，排队和之后的请求都标记为失败，调用方不会一直等待
+            self.audio_error = f"音频设备不可用: {e}"
+            print(f"[语音] {self.audio_error}")
+        while not self._stopped:
+            request = self._pop()
+            if request is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            if self.audio_error is not None:
+                with self._lock:
+                    self._current = None
+                self._finish(request, "failed", self.audio_error)
+                continue
+            try:
+                await self._speak(request)
+                self._after_play(request)
+            except Exception as e:
+                print(f"[语音] 播放失败: {e}")
+                self._finish(request, "failed", str(e))
+            finally:
+                with self._lock:
+                    self._current = None
+
+    async def _speak(self, request):
+        start = time.perf_counter()
+        audio = self.cache.get(request.text, request.voice, request.rate)
+        if audio is None and self.stream_player is not None:
+            request.status = "playing"
+            audio, request.metrics = await stream_and_play(
+                request.text, request.voice, request.rate, self.stream_player,
+                should_stop=lambda: self._interrupt)
+            if audio == b"":
+                raise RuntimeError("语音合成未返回音频")
+            if audio:
+                self.cache.put(request.text, request.voice, request.rate, audio)
+        else:
+            timing = {"streamed": False, "cache_hit": audio is not None}
+            if audio is None:
+                audio = await synthesize(request.text, request.voice, request.rate)
+                if not audio:
+                    raise RuntimeError("语音合成未返回音频")
+                self.cache.put(request.text, request.voice, request.rate, audio)
+            timing["synthesis_time"] = time.perf_counter() - start
+            if request.status == "synthesizing" and not self._interrupt:
+                request.status = "playing"
+                timing["time_to_first_audio"] = time.perf_counter() - start
+                request.metrics = timing
+                await self._play(audio)
+            request.metrics = timing
+        ttfa = request.metrics.get("time_to_first_audio")
+        if not request.metrics.get("cache_hit") and request.metrics.get("synthesis_time") is not None:
+            TTS_STAGES["synthesis"].observe(request.metrics["synthesis_time"])
+        if ttfa is not None:
+            TTS_STAGES["first_audio"].observe(ttfa)
+            TTS_STAGES["playback"].observe(time.perf_counter() - start - ttfa)
+            print(f"[语音] 首音延迟 {ttfa * 1000:.0f}ms，合成耗时 {request.metrics['synthesis_time'] * 1000:.0f}ms")
+
+    def _after_play(self, request):
+        with self._lock:
+            if request.status == "cancelled" or self._stopped:
+                self._finish(request, "cancelled")
+            elif self._interrupt and not self._stopped:
+                # 被更高优先级的语音打断，重新排队（如有相同内容排队则合并）
+                if request.key in self._pending:
+                    self._finish(request, "cancelled")
+                    return
+                request.status = "queued"
+                heapq.heappush(self._heap, (request.priority, next(self._seq), request))
+                self._pending[request.key] = request
+            else:
+                self._finish(request, "done")
+
+    async def _play(self, audio):
+        pygame.mixer.music.load(io.BytesIO(audio))
+        pygame.mixer.music.play()
+        while pygame.mixer.music.get_busy():
+            if self._interrupt:
+                pygame.mixer.music.stop()
+                break
+            await asyncio.sleep(0.05)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_service():
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = AudioService().start()
+        return _service
+
+
+def set_service(service):
+    # 替换进程内的语音服务，例如多进程模式下转发到语音子进程的代理
+    global _service
+    with _service_lock:
+        _service = service
+
+
+def enqueue(text, priority=PRIORITY_REMINDER, voice=DEFAULT_VOICE, rate="+0%"):
+    # 非阻塞：加入播放队列后立即返回 SpeechRequest
+    return get_service().enqueue(text, priority=priority, voice=voice, rate=rate)
+
+
+def prewarm(phrases, voice=DEFAULT_VOICE, rate="+0%"):
+    return get_service().prewarm(phrases, voice=voice, rate=rate)
+
+
 #测试用
 '''
 if __name__ == "__main__":
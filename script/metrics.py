@@ -0,0 +1,272 @@
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler
+
+#轻量级指标：直方图/计数器，按 Prometheus 文本格式输出。
+#每次 observe 只做一次二分查找和几次加法，可以放在每帧 / 每批数据的热路径上。
+
+# 秒，覆盖从 I2C 读取（亚毫秒）到语音合成（数秒）
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# main.py 在该 Unix 套接字上提供指标，flask_server 的 /metrics 会合并进来
+SOCKET_PATH = os.path.join(tempfile.gettempdir(), "safe_drive_metrics.sock")
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)  # 最后一格为 +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            return {"buckets": list(self.bounds), "counts": list(self.counts), "sum": self.sum, "count": self.count}
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return {"value": self.value}
+
+
+class Family:
+    # 同名指标按标签值区分，labels() 返回（并缓存）对应的子指标
+    def __init__(self, name, help, kind, labelnames, factory):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self._factory = factory
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._factory())
+        return child
+
+    def snapshot(self):
+        with self._lock:
+            children = list(self._children.items())
+        return {
+            "name": self.name, "help": self.help, "type": self.kind,
+            "samples": [dict(labels=dict(zip(self.labelnames, values)), **child.snapshot())
+                        for values, child in children],
+        }
+
+
+class Registry:
+    def __init__(self, process=None):
+        # process 作为标签加到每个样本上，合并多个进程的指标时用来区分
+        self.process = process or os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+        self._families = {}
+        self._lock = threading.Lock()
+
+    def _family(self, name, help, kind, labelnames, factory):
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = Family(name, help, kind, labelnames, factory)
+            return family
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._family(name, help, "histogram", labelnames, lambda: Histogram(buckets))
+
+    def counter(self, name, help, labelnames=()):
+        return self._family(name, help, "counter", labelnames, Counter)
+
+    def snapshot(self):
+        with self._lock:
+            families = list(self._families.values())
+        return {"process": self.process, "families": [f.snapshot() for f in families]}
+
+    def render(self):
+        return render([self.snapshot()])
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    def escape(v):
+        return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshots):
+    """
+    把一个或多个进程的 snapshot 合并为 Prometheus 文本格式（0.0.4）。
+    同名指标只输出一次 HELP/TYPE，各进程的样本以 process 标签区分。
+    """
+    merged = {}
+    for snap in snapshots:
+        for family in snap["families"]:
+            entry = merged.setdefault(family["name"], (family, []))
+            for sample in family["samples"]:
+                entry[1].append(dict(sample, labels=dict(sample["labels"], process=snap["process"])))
+
+    lines = []
+    for name, (family, samples) in merged.items():
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for s in samples:
+            labels = s["labels"]
+            if family["type"] == "histogram":
+                cumulative = 0
+                for bound, count in zip(s["buckets"] + [float("inf")], s["counts"]):
+                    cumulative += count
+                    le = _format_value(float(bound))
+                    lines.append(f"{name}_bucket{_format_labels(dict(labels, le=le))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(float(s['sum']))}")
+                lines.append(f"{name}_count{_format_labels(labels)} {s['count']}")
+            else:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(s['value'])}")
+    return "\n".join(lines) + "\n"
+
+
+# 进程内默认注册表及各模块共用的指标
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram(
+    "safedrive_stage_seconds", "各处理阶段耗时（秒）", ("subsystem", "stage"))
+ALERT_LATENCY = REGISTRY.histogram(
+    "safedrive_alert_latency_seconds", "从传感器采样到告警触发的端到端延迟（秒）", ("rule",))
+ALERTS = REGISTRY.counter("safedrive_alerts_total", "触发的告警次数", ("rule",))
+
+
+def stage(subsystem, name):
+    # 返回某个阶段的直方图，调用方可缓存后在热路径上直接 observe()/time()
+    return STAGE_SECONDS.labels(subsystem, name)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        snapshots = [self.server.registry.snapshot()]
+        for peer in self.server.peers:
+            snapshots.extend(fetch(peer) or [])
+        if self.path.startswith("/metrics.json"):
+            body, content_type = json.dumps(snapshots).encode(), "application/json"
+        else:
+            body, content_type = render(snapshots).encode(), "text/plain; version=0.0.4; charset=utf-8"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        return "unix"
+
+    def log_message(self, *args):
+        pass
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class MetricsServer:
+    """
+    在本地 Unix 套接字上以 HTTP 提供指标，Flask 未运行时也可直接抓取：
+      curl --unix-socket /tmp/safe_drive_metrics.sock http://localhost/metrics
+    /metrics.json 返回 snapshot 列表，供 flask_server 合并。peers 为其他进程（多进程模式下的
+    各子系统）的套接字路径，其指标一并输出。
+    """
+
+    def __init__(self, path=SOCKET_PATH, registry=None, peers=()):
+        self.path = path
+        self.registry = registry or REGISTRY
+        self.peers = peers
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # 上次异常退出留下的套接字文件
+        self._server = _UnixServer(self.path, _Handler)
+        self._server.registry = self.registry
+        self._server.peers = tuple(self.peers)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+def fetch(path=SOCKET_PATH, timeout=1.0):
+    # 读取其他进程（main.py）通过 Unix 套接字提供的 snapshot 列表，不可用时返回 None
+    if not os.path.exists(path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            sock.sendall(b"GET /metrics.json HTTP/1.0\r\nHost: localhost\r\n\r\n")
+            chunks = []
+            while True:
+                data = sock.recv(65536)
+                if not data:
+                    break
+                chunks.append(data)
+        header, _, body = b"".join(chunks).partition(b"\r\n\r\n")
+        if not header.startswith(b"HTTP/1.0 200") and not header.startswith(b"HTTP/1.1 200"):
+            return None
+        return json.loads(body)
+    except (OSError, ValueError):
+        return None
+
+
+#用法: python -m script.metrics [套接字路径]，打印 main.py 当前的指标
+if __name__ == "__main__":
+    snap = fetch(sys.argv[1] if len(sys.argv) > 1 else SOCKET_PATH)
+    if snap is None:
+        print("无法连接指标套接字（main.py 是否在运行？）")
+    else:
+        print(render(snap), end="")
@@ -1,5 +1,7 @@
 import time
 import os
+import threading
+from script import metrics
 PWM_BASE = '/sys/class/pwm/pwmchip0'
 
 class PWMMotor:
@@ -90,17 +92,178 @@ def test_single_motor():
     finally:
         motor.disable()
 
-def run_motor(speed):
-    motor = PWMMotor(0)
-    motor.setup(freq_hz=50)
+#振动模式：[(强度百分比, 持续秒数), ...]
+PATTERNS = {
+    "pulse": [(60, 1.0)],
+    "double_pulse": [(70, 0.3), (0, 0.2), (70, 0.3)],
+    "pulse_train": [(70, 0.25), (0, 0.15)] * 4,
+    "escalate": [(40, 0.5), (0, 0.3), (60, 0.5), (0, 0.3), (80, 0.6), (0, 0.3), (100, 0.8)],
+}
 
-    
-    try:
-        motor.enable()
-        motor.set_speed_percent(speed)
-        time.sleep(1)
-    finally:
-        motor.disable()
+
+class MotorController:
+    """
+    常驻 PWM 控制器：通道只导出一次，sysfs 属性文件保持打开，周期缓存在内存中。
+    振动模式由调度线程异步播放，play() 立即返回，可随时 cancel()。
+    pwm_base 可指向临时目录以便在没有硬件时测试，此时传入 sysfs=False。
+    """
+
+    def __init__(self, channel=0, pwm_base=PWM_BASE, freq_hz=50, export_timeout=1.0, sysfs=True):
+        self.channel = channel
+        self.pwm_base = pwm_base
+        self.path = f"{pwm_base}/pwm{channel}"
+        self.period_ns = int(1e9 / freq_hz)
+        # sysfs 属性写入时会整体替换；普通文件（测试目录）需要截断
+        self._truncate = not sysfs
+        self._fds = {}
+        self._lock = threading.Lock()
+        # 单次调速（sysfs 写入）耗时，以及 play() 到第一次调速的启动延迟
+        self._actuate_time = metrics.stage("motor", "actuate")
+        self._start_delay = metrics.stage("motor", "start_delay")
+
+        self._export(export_timeout)
+        self._fds = {name: os.open(f"{self.path}/{name}", os.O_WRONLY)
+                     for name in ("period", "duty_cycle", "polarity", "enable")}
+        self._write("enable", 0)
+        self._write("duty_cycle", 0)
+        self._write("period", self.period_ns)
+        try:
+            self._write("polarity", "normal")
+        except OSError:
+            print("ERROR")
+        self.enabled = False
+
+        self._cond = threading.Condition()
+        self._queue = []
+        self._cancel = threading.Event()
+        self._closed = False
+        self.current = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _export(self, timeout):
+        if os.path.exists(self.path):
+            return
+        try:
+            with open(f"{self.pwm_base}/export", 'w') as f:
+                f.write(str(self.channel))
+        except PermissionError:
+            print("错误：需要root权限运行此脚本")
+            raise
+        # 轮询等待系统创建文件，而不是固定睡眠
+        deadline = time.monotonic() + timeout
+        while not os.path.exists(f"{self.path}/enable"):
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"无法导出PWM通道 {self.channel}")
+            time.sleep(0.01)
+
+    def _write(self, name, value):
+        data = str(value).encode()
+        fd = self._fds[name]
+        os.pwrite(fd, data, 0)
+        if self._truncate:
+            os.ftruncate(fd, len(data))
+
+    def set_speed_percent(self, percent):
+        percent = max(0, min(100, percent))
+        start = time.perf_counter()
+        with self._lock:
+            if not self.enabled:
+                self._write("enable", 1)
+                self.enabled = True
+            self._write("duty_cycle", int(self.period_ns * percent / 100))
+        self._actuate_time.observe(time.perf_counter() - start)
+
+    def stop_motor(self):
+        with self._lock:
+            self._write("duty_cycle", 0)
+            if self.enabled:
+                self._write("enable", 0)
+                self.enabled = False
+
+    def play(self, pattern, replace=True):
+        """
+        异步播放振动模式，pattern 为 PATTERNS 中的名称或 [(百分比, 秒), ...]。
+        replace=True 时打断当前模式并清空队列，否则排在后面。
+        """
+        steps = PATTERNS[pattern] if isinstance(pattern, str) else list(pattern)
+        with self._cond:
+            if replace:
+                self._queue.clear()
+                if self.current is not None:
+                    self._cancel.set()
+            self._queue.append((steps, time.perf_counter()))
+            self._cond.notify()
+
+    def cancel(self):
+        with self._cond:
+            self._queue.clear()
+            self._cancel.set()
+            self._cond.notify()
+
+    def is_busy(self):
+        with self._cond:
+            return self.current is not None or bool(self._queue)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self._closed)
+                if self._closed:
+                    break
+                self.current, queued_at = self._queue.pop(0)
+                self._cancel.clear()
+            try:
+                for i, (percent, seconds) in enumerate(self.current):
+                    self.set_speed_percent(percent)
+                    if i == 0:
+                        self._start_delay.observe(time.perf_counter() - queued_at)
+                    if self._cancel.wait(seconds):
+                        break
+            except OSError as e:
+                print(f"马达控制失败: {e}")
+            finally:
+                try:
+                    self.stop_motor()
+                except OSError:
+                    pass
+                with self._cond:
+                    self.current = None
+
+    def close(self, unexport=False):
+        with self._cond:
+            self._closed = True
+            self._queue.clear()
+            self._cancel.set()
+            self._cond.notify()
+        self._thread.join(timeout=2)
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds = {}
+        if unexport:
+            with open(f"{self.pwm_base}/unexport", 'w') as f:
+                f.write(str(self.channel))
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_controller(channel=0, pwm_base=PWM_BASE):
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = MotorController(channel, pwm_base)
+        return _controller
+
+
+def run_motor(speed, duration=1.0):
+    # 非阻塞：以 speed% 振动 duration 秒
+    get_controller().play([(speed, duration)])
+
+
+def play_pattern(name):
+    get_controller().play(name)
 
 
 #测试用
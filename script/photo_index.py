@@ -0,0 +1,231 @@
+import bisect
+import ctypes
+import os
+import select
+import struct
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+PHOTO_NAME_FORMAT = "%Y-%m-%d_%H-%M-%S"
+ALLOWED_EXTENSIONS = {"jpg", "jpeg", "png"}
+
+PhotoEntry = namedtuple("PhotoEntry", "ts name size mtime")
+
+
+def image_size(path):
+    # 只读取文件头解析 JPEG/PNG 的宽高，失败返回 (None, None)
+    try:
+        with open(path, "rb") as f:
+            head = f.read(26)
+            if head[:8] == b"\x89PNG\r\n\x1a\n":
+                return struct.unpack(">II", head[16:24])
+            if head[:2] != b"\xff\xd8":
+                return None, None
+            f.seek(2)
+            while True:
+                marker = f.read(2)
+                if len(marker) < 2 or marker[0] != 0xFF:
+                    return None, None
+                code = marker[1]
+                if code in (0xD8, 0x01) or 0xD0 <= code <= 0xD7:
+                    continue
+                length = struct.unpack(">H", f.read(2))[0]
+                # SOF0~SOF15（不含 DHT/JPG/DAC）中包含图像尺寸
+                if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+                    height, width = struct.unpack(">xHH", f.read(5))
+                    return width, height
+                f.seek(length - 2, os.SEEK_CUR)
+    except (OSError, struct.error):
+        return None, None
+
+
+class _Inotify:
+    # 通过 ctypes 调用 inotify，监听目录中文件的写入完成、移入和删除
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000  # 内核事件队列溢出，之前的事件已丢失
+    EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, path):
+        libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = self.IN_CLOSE_WRITE | self.IN_MOVED_FROM | self.IN_MOVED_TO | self.IN_DELETE
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, "inotify_add_watch failed")
+
+    def read(self, timeout):
+        # 返回 [(mask, 文件名), ...]
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        data = os.read(self.fd, 64 * 1024)
+        events = []
+        offset = 0
+        while offset + self.EVENT_HEADER.size <= len(data):
+            _, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+            offset += length
+            events.append((mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PhotoIndex:
+    """
+    抓拍图片的内存索引：启动时用 scandir 扫描一次，之后通过 inotify 增量更新
+    （不可用时退回轮询目录修改时间）。按拍摄时间排序保存，时间范围查询用二分查找。
+    图片宽高在首次查询时读取文件头并缓存。
+    """
+
+    def __init__(self, folder, name_format=PHOTO_NAME_FORMAT, extensions=ALLOWED_EXTENSIONS,
+                 poll_interval=5.0):
+        self.folder = folder
+        self.name_format = name_format
+        self.extensions = extensions
+        self.poll_interval = poll_interval
+        self.mode = None  # "inotify" / "poll"
+        self._lock = threading.Lock()
+        self._keys = []      # 已排序的 (ts, name)
+        self._entries = {}   # name -> PhotoEntry
+        self._sizes = {}     # name -> (width, height)
+        self._stop = threading.Event()
+        self._thread = None
+        self._dir_mtime = None
+
+    def _parse(self, name):
+        base, dot, ext = name.rpartition(".")
+        if not dot or ext.lower() not in self.extensions:
+            return None
+        try:
+            return datetime.strptime(base, self.name_format).timestamp()
+        except ValueError:
+            return None
+
+    def build(self):
+        entries = {}
+        try:
+            self._dir_mtime = os.stat(self.folder).st_mtime
+            with os.scandir(self.folder) as it:
+                for entry in it:
+                    ts = self._parse(entry.name)
+                    if ts is None or not entry.is_file():
+                        continue
+                    st = entry.stat()
+                    entries[entry.name] = PhotoEntry(ts, entry.name, st.st_size, st.st_mtime)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._entries = entries
+            self._keys = sorted((e.ts, e.name) for e in entries.values())
+            self._sizes = {k: v for k, v in self._sizes.items() if k in entries}
+        return len(entries)
+
+    def add(self, name):
+        ts = self._parse(name)
+        if ts is None:
+            return
+        try:
+            st = os.stat(os.path.join(self.folder, name))
+        except OSError:
+            return
+        with self._lock:
+            if name in self._entries:
+                self._sizes.pop(name, None)
+            else:
+                bisect.insort(self._keys, (ts, name))
+            self._entries[name] = PhotoEntry(ts, name, st.st_size, st.st_mtime)
+
+    def remove(self, name):
+        with self._lock:
+            entry = self._entries.pop(name, None)
+            if entry is None:
+                return
+            i = bisect.bisect_left(self._keys, (entry.ts, name))
+            if i < len(self._keys) and self._keys[i] == (entry.ts, name):
+                del self._keys[i]
+            self._sizes.pop(name, None)
+
+    def start(self):
+        self.build()
+        try:
+            watcher = _Inotify(self.folder)
+            self.mode = "inotify"
+            target, args = self._watch_inotify, (watcher,)
+        except (OSError, AttributeError):
+            self.mode = "poll"
+            target, args = self._watch_poll, ()
+        self._thread = threading.Thread(target=target, args=args, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def _watch_inotify(self, watcher):
+        try:
+            while not self._stop.is_set():
+                for mask, name in watcher.read(timeout=1.0):
+                    if mask & _Inotify.IN_Q_OVERFLOW:
+                        self.build()  # 丢失了事件，重新扫描整个目录
+                    elif mask & (_Inotify.IN_CLOSE_WRITE | _Inotify.IN_MOVED_TO):
+                        self.add(name)
+                    elif mask & (_Inotify.IN_DELETE | _Inotify.IN_MOVED_FROM):
+                        self.remove(name)
+        finally:
+            watcher.close()
+
+    def _watch_poll(self):
+        # 目录修改时间变化时才重新扫描
+        while not self._stop.wait(self.poll_interval):
+            try:
+                mtime = os.stat(self.folder).st_mtime
+            except OSError:
+                continue
+            if mtime != self._dir_mtime:
+                self.build()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._keys)
+
+    def query(self, since=None, until=None, offset=0, limit=None, newest_first=True):
+        """
+        返回 (条目列表, 总数)。since/until 为时间戳（含 since，不含 until），
+        条目为 dict：name、ts、size、width、height。
+        """
+        with self._lock:
+            lo = 0 if since is None else bisect.bisect_left(self._keys, (since, ""))
+            hi = len(self._keys) if until is None else bisect.bisect_left(self._keys, (until, ""))
+            total = max(0, hi - lo)
+            if newest_first:
+                end = hi - offset
+                start = end - limit if limit is not None else lo
+                keys = self._keys[max(lo, start):max(lo, end)][::-1]
+            else:
+                start = lo + offset
+                end = start + limit if limit is not None else hi
+                keys = self._keys[start:min(hi, end)]
+            entries = [self._entries[name] for _, name in keys]
+            missing = [e.name for e in entries if e.name not in self._sizes]
+
+        for name in missing:
+            size = image_size(os.path.join(self.folder, name))
+            with self._lock:
+                self._sizes[name] = size
+        result = []
+        for e in entries:
+            width, height = self._sizes.get(e.name, (None, None))
+            result.append({"name": e.name, "ts": e.ts, "size": e.size, "width": width, "height": height})
+        return result, total
@@ -0,0 +1,334 @@
+import json
+import os
+import sys
+import threading
+import time
+import numpy as np
+
+from script.alcohol import AlcoholSensor
+
+#录制格式：一个目录，每种数据一个定长记录的二进制文件，可直接 np.memmap 读取
+#  ppg.bin      FIFO 原始样本（全局样本序号、时间戳、ir、red）
+#  alcohol.bin  ADC 原始值（时间戳、raw）
+#  frames.idx   帧索引（时间戳、在 frames.bin 中的偏移、长度）
+#  frames.bin   顺序拼接的 JPEG 帧
+#  meta.json    采样率、各文件的 dtype 等
+
+PPG_DTYPE = np.dtype([("index", "<i8"), ("t", "<f8"), ("ir", "<u4"), ("red", "<u4")])
+ALCOHOL_DTYPE = np.dtype([("t", "<f8"), ("raw", "<i4")])
+FRAME_INDEX_DTYPE = np.dtype([("t", "<f8"), ("offset", "<u8"), ("length", "<u4")])
+
+
+class Recorder:
+    """
+    记录原始传感器数据：hrspo2 的 FIFO 批次、酒精 ADC 读数、摄像头帧（JPEG 压缩）。
+    各 record_* 方法可在不同线程中调用。
+    """
+
+    def __init__(self, directory, sample_rate=None, jpeg_quality=90):
+        from script import hrspo2
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.jpeg_quality = jpeg_quality
+        self.meta = {
+            "version": 1,
+            "created": time.time(),
+            "sample_rate": sample_rate or hrspo2.SAMPLE_RATE,
+            "ppg_dtype": PPG_DTYPE.descr,
+            "alcohol_dtype": ALCOHOL_DTYPE.descr,
+            "frame_index_dtype": FRAME_INDEX_DTYPE.descr,
+        }
+        self._files = {}
+        self._lock = threading.Lock()
+        self._frames_offset = 0
+        self._write_meta()
+
+    def _file(self, name):
+        f = self._files.get(name)
+        if f is None:
+            f = self._files[name] = open(os.path.join(self.directory, name), "ab")
+        return f
+
+    def _write_meta(self):
+        with open(os.path.join(self.directory, "meta.json"), "w") as f:
+            json.dump(self.meta, f)
+
+    def record_ppg(self, batch):
+        records = np.empty(len(batch), dtype=PPG_DTYPE)
+        records["index"] = np.arange(batch.first_index, batch.first_index + len(batch))
+        records["t"] = batch.timestamps
+        records["ir"] = batch.samples[:, 0]
+        records["red"] = batch.samples[:, 1]
+        with self._lock:
+            self._file("ppg.bin").write(records.tobytes())
+
+    def record_alcohol(self, t, raw):
+        record = np.array([(t, raw)], dtype=ALCOHOL_DTYPE)
+        with self._lock:
+            self._file("alcohol.bin").write(record.tobytes())
+
+    def record_frame(self, t, frame):
+        import cv2
+        ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            return
+        data = buf.tobytes()
+        with self._lock:
+            self._file("frames.bin").write(data)
+            entry = np.array([(t, self._frames_offset, len(data))], dtype=FRAME_INDEX_DTYPE)
+            self._file("frames.idx").write(entry.tobytes())
+            self._frames_offset += len(data)
+            if "frame_shape" not in self.meta:
+                self.meta["frame_shape"] = list(frame.shape)
+                self._write_meta()
+
+    def flush(self):
+        with self._lock:
+            for f in self._files.values():
+                f.flush()
+
+    def close(self):
+        with self._lock:
+            for f in self._files.values():
+                f.close()
+            self._files = {}
+
+
+def _memmap(path, dtype):
+    if not os.path.exists(path) or os.path.getsize(path) < dtype.itemsize:
+        return np.empty(0, dtype=dtype)
+    count = os.path.getsize(path) // dtype.itemsize
+    return np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+
+class Recording:
+    # 以内存映射方式打开录制目录，不会一次性读入内存
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.sample_rate = self.meta["sample_rate"]
+        self.ppg = _memmap(os.path.join(directory, "ppg.bin"), PPG_DTYPE)
+        self.alcohol = _memmap(os.path.join(directory, "alcohol.bin"), ALCOHOL_DTYPE)
+        self.frame_index = _memmap(os.path.join(directory, "frames.idx"), FRAME_INDEX_DTYPE)
+        self.frames = _memmap(os.path.join(directory, "frames.bin"), np.dtype(np.uint8))
+
+    def frame(self, i):
+        import cv2
+        entry = self.frame_index[i]
+        data = self.frames[int(entry["offset"]):int(entry["offset"]) + int(entry["length"])]
+        return cv2.imdecode(np.asarray(data), cv2.IMREAD_COLOR)
+
+    def start_time(self):
+        times = [a["t"][0] for a in (self.ppg, self.alcohol, self.frame_index) if len(a)]
+        return min(times) if times else 0.0
+
+
+class ReplayClock:
+    """
+    回放时钟：speed 为回放倍速（1.0 为实时），None 表示不做节拍控制、尽快回放。
+    同一次回放的多个数据源共享一个时钟，保持相对时序。
+    """
+
+    def __init__(self, t0, speed=1.0):
+        self.t0 = t0
+        self.speed = speed
+        self.started = time.monotonic()
+
+    @property
+    def realtime(self):
+        return self.speed is not None
+
+    def now(self):
+        # 当前对应的录制时间
+        if self.speed is None:
+            return float("inf")
+        return self.t0 + (time.monotonic() - self.started) * self.speed
+
+    def sleep_until(self, t):
+        if self.speed is None:
+            return
+        delay = (t - self.t0) / self.speed - (time.monotonic() - self.started)
+        if delay > 0:
+            time.sleep(delay)
+
+
+class ReplayBus:
+    """
+    模拟 SMBus 上的 MAX30102：按时钟放出录制的 FIFO 样本，读写指针、溢出计数与真实芯片一致，
+    可直接交给 hrspo2.FifoReader / HrSpo2Engine / run_hrspo2(bus=...) 使用。
+    """
+
+    def __init__(self, recording, clock):
+        from script import hrspo2
+        self.hrspo2 = hrspo2
+        self.records = recording.ppg
+        self.clock = clock
+        self.pos = 0
+        self._pending = 0
+        self._overflow = 0
+
+    @property
+    def finished(self):
+        return self.pos >= len(self.records)
+
+    def write_byte_data(self, addr, reg, value):
+        pass
+
+    def _refresh(self):
+        # 计算当前可读的样本数；录制时的序号缺口按溢出处理
+        h = self.hrspo2
+        if self.pos >= len(self.records):
+            self._pending, self._overflow = 0, 0
+            return
+        if self.clock.realtime:
+            end = int(np.searchsorted(self.records["t"], self.clock.now(), side="right"))
+        else:
+            end = len(self.records)
+        # 写指针只有 5 位，满 32 个样本时与读指针重合，这里最多放出 31 个
+        end = min(end, self.pos + h.FIFO_DEPTH - 1)
+        # 录制时在某个样本之后发生过溢出：读到该样本为止，同时报告溢出数。
+        # 与芯片一致（FIFO_ROLLOVER 关闭），丢失的是 FIFO 中已有样本之后的新样本
+        index = self.records["index"]
+        gaps = np.flatnonzero(np.diff(index[self.pos:end + 1]) != 1)
+        self._overflow = 0
+        if len(gaps) and gaps[0] < end - self.pos:
+            end = self.pos + int(gaps[0]) + 1
+            self._overflow = min(0x1F, int(index[end] - index[end - 1] - 1))
+        self._pending = end - self.pos
+
+    def read_byte_data(self, addr, reg):
+        h = self.hrspo2
+        if reg == h.REG_FIFO_WR_PTR:
+            self._refresh()
+            return self._pending
+        if reg == h.REG_OVF_COUNTER:
+            return self._overflow
+        return 0
+
+    def read_i2c_block_data(self, addr, reg, length):
+        count = min(length // self.hrspo2.BYTES_PER_SAMPLE, self._pending)
+        self._pending -= count
+        chunk = self.records[self.pos:self.pos + count]
+        self.pos += len(chunk)
+        raw = np.empty((len(chunk), 6), dtype=np.uint8)
+        for col, field in ((0, "red"), (3, "ir")):
+            values = chunk[field].astype(np.uint32)
+            raw[:, col] = (values >> 16) & 0xFF
+            raw[:, col + 1] = (values >> 8) & 0xFF
+            raw[:, col + 2] = values & 0xFF
+        return raw.ravel().tolist()
+
+    def close(self):
+        pass
+
+
+class ReplayAlcoholSensor(AlcoholSensor):
+    # 与 AlcoholSensor 接口相同，按时钟返回录制的 ADC 原始值
+    def __init__(self, recording, clock):
+        super().__init__(device_path=None)
+        self.records = recording.alcohol
+        self.clock = clock
+        self.pos = 0
+
+    @property
+    def finished(self):
+        return self.pos >= len(self.records)
+
+    def _read_raw(self):
+        if not len(self.records):
+            raise ValueError("empty recording")
+        if self.clock.realtime:
+            self.pos = int(np.searchsorted(self.records["t"], self.clock.now(), side="right"))
+            i = max(0, min(self.pos, len(self.records)) - 1)
+        else:
+            i = min(self.pos, len(self.records) - 1)
+            self.pos += 1
+        return int(self.records["raw"][i])
+
+
+class ReplayCapture:
+    # 与 cv2.VideoCapture 的 read()/set()/release() 接口相同，按时钟放出录制的帧
+    def __init__(self, recording, clock):
+        self.recording = recording
+        self.clock = clock
+        self.pos = 0
+
+    @property
+    def realtime(self):
+        return self.clock.realtime
+
+    def set(self, prop, value):
+        return True
+
+    def read(self):
+        if self.pos >= len(self.recording.frame_index):
+            return False, None
+        self.clock.sleep_until(float(self.recording.frame_index["t"][self.pos]))
+        frame = self.recording.frame(self.pos)
+        self.pos += 1
+        return frame is not None, frame
+
+    def release(self):
+        pass
+
+
+def open_replay(directory, speed=1.0):
+    # 返回 (recording, bus, alcohol_sensor, capture)，共享同一个回放时钟
+    recording = Recording(directory)
+    clock = ReplayClock(recording.start_time(), speed)
+    return (recording, ReplayBus(recording, clock), ReplayAlcoholSensor(recording, clock),
+            ReplayCapture(recording, clock))
+
+
+def replay(directory, speed=1.0, with_video=True):
+    """
+    通过与实车相同的代码路径回放录制数据：hrspo2 采集线程、酒精过采样、眨眼检测（无界面），
+    发布到总线上的读数打印出来。speed=None 时尽快回放。
+    """
+    from script import hrspo2, alcohol, vitals_bus
+
+    recording, bus, sensor, capture = open_replay(directory, speed)
+    stop_event = threading.Event()
+    vitals_bus.bus.subscribe(lambda r: print(f"[回放] {r.kind}: {r.value}"),
+                             kinds={vitals_bus.BPM, vitals_bus.SPO2, vitals_bus.BLINKS, vitals_bus.ALCOHOL})
+
+    poll_interval = 0.1 if speed is not None else 0.0
+    engine = hrspo2.HrSpo2Engine(bus, poll_interval=poll_interval).start(stop_event)
+    rate_hz = 50 if speed is not None else 1000
+    sampler = alcohol.AlcoholSampler(sensor, rate_hz=rate_hz).start(stop_event)
+    blink_thread = None
+    if with_video and len(recording.frame_index):
+        from script import detect_blinks
+        blink_thread = threading.Thread(
+            target=detect_blinks.run_blink_detection,
+            kwargs={"stop_event": stop_event, "headless": True, "capture": capture},
+            daemon=True)
+        blink_thread.start()
+
+    start = time.monotonic()
+    try:
+        while not (bus.finished and sensor.finished and (blink_thread is None or not blink_thread.is_alive())):
+            time.sleep(0.05)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        engine.stop()
+        sampler.stop()
+        if blink_thread is not None:
+            blink_thread.join(timeout=2)
+    print(f"[回放] 完成，用时 {time.monotonic() - start:.1f}s")
+
+
+#用法: python -m script.recording replay <目录> [--fast | --speed 2.0]
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "replay":
+        speed = 1.0
+        if "--fast" in sys.argv:
+            speed = None
+        elif "--speed" in sys.argv:
+            speed = float(sys.argv[sys.argv.index("--speed") + 1])
+        replay(sys.argv[2], speed=speed)
+    else:
+        print("用法: python -m script.recording replay <目录> [--fast | --speed 2.0]")
@@ -0,0 +1,140 @@
+import json
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+from collections import OrderedDict
+
+#语音播放只由一个进程负责（main.py，多进程模式下为语音子进程），告警与提醒进入同一个优先级队列，
+#告警才能打断提醒。flask_server 等其他进程通过该 Unix 套接字提交提醒、查询或取消任务，
+#每次连接发送一行 JSON 请求，返回一行 JSON 结果。
+
+SOCKET_PATH = os.path.join(tempfile.gettempdir(), "safe_drive_speech.sock")
+
+#播放优先级，数值越小越优先（定义在这里，告警规则和监督进程无需导入语音合成）
+PRIORITY_ALERT = 0      # 安全警告（疲劳、饮酒等），可打断提醒
+PRIORITY_REMINDER = 10  # App 提交的提醒文本
+
+MAX_PENDING_JOBS = 16   # 排队中的提醒上限，超过时拒绝新的提交
+MAX_TRACKED_JOBS = 256  # 保留状态可查询的任务数
+
+
+def request_to_dict(job):
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "text": job.text,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "metrics": job.metrics,
+        "error": job.error,
+    }
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            message = json.loads(self.rfile.readline())
+            reply = self.server.owner.dispatch(message)
+        except (ValueError, TypeError, KeyError) as e:
+            reply = {"ok": False, "error": "bad_request", "message": str(e)}
+        self.wfile.write(json.dumps(reply, ensure_ascii=False).encode() + b"\n")
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class SpeechServer:
+    """
+    在本地 Unix 套接字上把语音请求转交给 service（AudioService），并记录最近的任务供查询：
+      {"op": "enqueue", "text": ..., "priority": ...} / {"op": "status", "job_id": ...} /
+      {"op": "cancel", "job_id": ...}
+    """
+
+    def __init__(self, service, path=SOCKET_PATH):
+        self.service = service
+        self.path = path
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # 上次异常退出留下的套接字文件
+        self._server = _UnixServer(self.path, _Handler)
+        self._server.owner = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+    def dispatch(self, message):
+        op = message["op"]
+        if op == "enqueue":
+            return self._enqueue(message)
+        with self._lock:
+            job = self._jobs.get(message["job_id"])
+        if job is None:
+            return {"ok": False, "error": "not_found"}
+        if op == "cancel" and not job.cancel():
+            return {"ok": False, "error": "finished", "job": request_to_dict(job)}
+        if op not in ("status", "cancel"):
+            return {"ok": False, "error": "bad_request", "message": f"未知操作 {op}"}
+        return {"ok": True, "job": request_to_dict(job)}
+
+    def _enqueue(self, message):
+        text = message["text"]
+        kwargs = {k: message[k] for k in ("priority", "voice", "rate") if message.get(k) is not None}
+        with self._lock:
+            pending = sum(1 for j in self._jobs.values() if j.status == "queued")
+            if pending >= MAX_PENDING_JOBS:
+                return {"ok": False, "error": "full"}
+            job = self.service.enqueue(text, **kwargs)
+            self._jobs[job.id] = job
+            self._jobs.move_to_end(job.id)
+            while len(self._jobs) > MAX_TRACKED_JOBS:
+                self._jobs.popitem(last=False)
+        return {"ok": True, "job": request_to_dict(job)}
+
+
+class SpeechClient:
+    def __init__(self, path=SOCKET_PATH, timeout=2.0):
+        self.path = path
+        self.timeout = timeout
+
+    def call(self, op, **fields):
+        # 语音进程未运行或无响应时返回 None
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.timeout)
+                sock.connect(self.path)
+                sock.sendall(json.dumps(dict(fields, op=op), ensure_ascii=False).encode() + b"\n")
+                with sock.makefile("rb") as f:
+                    line = f.readline()
+            return json.loads(line)
+        except (OSError, ValueError):
+            return None
+
+    def enqueue(self, text, priority=None, voice=None, rate=None):
+        return self.call("enqueue", text=text, priority=priority, voice=voice, rate=rate)
+
+    def status(self, job_id):
+        return self.call("status", job_id=job_id)
+
+    def cancel(self, job_id):
+        return self.call("cancel", job_id=job_id)
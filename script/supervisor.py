@@ -0,0 +1,372 @@
+import math
+import multiprocessing as mp
+import os
+import queue
+import signal
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+from script import vitals_bus, metrics, speech_ipc
+
+#多进程模式：视觉、心率血氧、酒精、语音各自运行在独立进程中，互不争抢 GIL，
+#某个子系统崩溃只会重启该进程。最新读数通过共享内存（seqlock 版本号）交给监督进程，
+#监督进程把读数转发到进程内的 vitals_bus，沿用 script/alerts.py 的告警规则。
+#监督进程只导入轻量模块，dlib、OpenCV、语音合成只在各自的子进程中加载。
+#用法: python -m script.supervisor
+
+KINDS = (vitals_bus.BPM, vitals_bus.BPM_CONFIDENCE, vitals_bus.SPO2, vitals_bus.HAND_FLAG,
+         vitals_bus.EAR, vitals_bus.BLINKS, vitals_bus.ALCOHOL, vitals_bus.ALCOHOL_FAULT)
+INT_KINDS = frozenset((vitals_bus.BPM, vitals_bus.BLINKS, vitals_bus.ALCOHOL_FAULT))
+
+HEADER = struct.Struct("<4sII")  # magic、布局版本、槽位数
+SLOT = struct.Struct("<Qdd")     # 版本号（写入中为奇数）、值、采样时间戳
+VERSION = struct.Struct("<Q")
+DATA = struct.Struct("<dd")
+MAGIC = b"SDVT"
+
+# 可选的 CPU 绑定，例如 {"blink": {2, 3}, "hrspo2": {1}}；为空时由调度器分配
+CPU_AFFINITY = {}
+
+
+class SharedVitals:
+    """
+    共享内存中的最新读数表，每种读数一个槽位：版本号 + 值 + 时间戳。
+    写入方先把版本号加一（奇数表示写入中），写完数据再加一；读取方在版本号为偶数且
+    读前读后一致时才采用，否则重试。每种读数只由一个进程写入（单写者 seqlock）。
+    值为 None 时存为 NaN。
+    """
+
+    def __init__(self, name=None, create=False, kinds=KINDS):
+        self.kinds = tuple(kinds)
+        self.offsets = {kind: HEADER.size + i * SLOT.size for i, kind in enumerate(self.kinds)}
+        size = HEADER.size + SLOT.size * len(self.kinds)
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+        self.buf = self.shm.buf
+        if create:
+            self.buf[:size] = bytes(size)
+            HEADER.pack_into(self.buf, 0, MAGIC, 1, len(self.kinds))
+        else:
+            magic, _, count = HEADER.unpack_from(self.buf, 0)
+            if magic != MAGIC or count != len(self.kinds):
+                raise ValueError("共享内存布局不匹配")
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def write(self, kind, value, timestamp):
+        offset = self.offsets[kind]
+        version, = VERSION.unpack_from(self.buf, offset)
+        if version & 1:
+            version += 1  # 上一个写入进程在写入中途退出
+        VERSION.pack_into(self.buf, offset, version + 1)
+        DATA.pack_into(self.buf, offset + VERSION.size, math.nan if value is None else value, timestamp)
+        VERSION.pack_into(self.buf, offset, version + 2)
+
+    def read(self, kind, retries=100):
+        # 返回 (更新次数, 值, 时间戳)；从未写入时更新次数为 0，一直读到写入中的数据时返回 None
+        offset = self.offsets[kind]
+        for _ in range(retries):
+            before, = VERSION.unpack_from(self.buf, offset)
+            if before & 1:
+                continue
+            value, timestamp = DATA.unpack_from(self.buf, offset + VERSION.size)
+            after, = VERSION.unpack_from(self.buf, offset)
+            if before == after:
+                if math.isnan(value):
+                    value = None
+                elif kind in INT_KINDS:
+                    value = int(value)
+                return before // 2, value, timestamp
+        return None
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+class SharedVitalsBridge:
+    # 监督进程中轮询共享内存，把更新过的读数按原采样时间戳发布到进程内总线
+    def __init__(self, shared, bus, interval=0.01):
+        self.shared = shared
+        self.bus = bus
+        self.interval = interval
+        self._thread = None
+
+    def start(self, stop_event):
+        self._thread = threading.Thread(target=self._run, args=(stop_event,), daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self, stop_event):
+        seen = dict.fromkeys(self.shared.kinds, 0)
+        while not stop_event.wait(self.interval):
+            for kind in self.shared.kinds:
+                slot = self.shared.read(kind)
+                if slot is None or slot[0] == seen[kind]:
+                    continue
+                seen[kind], value, timestamp = slot
+                self.bus.publish(kind, value, source="shm", timestamp=timestamp)
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+class RemoteSpeech:
+    """
+    监督进程中替代 AudioService 的代理：enqueue()/prewarm() 只把请求放入队列，
+    由语音子进程播放。不导入 messedge_tts，也不返回可查询状态的任务；
+    voice/rate 为 None 时由语音子进程使用默认值。
+    """
+
+    def __init__(self, requests):
+        self.requests = requests
+
+    def enqueue(self, text, priority=None, voice=None, rate=None):
+        priority = speech_ipc.PRIORITY_REMINDER if priority is None else priority
+        try:
+            self.requests.put_nowait(("speak", text, priority, voice, rate))
+            return True
+        except queue.Full:
+            print("[监督] 语音队列已满，丢弃一条语音")
+            return False
+
+    def prewarm(self, phrases, voice=None, rate=None):
+        self.requests.put(("prewarm", list(phrases), voice, rate))
+
+
+def metrics_socket(name):
+    return f"{metrics.SOCKET_PATH}.{name}"
+
+
+#各子系统在子进程中的入口，只导入自己需要的模块
+def run_hrspo2_worker(stop_event, options, requests):
+    from script import hrspo2
+    hrspo2.run_hrspo2(stop_event=stop_event, show_plot=options.get("show_plot", False))
+    if not stop_event.is_set():
+        # run_hrspo2 捕获传感器错误后正常返回，这里转为非零退出码，由监督进程重启
+        raise RuntimeError("心率血氧采集意外结束")
+
+
+def run_blink_worker(stop_event, options, requests):
+    from script import detect_blinks
+    detect_blinks.run_blink_detection(stop_event=stop_event, headless=not options.get("show_video", False))
+    if not stop_event.is_set():
+        # 摄像头断开时读帧失败，run_blink_detection 正常返回，同样按失败处理
+        raise RuntimeError("眨眼检测意外结束")
+
+
+def run_alcohol_worker(stop_event, options, requests):
+    from script import alcohol
+    sampler = alcohol.AlcoholSampler(alcohol.AlcoholSensor()).start(stop_event)
+    try:
+        while not stop_event.wait(1.0):
+            if not sampler.is_alive():
+                raise RuntimeError("酒精采样线程已退出")
+    finally:
+        sampler.stop()
+
+
+def run_tts_worker(stop_event, options, requests):
+    from script import messedge_tts
+    service = messedge_tts.get_service()
+    # 语音子进程是唯一的播放方，flask_server 的提醒也提交到这里
+    speech_server = speech_ipc.SpeechServer(service).start()
+    try:
+        while not stop_event.is_set():
+            try:
+                request = requests.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if request[0] == "speak":
+                _, text, priority, voice, rate = request
+                service.enqueue(text, priority=priority, voice=voice or messedge_tts.DEFAULT_VOICE,
+                                rate=rate or "+0%")
+            elif request[0] == "prewarm":
+                _, phrases, voice, rate = request
+                service.prewarm(phrases, voice=voice or messedge_tts.DEFAULT_VOICE, rate=rate or "+0%")
+    finally:
+        speech_server.stop()
+        service.stop()
+
+
+WORKERS = {
+    "hrspo2": run_hrspo2_worker,
+    "blink": run_blink_worker,
+    "alcohol": run_alcohol_worker,
+    "tts": run_tts_worker,
+}
+
+
+def worker_main(name, shm_name, stop_event, options, requests):
+    # Ctrl+C 会发给整个进程组，子进程忽略 SIGINT，统一由监督进程通过 stop_event 通知退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if name in CPU_AFFINITY:
+        os.sched_setaffinity(0, CPU_AFFINITY[name])
+    metrics.REGISTRY.process = name
+    shared = SharedVitals(shm_name)
+    unsubscribe = vitals_bus.bus.subscribe(lambda r: shared.write(r.kind, r.value, r.timestamp), kinds=shared.kinds)
+    try:
+        metrics_server = metrics.MetricsServer(metrics_socket(name)).start()
+    except OSError:
+        metrics_server = None
+    try:
+        WORKERS[name](stop_event, options, requests)
+    finally:
+        if metrics_server is not None:
+            metrics_server.stop()
+        unsubscribe()
+        shared.close()
+
+
+class WorkerState:
+    def __init__(self, name):
+        self.name = name
+        self.process = None
+        self.started_at = None
+        self.failures = 0
+        self.restart_at = 0.0
+        self.finished = False  # 正常退出（退出码 0）后不再重启
+
+
+class Supervisor:
+    """
+    启动并监视各子系统进程：进程崩溃（非零退出码或被信号终止）后按指数退避重启，
+    退出码为 0 视为子系统已完成（如回放结束），不再重启；
+    连续运行超过 stable_after 秒后退避时间复位。stop() 通过进程间的 stop_event 通知所有子进程退出，
+    超时未退出的强制终止。子进程用 spawn 方式启动，不继承监督进程的线程和锁。
+    """
+
+    def __init__(self, names, shared, options=None, requests=None, ctx=None,
+                 backoff=1.0, max_backoff=60.0, stable_after=60.0):
+        self.ctx = ctx or mp.get_context("spawn")
+        self.shared = shared
+        self.options = options or {}
+        self.requests = requests
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+        self.stop_event = self.ctx.Event()
+        self.workers = {name: WorkerState(name) for name in names}
+        self._restarts = metrics.REGISTRY.counter(
+            "safedrive_worker_restarts_total", "子系统进程重启次数", ("worker",))
+
+    def _spawn(self, state):
+        state.process = self.ctx.Process(
+            target=worker_main, name=f"safedrive-{state.name}",
+            args=(state.name, self.shared.name, self.stop_event, self.options, self.requests))
+        state.process.start()
+        state.started_at = time.monotonic()
+        print(f"[监督] 启动 {state.name} (pid {state.process.pid})")
+
+    def start(self):
+        for state in self.workers.values():
+            self._spawn(state)
+        return self
+
+    def _check(self, state, now):
+        process = state.process
+        if state.finished or (process is not None and process.is_alive()):
+            return
+        if process is not None:
+            process.join()
+            ran = now - state.started_at
+            if process.exitcode == 0:
+                state.finished = True
+                state.process = None
+                print(f"[监督] {state.name} 正常退出（运行 {ran:.1f}s），不再重启")
+                return
+            state.failures = 1 if ran >= self.stable_after else state.failures + 1
+            delay = min(self.max_backoff, self.backoff * 2 ** (state.failures - 1))
+            state.restart_at = now + delay
+            state.process = None
+            print(f"[监督] {state.name} 退出（退出码 {process.exitcode}，运行 {ran:.1f}s），{delay:.1f}s 后重启")
+        if now >= state.restart_at:
+            self._restarts.labels(state.name).inc()
+            self._spawn(state)
+
+    def run(self, until, poll_interval=0.5):
+        # 阻塞直到 until（threading.Event）被设置；子进程退出时通过 sentinel 立即唤醒
+        while not until.is_set():
+            sentinels = [s.process.sentinel for s in self.workers.values() if s.process is not None]
+            wait(sentinels, timeout=poll_interval)
+            if until.is_set():
+                break
+            now = time.monotonic()
+            for state in self.workers.values():
+                self._check(state, now)
+
+    def stop(self, timeout=5.0):
+        self.stop_event.set()
+        deadline = time.monotonic() + timeout
+        for state in self.workers.values():
+            if state.process is not None:
+                state.process.join(max(0.0, deadline - time.monotonic()))
+        for state in self.workers.values():
+            if state.process is not None and state.process.is_alive():
+                print(f"[监督] {state.name} 未按时退出，强制终止")
+                state.process.terminate()
+                state.process.join(1.0)
+                if state.process.is_alive():
+                    state.process.kill()
+                    state.process.join()
+
+
+def main():
+    from script import alerts, event_store  # 告警规则、提示语和显示设置与 main.py 共用
+
+    stop_event = threading.Event()
+    ctx = mp.get_context("spawn")
+    shared = SharedVitals(create=True)
+    requests = ctx.Queue(maxsize=64)
+    speech = alerts.speech = RemoteSpeech(requests)
+
+    supervisor = Supervisor(list(WORKERS), shared, {"show_plot": alerts.SHOW_PLOT, "show_video": alerts.SHOW_VIDEO},
+                            requests, ctx=ctx)
+
+    def shutdown(sig, frame):
+        # 信号处理函数里只设置线程事件；进程间的 stop_event 带锁，由主循环退出后再设置
+        print("\n[系统] 准备退出...")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    supervisor.start()
+    speech.prewarm([alerts.FATIGUE_WARNING_TEXT, alerts.ALCOHOL_WARNING_TEXT])
+
+    bridge = SharedVitalsBridge(shared, vitals_bus.bus).start(stop_event)
+    rule_engine = vitals_bus.RuleEngine(vitals_bus.bus, alerts.build_rules()).start(stop_event)
+    monitor_thread = threading.Thread(target=alerts.print_status, args=(stop_event,), daemon=True)
+    monitor_thread.start()
+    try:
+        metrics_server = metrics.MetricsServer(peers=[metrics_socket(name) for name in WORKERS]).start()
+    except OSError as e:
+        print(f"[系统] 指标套接字启动失败: {e}")
+        metrics_server = None
+
+    try:
+        supervisor.run(stop_event)
+    finally:
+        stop_event.set()
+        supervisor.stop()
+        bridge.join(timeout=2)
+        rule_engine.join(timeout=2)
+        monitor_thread.join(timeout=2)
+        if metrics_server is not None:
+            metrics_server.stop()
+        requests.cancel_join_thread()  # 语音进程已退出时不等待队列中剩余的请求
+        requests.close()
+        event_store.get_store().close()
+        shared.close()
+        shared.unlink()
+
+
+if __name__ == "__main__":
+    main()
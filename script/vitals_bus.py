@@ -0,0 +1,176 @@
+import threading
+import time
+from collections import deque, namedtuple
+from script import metrics
+
+#读数类型
+BPM = "bpm"
+BPM_CONFIDENCE = "bpm_confidence"
+SPO2 = "spo2"
+HAND_FLAG = "hand_flag"  # 滤波后的 IR 值，用于判断手是否在传感器上
+EAR = "ear"
+BLINKS = "blinks"
+ALCOHOL = "alcohol"  # 酒精传感器原始值（滚动中位数），传感器故障时为 None
+ALCOHOL_FAULT = "alcohol_fault"  # 酒精传感器连续读取失败为 1，恢复后为 0
+
+# seq 为总线内单调递增的序号，timestamp 为 time.time()
+Reading = namedtuple("Reading", "kind value timestamp source seq")
+
+
+class VitalsBus:
+    """
+    线程安全的发布/订阅总线：各传感器 publish() 带时间戳的读数，
+    消费者通过 wait() 在条件变量上等待新读数（毫秒级唤醒），或 subscribe() 注册回调。
+    """
+
+    def __init__(self, history=1024):
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._latest = {}
+        self._history = deque(maxlen=history)
+        self._subscribers = []
+
+    def publish(self, kind, value, source=None, timestamp=None):
+        with self._cond:
+            self._seq += 1
+            reading = Reading(kind, value, time.time() if timestamp is None else timestamp, source, self._seq)
+            self._latest[kind] = reading
+            self._history.append(reading)
+            self._cond.notify_all()
+            subscribers = list(self._subscribers)
+        # 回调在锁外执行，回调里再次 publish 也不会死锁
+        for kinds, callback in subscribers:
+            if kinds is None or kind in kinds:
+                try:
+                    callback(reading)
+                except Exception as e:
+                    print(f"[总线] 回调出错: {e}")
+        return reading
+
+    def latest(self, kind, default=None):
+        with self._cond:
+            return self._latest.get(kind, default)
+
+    def value(self, kind, default=0):
+        reading = self.latest(kind)
+        return default if reading is None else reading.value
+
+    @property
+    def seq(self):
+        with self._cond:
+            return self._seq
+
+    def wait(self, after_seq, kinds=None, timeout=None):
+        """
+        等待序号大于 after_seq 的读数，返回按序排列的列表（只包含 kinds 中的类型）。
+        超时返回空列表。历史缓冲溢出时较早的读数会丢失，只保留最新的 history 条。
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._seq > after_seq:
+                    readings = []
+                    for r in reversed(self._history):
+                        if r.seq <= after_seq:
+                            break
+                        if kinds is None or r.kind in kinds:
+                            readings.append(r)
+                    if readings:
+                        readings.reverse()
+                        return readings
+                    after_seq = self._seq
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return []
+                self._cond.wait(remaining)
+
+    def subscribe(self, callback, kinds=None):
+        entry = (None if kinds is None else frozenset(kinds), callback)
+        with self._cond:
+            self._subscribers.append(entry)
+
+        def unsubscribe():
+            with self._cond:
+                if entry in self._subscribers:
+                    self._subscribers.remove(entry)
+        return unsubscribe
+
+
+class AlertRule:
+    """
+    告警规则：kinds 中的读数到达时调用 condition(reading, bus)。
+    条件需连续成立 debounce 秒才触发 action(reading)，两次触发至少间隔 cooldown 秒；
+    触发后重新开始计算 debounce。触发时记录从该读数采样到触发的延迟（metrics.ALERT_LATENCY）。
+    """
+
+    def __init__(self, name, kinds, condition, action, debounce=0.0, cooldown=0.0):
+        self.name = name
+        self.kinds = frozenset(kinds)
+        self.condition = condition
+        self.action = action
+        self.debounce = debounce
+        self.cooldown = cooldown
+        self.holding_since = None
+        self.last_fired = None
+        self._latency = metrics.ALERT_LATENCY.labels(name)
+        self._fired = metrics.ALERTS.labels(name)
+        self._action_time = metrics.stage("alert", name)
+
+    def evaluate(self, reading, bus, now=None):
+        now = time.monotonic() if now is None else now
+        if not self.condition(reading, bus):
+            self.holding_since = None
+            return False
+        if self.holding_since is None:
+            self.holding_since = now
+        if now - self.holding_since < self.debounce:
+            return False
+        if self.last_fired is not None and now - self.last_fired < self.cooldown:
+            return False
+        self.last_fired = now
+        self.holding_since = now
+        self._latency.observe(max(0.0, time.time() - reading.timestamp))
+        self._fired.inc()
+        with self._action_time.time():
+            self.action(reading)
+        return True
+
+
+class RuleEngine:
+    # 在独立线程中等待总线上的新读数并逐条评估规则；clock 用于计算 debounce/cooldown，测试时可替换
+    def __init__(self, bus, rules, clock=time.monotonic):
+        self.bus = bus
+        self.clock = clock
+        self.rules = list(rules)
+        self.kinds = frozenset().union(*(r.kinds for r in self.rules)) if self.rules else frozenset()
+        self._thread = None
+
+    def start(self, stop_event):
+        self._thread = threading.Thread(target=self._run, args=(stop_event,), daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self, stop_event):
+        seq = self.bus.seq
+        while not stop_event.is_set():
+            readings = self.bus.wait(seq, kinds=self.kinds, timeout=0.5)
+            for reading in readings:
+                seq = reading.seq
+                self.process(reading)
+
+    def process(self, reading):
+        now = self.clock()
+        for rule in self.rules:
+            if reading.kind in rule.kinds:
+                try:
+                    rule.evaluate(reading, self.bus, now=now)
+                except Exception as e:
+                    print(f"[规则] {rule.name} 执行失败: {e}")
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+# 进程内默认总线
+bus = VitalsBus()
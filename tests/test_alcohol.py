@@ -0,0 +1,170 @@
+import time
+
+import numpy as np
+import pytest
+
+from script import alcohol
+
+
+def test_sensor_rereads_open_fd(tmp_path):
+    raw = tmp_path / "in_voltage4_raw"
+    raw.write_text("1234\n")
+    sensor = alcohol.AlcoholSensor(str(raw))
+    try:
+        assert sensor.read_raw_value() == 1234
+        fd = sensor._fd
+        raw.write_text("4095\n")
+        raw_value, voltage = sensor.read_sample()
+        assert raw_value == 4095 and voltage == pytest.approx(3.3)
+        assert sensor._fd == fd  # 文件描述符保持打开，用 pread 从头重读
+    finally:
+        sensor.close()
+
+
+def test_sensor_errors_reopen(tmp_path):
+    raw = tmp_path / "in_voltage4_raw"
+    raw.write_text("bad\n")
+    sensor = alcohol.AlcoholSensor(str(raw))
+    assert sensor.read_raw_value() is None
+    assert sensor._fd is None
+    raw.write_text("100\n")
+    assert sensor.read_raw_value() == 100
+    sensor.close()
+    assert alcohol.AlcoholSensor(str(tmp_path / "missing")).read_raw_value() is None
+
+
+def make_iio(tmp_path, spec, data):
+    # sysfs 属性与 /dev/iio:device0 都用普通文件模拟，select 对普通文件总是可读
+    sysfs = tmp_path / "sys" / "iio:device0"
+    for sub in ("scan_elements", "buffer", "trigger"):
+        (sysfs / sub).mkdir(parents=True)
+    (sysfs / "scan_elements" / "in_voltage4_type").write_text(spec + "\n")
+    dev = tmp_path / "dev"
+    dev.mkdir()
+    (dev / "iio:device0").write_bytes(data)
+    return alcohol.IIOBufferedReader(sysfs_root=str(tmp_path / "sys"), dev_root=str(dev),
+                                     buffer_length=4, trigger="hrtimer0")
+
+
+def test_buffered_read_masks_and_batches(tmp_path):
+    # 高 4 位为噪声，应被 12 位掩码去掉
+    words = np.array([0xF001, 0x0FFF, 0x1234, 0x0800, 0x0042, 0xA005], dtype="<u2")
+    reader = make_iio(tmp_path, "le:u12/16>>0", words.tobytes() + b"\x01")
+    reader.start()
+    try:
+        sysfs = tmp_path / "sys" / "iio:device0"
+        assert (sysfs / "scan_elements" / "in_voltage4_en").read_text() == "1"
+        assert (sysfs / "buffer" / "length").read_text() == "4"
+        assert (sysfs / "buffer" / "enable").read_text() == "1"
+        assert (sysfs / "trigger" / "current_trigger").read_text() == "hrtimer0"
+
+        assert reader.read().tolist() == [0x001, 0xFFF, 0x234, 0x800]
+        # 末尾不足一个存储单元的字节被丢弃
+        assert reader.read().tolist() == [0x042, 0x005]
+    finally:
+        reader.stop()
+    assert (tmp_path / "sys" / "iio:device0" / "buffer" / "enable").read_text() == "0"
+
+
+def test_parse_type_big_endian_shift(tmp_path):
+    words = np.array([0x1230 | 0x8000, 0x0010], dtype=">u2")
+    reader = make_iio(tmp_path, "be:u12/16>>4", words.tobytes())
+    assert reader.dtype == np.dtype(">u2") and reader.shift == 4 and reader.mask == 0xFFF
+    reader.start()
+    try:
+        assert reader.read().tolist() == [0x923, 0x001]
+    finally:
+        reader.stop()
+
+
+class FakeVitals:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, kind, value, source=None):
+        self.published.append((kind, value))
+
+
+def test_sampler_with_buffered_reader(tmp_path):
+    words = np.array([100, 200, 300, 400, 500], dtype="<u2")
+    reader = make_iio(tmp_path, "le:u12/16>>0", words.tobytes())
+    vitals = FakeVitals()
+    sampler = alcohol.AlcoholSampler(sensor=object(), buffered=reader, publish_every=5, vitals=vitals).start()
+    try:
+        deadline = time.monotonic() + 2
+        while not vitals.published and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        sampler.stop()
+    assert vitals.published[0] == (alcohol.vitals_bus.ALCOHOL, 300.0)
+    assert sampler.median() == (300.0, pytest.approx(alcohol.raw_to_voltage(300)))
+
+
+class ScriptedSensor:
+    # 按脚本依次返回读数或抛出异常，脚本用完后让采样循环停止
+    def __init__(self, script, stop):
+        self.script = list(script)
+        self.stop = stop
+
+    def _read_raw(self):
+        if not self.script:
+            self.stop.set()
+            return 0
+        item = self.script.pop(0)
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+
+class RecordingStop:
+    # 替代采样线程的 _stop：记录每次等待的时长而不真正睡眠
+    def __init__(self):
+        self.delays = []
+        self.done = False
+
+    def is_set(self):
+        return self.done
+
+    def set(self):
+        self.done = True
+
+    def wait(self, timeout):
+        self.delays.append(timeout)
+        return self.done
+
+
+def run_sampler(script, **kwargs):
+    stop = RecordingStop()
+    vitals = FakeVitals()
+    sampler = alcohol.AlcoholSampler(sensor=ScriptedSensor(script, stop), rate_hz=100, publish_every=0,
+                                     vitals=vitals, **kwargs)
+    sampler._stop = stop
+    sampler._run(None)
+    return sampler, vitals, stop
+
+
+def test_sensor_fault_published_and_cleared(capsys):
+    errors = [OSError(5, "Input/output error")] * 10
+    sampler, vitals, stop = run_sampler([1500, 1500] + errors + [1400])
+    kinds = alcohol.vitals_bus
+    assert vitals.published == [(kinds.ALCOHOL_FAULT, 1), (kinds.ALCOHOL, None), (kinds.ALCOHOL_FAULT, 0)]
+    assert sampler.errors == 10 and sampler.consecutive_errors == 0 and not sampler.faulted
+    # 故障前的样本被丢弃
+    assert list(sampler.samples) == [1400, 0]
+
+    # 两次正常采样之后的 10 次等待为失败退避：按指数增长，封顶 ERROR_BACKOFF_MAX
+    assert stop.delays[2:12] == [min(0.01 * 2 ** n, alcohol.ERROR_BACKOFF_MAX) for n in range(1, 11)]
+
+    out = capsys.readouterr().out
+    assert out.count("读取传感器失败") == 1
+    assert out.count("传感器故障") == 1
+    assert out.count("传感器恢复") == 1
+
+
+def test_transient_error_logged_without_fault(capsys):
+    sampler, vitals, _ = run_sampler([1500, ValueError("bad"), 1500, ValueError("bad"), ValueError("bad"), 1500])
+    assert vitals.published == []
+    assert sampler.errors == 3 and not sampler.faulted
+    assert list(sampler.samples) == [1500, 1500, 1500, 0]
+    out = capsys.readouterr().out
+    assert out.count("读取传感器失败") == 2 and out.count("传感器恢复") == 2
@@ -0,0 +1,88 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+pytest.importorskip("dlib")
+
+from script import detect_blinks
+
+FRAMES = 20
+
+
+@pytest.fixture
+def video_file(tmp_path):
+    # 每帧整体灰度为 序号*10，解码后按均值还原序号（MJPG 有损，但大面积纯色足够准确）
+    path = str(tmp_path / "clip.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 25, (64, 48))
+    for i in range(FRAMES):
+        writer.write(np.full((48, 64, 3), i * 10, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def frame_number(frame):
+    return int(round(frame.mean() / 10))
+
+
+def test_file_capture_delivers_every_frame(video_file):
+    vs = detect_blinks.LatestFrameCapture(video_file).start()
+    assert vs.drop_frames is False
+    seen = []
+    try:
+        while True:
+            ok, frame, grabbed_at = vs.read(timeout=2)
+            if not ok:
+                if vs.finished():
+                    break
+                continue
+            seen.append(frame_number(frame))
+            time.sleep(0.01)  # 处理端比读文件慢，文件模式下采集线程应等待而不是丢帧
+    finally:
+        vs.stop()
+    assert seen == list(range(FRAMES))
+    assert vs.captured == FRAMES and vs.dropped == 0
+    assert not vs._thread.is_alive()
+
+
+def test_stop_while_capture_waits(video_file):
+    vs = detect_blinks.LatestFrameCapture(video_file).start()
+    ok, _, _ = vs.read(timeout=2)
+    assert ok
+    time.sleep(0.05)  # 采集线程此时阻塞在等待处理端取帧
+    start = time.monotonic()
+    vs.stop()
+    assert time.monotonic() - start < 1.0
+    assert not vs._thread.is_alive()
+
+
+class RecordingDetector:
+    # 替代 BlinkDetector（不需要 dlib 模型文件），记录处理过的帧序号
+    instances = []
+
+    def __init__(self, *args, **kwargs):
+        self.total = 0
+        self.frames = []
+        RecordingDetector.instances.append(self)
+
+    def process(self, frame):
+        self.frames.append(frame_number(frame))
+        return detect_blinks.FrameResult()
+
+
+def test_run_blink_detection_from_file(video_file, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(detect_blinks, "BlinkDetector", RecordingDetector)
+    RecordingDetector.instances = []
+    stop = threading.Event()
+    detect_blinks.run_blink_detection(stop_event=stop, video_source=video_file, headless=True, report_every=0)
+    detector, = RecordingDetector.instances
+    assert detector.frames == list(range(FRAMES))
+
+
+def test_run_blink_detection_rejects_bad_debug_every(video_file):
+    for value in (0, -1):
+        with pytest.raises(ValueError):
+            detect_blinks.run_blink_detection(video_source=video_file, headless=True, debug_every=value)
@@ -0,0 +1,66 @@
+import os
+
+from script import event_store
+
+
+def write_log(path, lines):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("".join(line + "\n" for line in lines))
+
+
+def test_default_path_resolved_at_call_time(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "events.db")
+    monkeypatch.setattr(event_store, "DB_PATH", db_path)
+    store = event_store.EventStore()
+    try:
+        assert store.path == db_path
+        assert os.path.exists(db_path)
+    finally:
+        store.close()
+
+
+def test_sync_imports_legacy_log_when_db_not_empty(tmp_path):
+    log = tmp_path / "abnormal_log.txt"
+    write_log(log, ["2024-05-01 08:00:00 | 血氧过低", "2024-05-01 09:00:00 | 心率异常"])
+    store = event_store.EventStore(str(tmp_path / "events.db"))
+    try:
+        # main.py 已写入新事件，旧日志仍应导入
+        store.append("检测到疲劳")
+        store.flush()
+        assert store.sync_text_log(str(log)) == 2
+        assert store.count() == 3
+
+        # 日志未变化时不再读取
+        assert store.sync_text_log(str(log)) == 0
+
+        # 追加内容后重新导入，只新增未导入过的行
+        write_log(log, ["2024-05-01 08:00:00 | 血氧过低", "2024-05-01 09:00:00 | 心率异常",
+                        "2024-05-02 10:00:00 | 检测到饮酒"])
+        os.utime(log, ns=(0, os.stat(log).st_mtime_ns + 1_000_000_000))
+        assert store.sync_text_log(str(log)) == 1
+        assert [e.message for e in store.query(newest_first=True, limit=1)] == ["检测到疲劳"]
+        assert store.count() == 4
+    finally:
+        store.close()
+
+    # 标记保存在库里，重新打开后不会重复导入
+    reopened = event_store.EventStore(str(tmp_path / "events.db"))
+    try:
+        assert reopened.sync_text_log(str(log)) == 0
+        assert reopened.sync_text_log(str(tmp_path / "missing.txt")) == 0
+    finally:
+        reopened.close()
+
+
+def test_stats_matches_query(tmp_path):
+    store = event_store.EventStore(str(tmp_path / "events.db"))
+    try:
+        for i in range(5):
+            store.append(f"事件{i}", ts=1000 + i)
+        store.flush()
+        count, min_id, max_id, last_id = store.stats(since=1001, until=1004)
+        ids = [e.id for e in store.query(since=1001, until=1004)]
+        assert (count, min_id, max_id) == (len(ids), min(ids), max(ids))
+        assert last_id == store.last_id()
+    finally:
+        store.close()
@@ -0,0 +1,57 @@
+import time
+
+import numpy as np
+import pytest
+
+from benchmarks import synthetic
+from script import hrspo2
+
+FS = hrspo2.SAMPLE_RATE
+
+
+def filtered_ppg(bpm, seconds, seed=1):
+    # 与采集线程相同：原始 IR 先经流式低通，再做峰值检测
+    ir, _ = synthetic.ppg_signal(int(FS * seconds), fs=FS, bpm=bpm, seed=seed)
+    return hrspo2.StreamingLowpass().process(ir)
+
+
+@pytest.mark.parametrize("bpm", [50, 72, 110, 150])
+def test_estimate_known_bpm(bpm):
+    peaks, estimates = hrspo2.estimate_heart_rate(filtered_ppg(bpm, 120))
+    estimate, confidence = estimates[-1]
+    # RR 间期以整数样本计（25Hz 下 110 BPM 约 13.6 个样本），允许量化误差
+    assert abs(estimate - bpm) <= 0.05 * bpm
+    assert confidence > 0.5
+    assert np.all(np.diff(peaks) > 0)
+
+
+def test_block_size_does_not_change_result():
+    signal = filtered_ppg(72, 300)
+    reference_peaks, reference = hrspo2.estimate_heart_rate(signal, block_size=len(signal))
+    for block_size in (1, 7, 32, 1000):
+        peaks, estimates = hrspo2.estimate_heart_rate(signal, block_size=block_size)
+        np.testing.assert_array_equal(peaks, reference_peaks)
+        np.testing.assert_allclose(estimates[-1], reference[-1])
+
+
+def test_discontinuity_drops_history():
+    signal = filtered_ppg(72, 30)
+    estimator = hrspo2.HeartRateEstimator()
+    estimator.process(signal[:300], 0)
+    # 下一批序号不连续（FIFO 溢出）：阈值历史被丢弃，结果与从该批开始处理相同
+    peaks = estimator.process(signal[300:600], 10_000)
+    fresh = hrspo2.HeartRateEstimator().process(signal[300:600], 10_000)
+    np.testing.assert_array_equal(peaks, fresh)
+    # 跨越间隙的峰值间隔不计入 RR：72 BPM 在 25Hz 下约 21 个样本
+    assert all(abs(gap - 21) <= 2 for gap in estimator.rr)
+    assert estimator.last_peak_index == fresh[-1]
+
+
+def test_offline_validation_faster_than_real_time():
+    signal = filtered_ppg(72, 3600)
+    start = time.perf_counter()
+    _, estimates = hrspo2.estimate_heart_rate(signal, block_size=4096)
+    elapsed = time.perf_counter() - start
+    assert abs(estimates[-1][0] - 72) <= 4
+    # 一小时数据应在数秒内处理完（实际约数毫秒），留足慢机器的余量
+    assert elapsed < 3600 / 100
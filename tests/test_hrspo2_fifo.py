@@ -0,0 +1,152 @@
+import numpy as np
+from script import hrspo2, recording
+
+
+class FakeSMBus:
+    """
+    模拟 MAX30102 的 FIFO（FIFO_ROLLOVER 关闭）：5 位读写指针，FIFO 满后新样本被丢弃，
+    溢出计数饱和于 31，读 FIFO_DATA 时清零；未读样本达到 17 个时置位将满中断，读中断状态时清除。
+    样本值即其全局序号，便于核对。
+    """
+
+    def __init__(self):
+        self.fifo = []
+        self.wr = 0
+        self.rd = 0
+        self.ovf = 0
+        self.a_full = False
+        self.produced = 0
+
+    def produce(self, n):
+        for _ in range(n):
+            if len(self.fifo) >= hrspo2.FIFO_DEPTH:
+                self.ovf = min(0x1F, self.ovf + 1)
+            else:
+                self.fifo.append(self.produced)
+                self.wr = (self.wr + 1) & 0x1F
+                if len(self.fifo) == hrspo2.FIFO_A_FULL_SAMPLES:
+                    self.a_full = True
+            self.produced += 1
+
+    def write_byte_data(self, addr, reg, value):
+        pass
+
+    def read_byte_data(self, addr, reg):
+        if reg == hrspo2.REG_INTR_STATUS_1:
+            status, self.a_full = (hrspo2.INTR_A_FULL if self.a_full else 0), False
+            return status
+        return {hrspo2.REG_FIFO_WR_PTR: self.wr, hrspo2.REG_FIFO_RD_PTR: self.rd,
+                hrspo2.REG_OVF_COUNTER: self.ovf}.get(reg, 0)
+
+    def read_i2c_block_data(self, addr, reg, length):
+        assert reg == hrspo2.REG_FIFO_DATA
+        data = []
+        for _ in range(length // hrspo2.BYTES_PER_SAMPLE):
+            value = self.fifo.pop(0)
+            self.rd = (self.rd + 1) & 0x1F
+            red, ir = value + 1000, value
+            data += [(red >> 16) & 0xFF, (red >> 8) & 0xFF, red & 0xFF,
+                     (ir >> 16) & 0xFF, (ir >> 8) & 0xFF, ir & 0xFF]
+        self.ovf = 0
+        return data
+
+
+def test_pointer_difference_wraps():
+    bus = FakeSMBus()
+    reader = hrspo2.FifoReader(bus, start_time=0.0)
+    bus.produce(30)
+    reader.read()
+    bus.produce(5)  # 写指针回绕到 3，读指针为 30
+    assert bus.wr < bus.rd
+    assert reader.pending() == (5, 0)
+    batch = reader.read()
+    assert batch.first_index == 30
+    assert batch.samples[:, 0].tolist() == [30, 31, 32, 33, 34]
+    assert batch.samples[:, 1].tolist() == [1030, 1031, 1032, 1033, 1034]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_exactly_full_fifo_is_not_empty():
+    bus = FakeSMBus()
+    clock = Clock()
+    reader = hrspo2.FifoReader(bus, sample_rate=25, start_time=0.0, clock=clock)
+    bus.produce(32)  # 恰好存满：读写指针相等且尚未溢出
+    assert bus.wr == bus.rd and bus.ovf == 0
+    assert reader.pending() == (32, 0)
+    batch = reader.read()
+    assert batch.samples[:, 0].tolist() == list(range(32)) and batch.overflow == 0
+
+    # 读空后指针再次相等：为空
+    assert reader.pending() == (0, 0)
+    assert len(reader.read()) == 0
+
+    # 上次读出后又存满一次（32 个样本需 1.28 秒）
+    clock.now = 1.3
+    bus.produce(32)
+    batch = reader.read()
+    assert batch.first_index == 32 and len(batch) == 32
+    assert reader.sample_index == 64
+
+
+def test_stale_almost_full_flag_is_ignored():
+    bus = FakeSMBus()
+    clock = Clock()
+    reader = hrspo2.FifoReader(bus, sample_rate=25, start_time=0.0, clock=clock)
+    bus.produce(20)
+    reader.read()
+    # 读出 FIFO 时未读中断状态，将满标志仍保留；刚读完时 FIFO 不可能再次存满
+    assert bus.a_full
+    clock.now = 0.1
+    assert reader.pending() == (0, 0)
+
+
+def test_overflow_gap_follows_buffered_samples():
+    bus = FakeSMBus()
+    reader = hrspo2.FifoReader(bus, sample_rate=25, start_time=100.0)
+    bus.produce(10)
+    first = reader.read()
+    assert first.first_index == 0 and len(first) == 10
+
+    bus.produce(40)  # FIFO 中为 10..41，42..49 丢失
+    batch = reader.read()
+    assert batch.overflow == 8
+    assert batch.first_index == 10
+    assert batch.samples[:, 0].tolist() == list(range(10, 42))
+    assert np.allclose(batch.timestamps, 100.0 + np.arange(10, 42) / 25)
+
+    bus.produce(5)
+    after = reader.read()
+    assert after.first_index == 50
+    assert after.samples[:, 0].tolist() == list(range(50, 55))
+    assert reader.total_overflow == 8
+
+
+def test_replay_reports_gap_at_same_place(tmp_path):
+    bus = FakeSMBus()
+    reader = hrspo2.FifoReader(bus, start_time=0.0)
+    recorder = recording.Recorder(str(tmp_path))
+    original = []
+    for n in (10, 40, 5, 3):
+        bus.produce(n)
+        batch = reader.read()
+        recorder.record_ppg(batch)
+        original.append((batch.first_index, batch.samples[:, 0].tolist(), batch.overflow))
+    recorder.close()
+
+    _, replay_bus, _, _ = recording.open_replay(str(tmp_path), speed=None)
+    replay_reader = hrspo2.FifoReader(replay_bus, start_time=0.0)
+    replayed = []
+    while not replay_bus.finished:
+        batch = replay_reader.read()
+        replayed.append((batch.first_index, batch.samples[:, 0].tolist(), batch.overflow))
+    assert [i for b in replayed for i in range(b[0], b[0] + len(b[1]))] == \
+        [i for b in original for i in range(b[0], b[0] + len(b[1]))]
+    assert sum(b[2] for b in replayed) == sum(b[2] for b in original) == 8
+    assert replay_reader.sample_index == reader.sample_index
@@ -0,0 +1,35 @@
+import numpy as np
+from scipy.signal import sosfreqz
+from script import hrspo2
+
+
+def gain(sos, freq, fs=hrspo2.SAMPLE_RATE):
+    _, h = sosfreqz(sos, worN=[freq], fs=fs)
+    return abs(h[0])
+
+
+def test_default_cutoff_scales_with_sample_rate():
+    lowpass = hrspo2.StreamingLowpass()
+    assert 2.0 <= hrspo2.LOWPASS_CUTOFF_RATIO * hrspo2.SAMPLE_RATE <= 3.0
+    # 心率频段（40~120 BPM）基本保留，4~6Hz 噪声明显衰减
+    assert gain(lowpass.sos, 0.7) > 0.9
+    assert gain(lowpass.sos, 2.0) > 0.65
+    assert gain(lowpass.sos, 4.0) < 0.5
+    assert gain(lowpass.sos, 6.0) < 0.35
+
+
+def test_same_normalized_cutoff_as_original_100hz_design():
+    # 原设计 8Hz@100Hz，与当前默认值的归一化截止频率相同
+    original = hrspo2.design_lowpass(8, 100, 1, output='sos')
+    current = hrspo2.StreamingLowpass().sos
+    assert np.allclose(original, current)
+
+
+def test_lowpass_filter_attenuates_high_frequency():
+    fs = hrspo2.SAMPLE_RATE
+    t = np.arange(500) / fs
+    beat = np.sin(2 * np.pi * 1.2 * t)
+    noise = 0.5 * np.sin(2 * np.pi * 5.5 * t)
+    out = hrspo2.lowpass_filter(beat + noise)
+    residual = out[50:-50] - hrspo2.lowpass_filter(beat)[50:-50]
+    assert np.std(residual) < 0.2 * np.std(noise)
@@ -0,0 +1,197 @@
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip("edge_tts")
+pytest.importorskip("pygame")
+
+from script import messedge_tts
+
+
+class StubCommunicate:
+    """替代 edge_tts.Communicate，按文本返回固定的音频块并记录调用次数，不联网。"""
+    calls = []
+    audio = {}
+
+    def __init__(self, text, voice=None, rate=None):
+        self.text = text
+        StubCommunicate.calls.append(text)
+
+    async def stream(self):
+        yield {"type": "WordBoundary"}
+        for chunk in StubCommunicate.audio.get(self.text, [b"mp3:" + self.text.encode()]):
+            yield {"type": "audio", "data": chunk}
+
+
+@pytest.fixture
+def stub_tts(monkeypatch):
+    StubCommunicate.calls = []
+    StubCommunicate.audio = {}
+    monkeypatch.setattr(messedge_tts.edge_tts, "Communicate", StubCommunicate)
+    return StubCommunicate
+
+
+def test_synthesize_once_then_hit(tmp_path, stub_tts):
+    cache = messedge_tts.AudioCache(str(tmp_path))
+    first = asyncio.run(cache.get_or_synthesize("请注意休息"))
+    second = asyncio.run(cache.get_or_synthesize("请注意休息"))
+    assert first == second == "mp3:请注意休息".encode()
+    assert stub_tts.calls == ["请注意休息"]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # 新进程（空内存缓存）从磁盘命中
+    reopened = messedge_tts.AudioCache(str(tmp_path))
+    assert reopened.get("请注意休息") == first
+    assert stub_tts.calls == ["请注意休息"]
+
+
+def test_memory_and_disk_eviction(tmp_path):
+    cache = messedge_tts.AudioCache(str(tmp_path), max_memory_bytes=250, max_disk_bytes=250)
+    for i, name in enumerate("abc"):
+        cache.put(name, "v", "+0%", bytes(100))
+        path = cache._path(cache.key(name, "v", "+0%"))
+        os.utime(path, (1000 + i, 1000 + i))  # 固定写入顺序，不依赖文件系统时间精度
+    cache._evict_disk()
+
+    assert cache._memory_bytes <= 250 and len(cache._memory) == 2
+    names = sorted(os.listdir(tmp_path))
+    assert len(names) == 2
+    assert cache._path(cache.key("a", "v", "+0%")).rsplit(os.sep, 1)[1] not in names
+
+
+def test_empty_audio_is_not_cached(tmp_path, stub_tts):
+    stub_tts.audio["无声"] = []
+    cache = messedge_tts.AudioCache(str(tmp_path))
+    assert asyncio.run(cache.get_or_synthesize("无声")) == b""
+    cache.put("无声", messedge_tts.DEFAULT_VOICE, "+0%", b"")
+    assert cache.get("无声") is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_empty_audio_fails_request(tmp_path, stub_tts, monkeypatch):
+    stub_tts.audio["无声"] = []
+    monkeypatch.setattr(messedge_tts.pygame.mixer, "init", lambda: None)
+    played = []
+    service = messedge_tts.AudioService(cache=messedge_tts.AudioCache(str(tmp_path)), streaming=False)
+
+    async def fake_play(audio):
+        played.append(audio)
+    service._play = fake_play
+
+    request = service.enqueue("无声")  # start() 之前入队也应被处理
+    service.start()
+    try:
+        assert request.wait(5)
+        assert request.status == "failed" and request.error
+        assert played == []
+        assert service.cache.get("无声") is None
+
+        ok = service.enqueue("你好")
+        assert ok.wait(5) and ok.status == "done"
+        assert played == ["mp3:你好".encode()]
+    finally:
+        service.stop()
+
+
+class FakeStdin:
+    def __init__(self, proc):
+        self.proc = proc
+
+    def write(self, data):
+        self.proc.received.append(bytes(data))
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.proc.returncode = 0
+
+
+class FakePlayer:
+    """替代播放器子进程，记录启动时合成已产生的音频块数和写入 stdin 的数据。"""
+    def __init__(self, cmd, chunks_at_start):
+        self.cmd = cmd
+        self.chunks_at_start = chunks_at_start
+        self.received = []
+        self.returncode = None
+        self.stdin = FakeStdin(self)
+
+    async def wait(self):
+        return self.returncode
+
+    def kill(self):
+        self.returncode = -9
+
+
+@pytest.fixture
+def fake_player(monkeypatch):
+    players = []
+
+    class CountingCommunicate(StubCommunicate):
+        yielded = 0
+
+        async def stream(self):
+            async for chunk in StubCommunicate.stream(self):
+                if chunk["type"] == "audio":
+                    CountingCommunicate.yielded += 1
+                yield chunk
+                await asyncio.sleep(0)  # 模拟网络分块到达
+
+    async def create_subprocess_exec(*cmd, **kwargs):
+        player = FakePlayer(list(cmd), CountingCommunicate.yielded)
+        players.append(player)
+        return player
+
+    StubCommunicate.calls = []
+    StubCommunicate.audio = {}
+    CountingCommunicate.yielded = 0
+    monkeypatch.setattr(messedge_tts.edge_tts, "Communicate", CountingCommunicate)
+    monkeypatch.setattr(messedge_tts.asyncio, "create_subprocess_exec", create_subprocess_exec)
+    return players
+
+
+def test_stream_starts_after_prefix(fake_player):
+    chunks = [bytes([i]) * 1000 for i in range(10)]
+    StubCommunicate.audio["长提醒"] = chunks
+    audio, timing = asyncio.run(messedge_tts.stream_and_play("长提醒", "v", "+0%", ["player", "-"]))
+
+    player, = fake_player
+    # 累计 5 块（5000 字节）时超过 4096 字节门限，此时合成尚未结束
+    assert player.chunks_at_start == 5
+    assert b"".join(player.received) == b"".join(chunks) == audio
+    assert player.returncode == 0
+    assert 0 <= timing["time_to_first_audio"] <= timing["synthesis_time"]
+
+
+def test_stream_short_text_plays_after_synthesis(fake_player):
+    StubCommunicate.audio["短"] = [b"x" * 100, b"y" * 100]
+    audio, timing = asyncio.run(messedge_tts.stream_and_play("短", "v", "+0%", ["player", "-"]))
+    player, = fake_player
+    assert player.chunks_at_start == 2
+    assert b"".join(player.received) == audio == b"x" * 100 + b"y" * 100
+
+
+def test_stream_interrupted_returns_none(fake_player):
+    StubCommunicate.audio["长提醒"] = [bytes(1000)] * 10
+    calls = []
+
+    def should_stop():
+        calls.append(1)
+        return len(calls) > 7
+    audio, _ = asyncio.run(messedge_tts.stream_and_play("长提醒", "v", "+0%", ["player", "-"], should_stop))
+    player, = fake_player
+    assert audio is None
+    assert player.returncode is not None
+
+
+def test_missing_stream_player_logged_once(monkeypatch, capsys):
+    monkeypatch.setattr(messedge_tts.shutil, "which", lambda name: None)
+    monkeypatch.setattr(messedge_tts, "_warned_no_player", False)
+    assert messedge_tts.find_stream_player() is None
+    assert messedge_tts.find_stream_player() is None
+    out = capsys.readouterr().out
+    assert out.count("mpg123/ffplay") == 1
+
+    monkeypatch.setattr(messedge_tts.shutil, "which", lambda name: "/usr/bin/" + name)
+    assert messedge_tts.find_stream_player() == messedge_tts.STREAM_PLAYERS[0]
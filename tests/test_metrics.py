@@ -0,0 +1,74 @@
+import socket
+
+from script import metrics
+
+
+def make_registry(process="test"):
+    registry = metrics.Registry(process=process)
+    hist = registry.histogram("demo_seconds", "演示耗时", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        hist.labels("read").observe(value)
+    registry.counter("demo_total", "演示计数", ("rule",)).labels('a"b\\c\nd').inc(2)
+    return registry
+
+
+def test_render_histogram_and_counter():
+    lines = make_registry().render().splitlines()
+    assert lines == [
+        "# HELP demo_seconds 演示耗时",
+        "# TYPE demo_seconds histogram",
+        # 桶为累积计数，边界值落在 le 等于该值的桶里
+        'demo_seconds_bucket{stage="read",process="test",le="0.1"} 2',
+        'demo_seconds_bucket{stage="read",process="test",le="1.0"} 3',
+        'demo_seconds_bucket{stage="read",process="test",le="+Inf"} 4',
+        'demo_seconds_sum{stage="read",process="test"} 3.65',
+        'demo_seconds_count{stage="read",process="test"} 4',
+        "# HELP demo_total 演示计数",
+        "# TYPE demo_total counter",
+        # 标签值中的反斜杠、双引号和换行需要转义
+        'demo_total{rule="a\\"b\\\\c\\nd",process="test"} 2',
+    ]
+
+
+def test_render_merges_processes():
+    text = metrics.render([make_registry("main").snapshot(), make_registry("flask").snapshot()])
+    assert text.count("# TYPE demo_seconds histogram") == 1
+    assert text.count("# HELP demo_total") == 1
+    assert 'demo_total{rule="a\\"b\\\\c\\nd",process="main"} 2' in text
+    assert 'demo_total{rule="a\\"b\\\\c\\nd",process="flask"} 2' in text
+    assert text.endswith("\n")
+
+
+def test_server_fetch_round_trip(tmp_path):
+    peer = metrics.MetricsServer(str(tmp_path / "peer.sock"), registry=make_registry("hrspo2")).start()
+    server = metrics.MetricsServer(str(tmp_path / "m.sock"), registry=make_registry("main"),
+                                   peers=[peer.path]).start()
+    try:
+        snapshots = metrics.fetch(server.path)
+        assert [s["process"] for s in snapshots] == ["main", "hrspo2"]
+        assert snapshots[0] == make_registry("main").snapshot()
+
+        # 纯文本格式与本地 render 结果一致
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(server.path)
+            sock.sendall(b"GET /metrics HTTP/1.0\r\n\r\n")
+            data = b""
+            while chunk := sock.recv(65536):
+                data += chunk
+        header, _, body = data.partition(b"\r\n\r\n")
+        assert b"200" in header.split(b"\r\n")[0]
+        assert body.decode() == metrics.render(snapshots)
+    finally:
+        server.stop()
+        peer.stop()
+    assert metrics.fetch(server.path) is None
+
+
+def test_fetch_unavailable(tmp_path):
+    assert metrics.fetch(str(tmp_path / "none.sock")) is None
+    # 套接字文件存在但无人监听
+    path = str(tmp_path / "stale.sock")
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.close()
+    assert metrics.fetch(path) is None
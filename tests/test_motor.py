@@ -0,0 +1,94 @@
+import os
+import time
+
+import pytest
+
+from script import motor
+
+
+@pytest.fixture
+def pwm_base(tmp_path):
+    # 模拟已导出的 pwmchip：pwm0 下的属性文件为普通文件
+    channel = tmp_path / "pwm0"
+    channel.mkdir()
+    for name in ("period", "duty_cycle", "polarity", "enable"):
+        (channel / name).write_text("")
+    (tmp_path / "export").write_text("")
+    return tmp_path
+
+
+def attr(pwm_base, name):
+    return (pwm_base / "pwm0" / name).read_text()
+
+
+def test_init_writes_period_once(pwm_base):
+    controller = motor.MotorController(pwm_base=str(pwm_base), freq_hz=50, sysfs=False)
+    try:
+        assert attr(pwm_base, "period") == "20000000"
+        assert attr(pwm_base, "duty_cycle") == "0"
+        assert attr(pwm_base, "enable") == "0"
+        assert attr(pwm_base, "polarity") == "normal"
+        assert (pwm_base / "export").read_text() == ""  # 已导出时不再写 export
+    finally:
+        controller.close()
+
+
+def test_speed_uses_cached_period(pwm_base):
+    controller = motor.MotorController(pwm_base=str(pwm_base), freq_hz=50, sysfs=False)
+    try:
+        # 周期只在初始化时写入，调速时不再从 sysfs 读回
+        (pwm_base / "pwm0" / "period").write_text("garbage")
+        controller.set_speed_percent(25)
+        assert attr(pwm_base, "duty_cycle") == "5000000"
+        assert attr(pwm_base, "enable") == "1"
+
+        controller.set_speed_percent(150)  # 超出范围时截断到 100%
+        assert attr(pwm_base, "duty_cycle") == "20000000"
+
+        # 值变短时文件被截断，不残留上一次的尾部
+        controller.set_speed_percent(0)
+        assert attr(pwm_base, "duty_cycle") == "0"
+
+        controller.stop_motor()
+        assert attr(pwm_base, "enable") == "0"
+    finally:
+        controller.close()
+
+
+def test_play_runs_pattern_and_stops(pwm_base):
+    controller = motor.MotorController(pwm_base=str(pwm_base), freq_hz=100, sysfs=False)
+    try:
+        controller.play([(50, 0.05)])
+        deadline = time.monotonic() + 2
+        while controller.is_busy() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert not controller.is_busy()
+        assert attr(pwm_base, "duty_cycle") == "0"
+        assert attr(pwm_base, "enable") == "0"
+    finally:
+        controller.close()
+
+
+def test_cancel_interrupts_long_pattern(pwm_base):
+    controller = motor.MotorController(pwm_base=str(pwm_base), freq_hz=50, sysfs=False)
+    try:
+        controller.play([(80, 30.0)])
+        deadline = time.monotonic() + 2
+        while attr(pwm_base, "enable") != "1" and time.monotonic() < deadline:
+            time.sleep(0.01)
+        start = time.monotonic()
+        controller.cancel()
+        while controller.is_busy() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert time.monotonic() - start < 1.0
+        assert attr(pwm_base, "enable") == "0"
+    finally:
+        controller.close()
+
+
+def test_export_timeout(tmp_path):
+    (tmp_path / "export").write_text("")
+    with pytest.raises(RuntimeError):
+        motor.MotorController(pwm_base=str(tmp_path), export_timeout=0.05, sysfs=False)
+    assert (tmp_path / "export").read_text() == "0"
+    assert not os.path.exists(tmp_path / "pwm0")
@@ -0,0 +1,154 @@
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+import pytest
+
+from script import photo_index
+from script.photo_index import PhotoIndex, _Inotify
+
+
+def photo_name(minute, ext="jpg"):
+    return f"2024-05-01_12-{minute:02d}-00.{ext}"
+
+
+def write_image(path, width=64, height=48, ext=".jpg"):
+    ok, buf = cv2.imencode(ext, np.zeros((height, width, 3), dtype=np.uint8))
+    assert ok
+    with open(path, "wb") as f:
+        f.write(buf.tobytes())
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+@pytest.mark.parametrize("ext", [".jpg", ".png"])
+def test_image_size(tmp_path, ext):
+    path = str(tmp_path / ("a" + ext))
+    write_image(path, 123, 45, ext)
+    assert tuple(photo_index.image_size(path)) == (123, 45)
+
+
+def test_image_size_skips_segments_before_sof(tmp_path):
+    # APP0 与 DQT 段之后才是 SOF2（渐进式），尺寸 300x200
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\0" + b"\0" * 9
+    dqt = b"\xff\xdb" + struct.pack(">H", 67) + b"\0" * 65
+    sof2 = b"\xff\xc2" + struct.pack(">HBHH", 17, 8, 200, 300) + b"\0" * 10
+    path = tmp_path / "p.jpg"
+    path.write_bytes(b"\xff\xd8" + app0 + dqt + sof2)
+    assert photo_index.image_size(str(path)) == (300, 200)
+
+
+@pytest.mark.parametrize("data", [b"", b"GIF89a....", b"\xff\xd8\xff\xe0\x00", b"\xff\xd8\x00\x00",
+                                  b"\x89PNG\r\n\x1a\n\0\0"])
+def test_image_size_rejects_bad_headers(tmp_path, data):
+    path = tmp_path / "bad.jpg"
+    path.write_bytes(data)
+    assert photo_index.image_size(str(path)) == (None, None)
+    assert photo_index.image_size(str(tmp_path / "missing.jpg")) == (None, None)
+
+
+def test_build_and_query(tmp_path):
+    for minute in (5, 1, 3):
+        write_image(str(tmp_path / photo_name(minute)))
+    (tmp_path / "notes.txt").write_text("x")
+    (tmp_path / "bad-name.jpg").write_bytes(b"x")
+    index = PhotoIndex(str(tmp_path))
+    assert index.build() == 3
+
+    entries, total = index.query()
+    assert total == 3
+    assert [e["name"] for e in entries] == [photo_name(m) for m in (5, 3, 1)]
+    assert (entries[0]["width"], entries[0]["height"]) == (64, 48)
+
+    since = datetime(2024, 5, 1, 12, 2).timestamp()
+    until = datetime(2024, 5, 1, 12, 5).timestamp()
+    entries, total = index.query(since=since, until=until)
+    assert total == 1 and entries[0]["name"] == photo_name(3)
+    entries, total = index.query(offset=1, limit=1, newest_first=False)
+    assert total == 3 and [e["name"] for e in entries] == [photo_name(3)]
+
+
+def test_incremental_add_and_remove(tmp_path):
+    index = PhotoIndex(str(tmp_path))
+    index.build()
+    write_image(str(tmp_path / photo_name(2)))
+    write_image(str(tmp_path / photo_name(1)))
+    index.add(photo_name(2))
+    index.add(photo_name(1))
+    index.add("ignored.txt")
+    assert [e["name"] for e in index.query()[0]] == [photo_name(2), photo_name(1)]
+
+    # 同名文件被覆盖：更新大小并重新读取宽高
+    write_image(str(tmp_path / photo_name(2)), 32, 16)
+    index.add(photo_name(2))
+    entries, total = index.query()
+    assert total == 2
+    assert (entries[0]["width"], entries[0]["height"]) == (32, 16)
+    assert entries[0]["size"] == os.path.getsize(tmp_path / photo_name(2))
+
+    index.remove(photo_name(2))
+    index.remove(photo_name(9))  # 不存在时忽略
+    assert [e["name"] for e in index.query()[0]] == [photo_name(1)]
+    assert index._sizes.keys() == {photo_name(1)}
+
+
+def test_inotify_watcher_follows_directory(tmp_path):
+    index = PhotoIndex(str(tmp_path)).start()
+    try:
+        if index.mode != "inotify":
+            pytest.skip("inotify 不可用")
+        write_image(str(tmp_path / photo_name(1)))
+        # 先写临时文件再改名（IN_MOVED_TO）
+        write_image(str(tmp_path / "tmp"))
+        os.replace(tmp_path / "tmp", tmp_path / photo_name(2))
+        wait_until(lambda: len(index) == 2)
+        os.remove(tmp_path / photo_name(1))
+        wait_until(lambda: len(index) == 1)
+        assert index.query()[0][0]["name"] == photo_name(2)
+    finally:
+        index.stop()
+
+
+class FakeWatcher:
+    # 依次返回预设的事件批次，之后阻塞直到索引停止
+    def __init__(self, batches, index):
+        self.batches = list(batches)
+        self.index = index
+        self.drained = threading.Event()
+
+    def read(self, timeout):
+        if self.batches:
+            return self.batches.pop(0)
+        self.drained.set()
+        self.index._stop.wait(timeout)
+        return []
+
+    def close(self):
+        pass
+
+
+def test_queue_overflow_triggers_rescan(tmp_path):
+    index = PhotoIndex(str(tmp_path))
+    index.build()
+    # 溢出期间新增的文件没有对应事件，只能靠重新扫描发现
+    for minute in (1, 2, 3):
+        write_image(str(tmp_path / photo_name(minute)))
+    watcher = FakeWatcher([[(_Inotify.IN_CLOSE_WRITE, photo_name(1))],
+                           [(_Inotify.IN_Q_OVERFLOW, "")]], index)
+    thread = threading.Thread(target=index._watch_inotify, args=(watcher,))
+    thread.start()
+    try:
+        assert watcher.drained.wait(5)
+        assert len(index) == 3
+    finally:
+        index.stop()
+        thread.join(5)
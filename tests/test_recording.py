@@ -0,0 +1,90 @@
+import time
+
+import numpy as np
+import pytest
+
+from script import hrspo2, recording
+
+T0 = 1_700_000_000.0
+RATE = 25.0
+
+
+def make_batch(first_index, n, overflow=0):
+    indices = np.arange(first_index, first_index + n)
+    samples = np.column_stack((indices * 3 + 100000, indices * 5 + 200000)).astype(np.uint32)
+    return hrspo2.FifoBatch(samples, T0 + indices / RATE, first_index, overflow)
+
+
+@pytest.fixture
+def session(tmp_path):
+    # 录制一段短会话：两批 PPG（中间溢出 4 个样本）、酒精读数、三帧纯色画面
+    recorder = recording.Recorder(str(tmp_path), sample_rate=RATE)
+    batches = [make_batch(0, 20, overflow=4), make_batch(24, 10)]
+    for batch in batches:
+        recorder.record_ppg(batch)
+    alcohol = [(T0 + 0.05 * i, 1500 + i) for i in range(12)]
+    for t, raw in alcohol:
+        recorder.record_alcohol(t, raw)
+    frames = [(T0 + 0.1 * i, np.full((48, 64, 3), 40 * (i + 1), dtype=np.uint8)) for i in range(3)]
+    for t, frame in frames:
+        recorder.record_frame(t, frame)
+    recorder.close()
+    return str(tmp_path), batches, alcohol, frames
+
+
+def test_recording_reads_back_identical(session):
+    directory, batches, alcohol, frames = session
+    rec = recording.Recording(directory)
+    assert rec.sample_rate == RATE
+    assert rec.meta["frame_shape"] == [48, 64, 3]
+    assert rec.start_time() == T0
+
+    assert rec.ppg["index"].tolist() == list(range(20)) + list(range(24, 34))
+    assert rec.ppg["t"].tolist() == [t for b in batches for t in b.timestamps.tolist()]
+    assert rec.ppg["ir"].tolist() == [v for b in batches for v in b.samples[:, 0].tolist()]
+    assert rec.ppg["red"].tolist() == [v for b in batches for v in b.samples[:, 1].tolist()]
+    assert rec.alcohol.tolist() == alcohol
+    assert rec.frame_index["t"].tolist() == [t for t, _ in frames]
+    for i, (_, frame) in enumerate(frames):
+        # JPEG 有损，纯色画面解码后误差极小
+        assert np.abs(rec.frame(i).astype(int) - frame).max() <= 2
+
+
+def test_replay_round_trip(session):
+    directory, batches, alcohol, frames = session
+    rec, bus, sensor, capture = recording.open_replay(directory, speed=None)
+
+    reader = hrspo2.FifoReader(bus, sample_rate=RATE, start_time=T0)
+    replayed = []
+    while not bus.finished:
+        replayed.append(reader.read())
+    assert [b.first_index for b in replayed] == [0, 24]
+    assert [b.overflow for b in replayed] == [4, 0]
+    for got, want in zip(replayed, batches):
+        np.testing.assert_array_equal(got.samples, want.samples)
+        np.testing.assert_array_equal(got.timestamps, want.timestamps)
+
+    assert [sensor._read_raw() for _ in alcohol] == [raw for _, raw in alcohol]
+    assert sensor.finished
+
+    for _, frame in frames:
+        ok, got = capture.read()
+        assert ok and np.abs(got.astype(int) - frame).max() <= 2
+    assert capture.read() == (False, None)
+
+
+def test_realtime_replay_follows_recorded_clock(session):
+    directory, _, alcohol, frames = session
+    _, bus, sensor, capture = recording.open_replay(directory, speed=10.0)
+    start = time.monotonic()
+    for _ in frames:
+        assert capture.read()[0]
+    # 最后一帧录制于 0.2 秒处，10 倍速约 0.02 秒
+    elapsed = time.monotonic() - start
+    assert 0.015 <= elapsed < 1.0
+
+    # 实时回放时按时钟放出样本：录制的数据都在 1.4 秒以内，此时已全部可读
+    time.sleep(0.15)
+    assert sensor._read_raw() == alcohol[-1][1]
+    batch = hrspo2.FifoReader(bus, sample_rate=RATE, start_time=T0).read()
+    assert (len(batch), batch.overflow) == (20, 4)
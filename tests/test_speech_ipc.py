@@ -0,0 +1,80 @@
+import threading
+import uuid
+
+from script import speech_ipc
+
+
+class FakeRequest:
+    def __init__(self, text, priority):
+        self.id = uuid.uuid4().hex
+        self.text = text
+        self.priority = priority
+        self.status = "queued"
+        self.error = None
+        self.metrics = {}
+        self.created_at = 0.0
+        self.started_at = None
+        self.finished_at = None
+
+    def cancel(self):
+        if self.status != "queued":
+            return False
+        self.status = "cancelled"
+        return True
+
+
+class FakeService:
+    # 只记录入队顺序，不播放
+    def __init__(self):
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def enqueue(self, text, priority=10, voice=None, rate=None):
+        with self.lock:
+            request = FakeRequest(text, priority)
+            self.requests.append(request)
+            return request
+
+
+def start(tmp_path):
+    service = FakeService()
+    server = speech_ipc.SpeechServer(service, path=str(tmp_path / "speech.sock")).start()
+    return service, server, speech_ipc.SpeechClient(server.path)
+
+
+def test_enqueue_reaches_owning_service(tmp_path):
+    service, server, client = start(tmp_path)
+    try:
+        reply = client.enqueue("请注意休息")
+        assert reply["ok"] and reply["job"]["status"] == "queued"
+        assert [r.text for r in service.requests] == ["请注意休息"]
+        assert client.status(reply["job"]["job_id"])["job"]["job_id"] == service.requests[0].id
+    finally:
+        server.stop()
+
+
+def test_cancel_and_unknown_job(tmp_path):
+    service, server, client = start(tmp_path)
+    try:
+        job_id = client.enqueue("提醒")["job"]["job_id"]
+        assert client.cancel(job_id)["job"]["status"] == "cancelled"
+        assert client.cancel(job_id)["error"] == "finished"
+        assert client.status("missing")["error"] == "not_found"
+    finally:
+        server.stop()
+
+
+def test_pending_limit(tmp_path):
+    service, server, client = start(tmp_path)
+    try:
+        for i in range(speech_ipc.MAX_PENDING_JOBS):
+            assert client.enqueue(f"提醒{i}")["ok"]
+        assert client.enqueue("多出的一条") == {"ok": False, "error": "full"}
+        service.requests[0].status = "done"
+        assert client.enqueue("再来一条")["ok"]
+    finally:
+        server.stop()
+
+
+def test_client_without_server(tmp_path):
+    assert speech_ipc.SpeechClient(str(tmp_path / "none.sock")).enqueue("提醒") is None
@@ -0,0 +1,162 @@
+import multiprocessing as mp
+import os
+import signal
+import time
+
+import pytest
+
+from script import supervisor, vitals_bus
+
+ctx = mp.get_context("fork")  # 测试用的子进程入口定义在本文件里，fork 方式可直接继承
+
+
+def write_loop(name, count, done):
+    shared = supervisor.SharedVitals(name)
+    try:
+        for i in range(1, count + 1):
+            shared.write(vitals_bus.SPO2, float(i), float(i) * 2 + 0.5)
+    finally:
+        shared.close()
+        done.set()
+
+
+def read_loop(name, done, result):
+    shared = supervisor.SharedVitals(name)
+    torn = reads = 0
+    last = 0
+    try:
+        while not done.is_set():
+            slot = shared.read(vitals_bus.SPO2)
+            if slot is None or slot[0] == 0:
+                continue
+            updates, value, timestamp = slot
+            reads += 1
+            # 值与时间戳来自同一次写入，更新次数只增不减且等于写入序号
+            if timestamp != value * 2 + 0.5 or updates < last or updates != int(value):
+                torn += 1
+            last = updates
+    finally:
+        shared.close()
+        result.put((reads, torn))
+
+
+def test_seqlock_has_no_torn_reads():
+    shared = supervisor.SharedVitals(create=True)
+    try:
+        done = ctx.Event()
+        result = ctx.Queue()
+        readers = [ctx.Process(target=read_loop, args=(shared.name, done, result)) for _ in range(2)]
+        for r in readers:
+            r.start()
+        writer = ctx.Process(target=write_loop, args=(shared.name, 200000, done))
+        writer.start()
+        writer.join(60)
+        outcomes = [result.get(timeout=10) for _ in readers]
+        for r in readers:
+            r.join(5)
+        assert writer.exitcode == 0
+        assert all(reads > 0 for reads, _ in outcomes)
+        assert [torn for _, torn in outcomes] == [0, 0]
+        assert shared.read(vitals_bus.SPO2) == (200000, 200000.0, 400000.5)
+    finally:
+        shared.close()
+        shared.unlink()
+
+
+def test_read_unwritten_and_interrupted_writer():
+    shared = supervisor.SharedVitals(create=True)
+    try:
+        assert shared.read(vitals_bus.BPM) == (0, 0, 0.0)  # 更新次数 0 表示从未写入
+        # 写入进程在写入中途退出（版本号停在奇数）：读取放弃，下一次写入恢复
+        offset = shared.offsets[vitals_bus.BPM]
+        supervisor.VERSION.pack_into(shared.buf, offset, 1)
+        assert shared.read(vitals_bus.BPM, retries=5) is None
+        shared.write(vitals_bus.BPM, 72, 10.0)
+        assert shared.read(vitals_bus.BPM) == (2, 72, 10.0)
+    finally:
+        shared.close()
+        shared.unlink()
+
+
+def exit_ok(stop_event, options, requests):
+    pass
+
+
+def crash(stop_event, options, requests):
+    raise RuntimeError("boom")
+
+
+def killed(stop_event, options, requests):
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def wait_forever(stop_event, options, requests):
+    stop_event.wait(30)
+
+
+@pytest.fixture
+def make_supervisor(monkeypatch):
+    monkeypatch.setattr(supervisor, "WORKERS", {
+        "ok": exit_ok, "crash": crash, "killed": killed, "forever": wait_forever})
+    created = []
+
+    def make(names, **kwargs):
+        shared = supervisor.SharedVitals(create=True)
+        sup = supervisor.Supervisor(names, shared, ctx=ctx, **kwargs)
+        created.append(sup)
+        return sup
+
+    yield make
+    for sup in created:
+        sup.stop(timeout=2)
+        sup.shared.close()
+        sup.shared.unlink()
+
+
+def finish(state):
+    state.process.join(10)
+    assert not state.process.is_alive()
+
+
+def test_clean_exit_is_not_restarted(make_supervisor):
+    sup = make_supervisor(["ok"]).start()
+    state = sup.workers["ok"]
+    finish(state)
+    sup._check(state, state.started_at + 1)
+    assert state.finished and state.process is None
+    sup._check(state, state.started_at + 1000)
+    assert state.process is None
+
+
+@pytest.mark.parametrize("name", ["crash", "killed"])
+def test_failure_restarts_with_backoff(make_supervisor, name):
+    sup = make_supervisor([name], backoff=1.0, max_backoff=4.0, stable_after=60.0).start()
+    state = sup.workers[name]
+    delays = []
+    for _ in range(4):
+        finish(state)
+        assert state.process.exitcode != 0
+        now = state.started_at + 0.1
+        sup._check(state, now)
+        assert state.process is None and not state.finished
+        delays.append(round(state.restart_at - now, 6))
+        sup._check(state, state.restart_at - 0.01)  # 退避时间未到不重启
+        assert state.process is None
+        sup._check(state, state.restart_at)
+        assert state.process is not None
+    assert delays == [1.0, 2.0, 4.0, 4.0]
+
+    # 稳定运行超过 stable_after 后退避复位
+    finish(state)
+    now = state.started_at + 61
+    sup._check(state, now)
+    assert state.restart_at - now == 1.0
+
+
+def test_stop_ends_running_workers(make_supervisor):
+    sup = make_supervisor(["forever"]).start()
+    process = sup.workers["forever"].process
+    start = time.monotonic()
+    sup.stop(timeout=5)
+    assert time.monotonic() - start < 5
+    assert process.exitcode == 0
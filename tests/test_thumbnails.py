@@ -0,0 +1,83 @@
+import os
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+import flask_server
+
+
+@pytest.fixture
+def thumb_dir(tmp_path, monkeypatch):
+    folder = tmp_path / "thumb_cache"
+    folder.mkdir()
+    monkeypatch.setattr(flask_server, "THUMB_FOLDER", str(folder))
+    monkeypatch.setattr(flask_server, "_thumb_access", {})
+    monkeypatch.setattr(flask_server, "_thumb_bytes", None)
+    monkeypatch.setattr(flask_server, "_thumb_evicting", False)
+    return folder
+
+
+def make_thumbs(folder, count, size=1000, age=3600):
+    # 生成 count 个 size 字节的缓存文件，mtime 依次递增（都早于 age 秒前）
+    paths = []
+    base = time.time() - age
+    for i in range(count):
+        path = str(folder / f"{i:02d}.jpg")
+        with open(path, "wb") as f:
+            f.write(b"\0" * size)
+        os.utime(path, (base + i, base + i))
+        paths.append(path)
+    return paths
+
+
+def test_evicts_oldest_and_prunes_access(thumb_dir):
+    paths = make_thumbs(thumb_dir, 10)
+    flask_server._thumb_access[str(thumb_dir / "gone.jpg")] = time.time() - 100  # 文件已被外部删除
+    flask_server.evict_thumbnails(max_bytes=5000)
+    # 淘汰到上限的 80% 以下：保留最新的 4 个
+    assert sorted(os.listdir(thumb_dir)) == [os.path.basename(p) for p in paths[6:]]
+    assert flask_server._thumb_access == {}
+    assert flask_server._thumb_bytes == 4000
+
+
+def test_recently_accessed_files_are_kept(thumb_dir):
+    paths = make_thumbs(thumb_dir, 10)
+    flask_server._thumb_access[paths[0]] = time.time()      # 仍可能在发送
+    flask_server._thumb_access[paths[1]] = time.time() - 600  # 访问时间晚于其他文件的生成时间
+    flask_server.evict_thumbnails(max_bytes=5000)
+    remaining = sorted(os.path.join(thumb_dir, n) for n in os.listdir(thumb_dir))
+    assert remaining == paths[:2] + paths[8:]
+    assert sorted(flask_server._thumb_access) == paths[:2]
+
+
+def test_new_files_and_temp_files_are_skipped(thumb_dir):
+    make_thumbs(thumb_dir, 3, age=0)
+    (thumb_dir / "x.jpg.123.tmp").write_bytes(b"\0" * 10000)
+    flask_server.evict_thumbnails(max_bytes=1000)
+    assert len(os.listdir(thumb_dir)) == 4
+
+
+def test_get_thumbnail_triggers_background_eviction(thumb_dir, tmp_path, monkeypatch):
+    image = str(tmp_path / "photo.jpg")
+    cv2.imwrite(image, np.full((480, 640, 3), 128, dtype=np.uint8))
+    make_thumbs(thumb_dir, 10)
+    monkeypatch.setattr(flask_server, "THUMB_MAX_BYTES", 5000)
+
+    thumb, key = flask_server.get_thumbnail(image, 100)
+    assert os.path.basename(thumb) == key + ".jpg"
+    deadline = time.time() + 5
+    while flask_server._thumb_evicting or flask_server._thumb_bytes is None:
+        assert time.time() < deadline
+        time.sleep(0.01)
+    # 刚生成的缩略图不会被淘汰
+    assert os.path.exists(thumb)
+    assert flask_server._thumb_bytes <= 4000 + os.path.getsize(thumb)
+
+    # 缓存命中只记录访问时间；估计值未超过上限时不再扫描目录
+    monkeypatch.setattr(flask_server, "THUMB_MAX_BYTES", 1 << 30)
+    assert flask_server.get_thumbnail(image, 100) == (thumb, key)
+    assert thumb in flask_server._thumb_access
+    flask_server.note_thumbnail_written(1000)
+    assert not flask_server._thumb_evicting
@@ -0,0 +1,195 @@
+import threading
+import time
+
+import pytest
+
+from script import alerts, vitals_bus
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def always(reading, bus):
+    return bool(reading.value)
+
+
+def make_engine(rules):
+    bus = vitals_bus.VitalsBus()
+    clock = Clock()
+    return bus, clock, vitals_bus.RuleEngine(bus, rules, clock=clock)
+
+
+def feed(bus, clock, engine, kind, samples):
+    # samples: [(时刻, 值), ...]，返回触发告警的时刻
+    fired_at = []
+    for t, value in samples:
+        clock.now = t
+        before = engine.rules[0].last_fired
+        engine.process(bus.publish(kind, value))
+        if engine.rules[0].last_fired != before:
+            fired_at.append(t)
+    return fired_at
+
+
+def test_debounce_cooldown_and_rearm():
+    fired = []
+    rule = vitals_bus.AlertRule("test", ["x"], always, fired.append, debounce=1.0, cooldown=10.0)
+    bus, clock, engine = make_engine([rule])
+
+    # 条件连续成立 1 秒才触发；成立期间每 0.5 秒一个读数
+    samples = [(i * 0.5, 1) for i in range(0, 25)]
+    assert feed(bus, clock, engine, "x", samples) == [1.0, 11.0]
+
+    # 条件中断后重新计算 debounce，冷却期内即使满足 debounce 也不触发
+    assert feed(bus, clock, engine, "x", [(12.0, 0), (20.0, 1), (20.5, 1), (21.0, 1), (21.5, 1)]) == [21.0]
+    assert feed(bus, clock, engine, "x", [(21.9, 0), (31.0, 1), (31.9, 1), (32.0, 1)]) == [32.0]
+    assert len(fired) == 4
+
+
+def test_zero_debounce_fires_immediately_and_other_kinds_ignored():
+    fired = []
+    rule = vitals_bus.AlertRule("test", ["x"], always, fired.append, cooldown=5.0)
+    bus, clock, engine = make_engine([rule])
+    engine.process(bus.publish("y", 1))
+    assert fired == []
+    assert feed(bus, clock, engine, "x", [(0.0, 1), (4.9, 1), (5.0, 1)]) == [0.0, 5.0]
+
+
+def test_failing_action_does_not_stop_other_rules():
+    def boom(reading):
+        raise RuntimeError("boom")
+    fired = []
+    rules = [vitals_bus.AlertRule("bad", ["x"], always, boom),
+             vitals_bus.AlertRule("good", ["x"], always, fired.append)]
+    bus, clock, engine = make_engine(rules)
+    engine.process(bus.publish("x", 1))
+    assert len(fired) == 1
+
+
+def test_wait_filters_kinds_and_times_out():
+    bus = vitals_bus.VitalsBus(history=4)
+    seq = bus.seq
+    assert bus.wait(seq, timeout=0.01) == []
+
+    bus.publish("a", 1)
+    bus.publish("b", 2)
+    readings = bus.wait(seq, kinds={"b"}, timeout=0.1)
+    assert [(r.kind, r.value) for r in readings] == [("b", 2)]
+
+    # 只有其他类型的新读数时继续等待，直到超时
+    seq = bus.seq
+    bus.publish("a", 3)
+    assert bus.wait(seq, kinds={"b"}, timeout=0.05) == []
+
+    # 历史缓冲溢出时只返回保留下来的最新读数
+    seq = bus.seq
+    for i in range(10):
+        bus.publish("c", i)
+    assert [r.value for r in bus.wait(seq, timeout=0.1)] == [6, 7, 8, 9]
+
+
+def test_wait_wakes_on_publish():
+    bus = vitals_bus.VitalsBus()
+    seq = bus.seq
+    timer = threading.Timer(0.05, bus.publish, args=("a", 1))
+    timer.start()
+    start = time.monotonic()
+    readings = bus.wait(seq, timeout=5)
+    assert [r.value for r in readings] == [1]
+    assert time.monotonic() - start < 1.0
+
+
+def test_engine_thread_processes_published_readings():
+    fired = threading.Event()
+    rule = vitals_bus.AlertRule("test", ["x"], always, lambda r: fired.set())
+    bus = vitals_bus.VitalsBus()
+    stop = threading.Event()
+    engine = vitals_bus.RuleEngine(bus, [rule]).start(stop)
+    try:
+        bus.publish("x", 1)
+        assert fired.wait(2)
+    finally:
+        stop.set()
+        engine.join(2)
+
+
+@pytest.fixture
+def app_rules(monkeypatch):
+    # 使用 script/alerts.py 中的真实规则，替换掉写库、振动和语音这些副作用
+    calls = []
+    monkeypatch.setattr(alerts, "log_abnormal", lambda info, **kw: calls.append(("log", kw["kind"])))
+    monkeypatch.setattr(alerts.motor, "play_pattern", lambda name: calls.append(("motor", name)))
+
+    class Speech:
+        def enqueue(self, text, priority=None):
+            calls.append(("speak", text, priority))
+    monkeypatch.setattr(alerts, "speech", Speech())
+
+    bus = vitals_bus.VitalsBus()
+    clock = Clock()
+    engine = vitals_bus.RuleEngine(bus, alerts.build_rules(), clock=clock)
+
+    def run(samples):
+        # samples: [(时刻, 类型, 值), ...]，返回每次产生副作用的 (时刻, 副作用)
+        out = []
+        for t, kind, value in samples:
+            clock.now = t
+            start = len(calls)
+            engine.process(bus.publish(kind, value))
+            out.extend((t, c) for c in calls[start:])
+        return out
+
+    return bus, run
+
+
+def test_low_spo2_rule(app_rules):
+    bus, run = app_rules
+    bus.publish(vitals_bus.HAND_FLAG, 50000)
+    bus.publish(vitals_bus.BPM, 70)
+    spo2 = vitals_bus.SPO2
+    assert run([(0.0, spo2, 88), (0.5, spo2, 88), (0.9, spo2, 95), (1.0, spo2, 88), (1.9, spo2, 88)]) == []
+    assert run([(2.0, spo2, 88)]) == [(2.0, ("log", "low_spo2")), (2.0, ("motor", "escalate"))]
+    # 冷却 10 秒
+    assert run([(t, spo2, 85) for t in (3.0, 6.0, 11.9)]) == []
+    assert [t for t, _ in run([(12.0, spo2, 85)])] == [12.0, 12.0]
+
+    # 手离开传感器或心率为 0 时不告警
+    bus.publish(vitals_bus.HAND_FLAG, 10)
+    assert run([(t, spo2, 80) for t in (30.0, 31.0, 32.0)]) == []
+    bus.publish(vitals_bus.HAND_FLAG, 50000)
+    bus.publish(vitals_bus.BPM, 0)
+    assert run([(t, spo2, 80) for t in (40.0, 41.0, 42.0)]) == []
+
+
+def test_stable_heart_rate_rule(app_rules):
+    bus, run = app_rules
+    bus.publish(vitals_bus.HAND_FLAG, 50000)
+    bpm = vitals_bus.BPM
+    # 第一个读数只设定参考值，之后 ±2 以内保持 50 秒才触发
+    samples = [(float(t), bpm, 72 + (t % 3) - 1) for t in range(0, 51)]
+    assert run(samples) == []
+    out = run([(51.0, bpm, 72)])
+    assert out == [(51.0, ("log", "stable_heart_rate")),
+                   (51.0, ("speak", alerts.FATIGUE_WARNING_TEXT, 0)),
+                   (51.0, ("motor", "pulse_train"))]
+
+    # 心率波动超过阈值时重新计时
+    assert run([(t, bpm, 90) for t in (120.0, 150.0, 170.0)]) == []
+    assert run([(171.0, bpm, 72)]) == []
+    assert run([(t, bpm, 72) for t in (172.0, 200.0, 221.9)]) == []
+    assert [t for t, _ in run([(222.0, bpm, 73)])] == [222.0] * 3
+
+
+def test_alcohol_rule(app_rules):
+    bus, run = app_rules
+    alc = vitals_bus.ALCOHOL
+    assert run([(0.0, alc, 1500), (0.5, alc, 2500), (1.0, alc, 1500), (1.5, alc, 1500), (1.9, alc, None)]) == []
+    assert run([(2.0, alc, 1500), (2.5, alc, 1500)]) == []
+    assert run([(3.0, alc, 1500)]) == [(3.0, ("speak", alerts.ALCOHOL_WARNING_TEXT, 0))]
+    assert run([(t, alc, 1000) for t in (4.0, 20.0, 32.9)]) == []
+    assert run([(33.0, alc, 1000)]) == [(33.0, ("speak", alerts.ALCOHOL_WARNING_TEXT, 0))]